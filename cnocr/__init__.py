@@ -27,7 +27,8 @@ from .consts import (
     ENG_LETTERS,
 )
 from .utils import read_img, set_logger
-from .cn_ocr import CnOcr
+from .cn_ocr import CnOcr, OcrResult, OcrResults
+from .result_cache import RecognitionCache, ResultCache
 from .recognizer import gen_model
 from .line_split import line_split
 from .classification import ImageClassifier
@@ -0,0 +1,119 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# OCR 服务的准入控制（admission control）和请求截止时间（deadline）。
+
+import time
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 调用方通过此 header 传入请求的截止时间：Unix 时间戳（秒），可以带小数
+DEADLINE_HEADER = 'X-Request-Deadline'
+
+
+class DeadlineExceeded(Exception):
+    """请求的截止时间已过，调用方已经不再等待结果。"""
+
+
+def parse_deadline(
+    value: Optional[str], default_timeout: Optional[float] = None
+) -> Optional[float]:
+    """
+    解析 `X-Request-Deadline` header 的值。
+
+    Args:
+        value (Optional[str]): header 的值，为 Unix 时间戳（秒）；为 `None` 或无法解析时使用 `default_timeout`
+        default_timeout (Optional[float]): 未指定截止时间时，从现在起的默认超时时间（秒）；
+            `None` 或不大于 0 表示没有截止时间
+
+    Returns:
+        Optional[float]: 截止时间（Unix 时间戳），`None` 表示没有截止时间
+    """
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            logger.warning('invalid %s header: %s' % (DEADLINE_HEADER, value))
+    if default_timeout is not None and default_timeout > 0:
+        return time.time() + default_timeout
+    return None
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """距离截止时间还剩多少秒；没有截止时间时返回 `None`。"""
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def check_deadline(deadline: Optional[float], stage: str = ''):
+    """
+    在处理的各个阶段之间调用：截止时间已过时抛出 `DeadlineExceeded`，后面的阶段就不会再浪费计算。
+    """
+    left = time_left(deadline)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(
+            'deadline exceeded by %.3fs before %s' % (-left, stage or 'processing')
+        )
+
+
+class AdmissionController(object):
+    """
+    限制同时被接受（排队中和处理中）的请求数。队列已满时 `try_enter()` 返回 `False`，
+    调用方应该立即拒绝请求（如返回 HTTP 429），而不是让请求无限制地排队。线程安全。
+    """
+
+    def __init__(self, max_pending: int):
+        """
+        Args:
+            max_pending (int): 最多同时被接受的请求数
+        """
+        self.max_pending = max(1, max_pending)
+        self.num_pending = 0
+        self.num_rejected = 0
+        self.num_expired = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self) -> bool:
+        with self._lock:
+            if self.num_pending >= self.max_pending:
+                self.num_rejected += 1
+                return False
+            self.num_pending += 1
+            return True
+
+    def exit(self):
+        with self._lock:
+            self.num_pending -= 1
+
+    def record_expired(self):
+        """记录一个因为截止时间已过而被丢弃的请求。"""
+        with self._lock:
+            self.num_expired += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_pending': self.max_pending,
+                'num_pending': self.num_pending,
+                'num_rejected': self.num_rejected,
+                'num_expired': self.num_expired,
+            }
@@ -0,0 +1,232 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 可断点续跑、可分片的批量识别任务。
+
+import os
+import json
+import time
+import zlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .result_sink import to_jsonable
+
+logger = logging.getLogger(__name__)
+
+
+def read_manifest(
+    fp: Union[str, Path], sep: str = '\t', img_folder: Optional[str] = None
+) -> List[str]:
+    """
+    读取任务清单。每行的第一列为图片路径，其他列（如 `read_tsv_file()` 读取的标签）会被忽略，空行会被跳过。
+
+    Args:
+        fp (Union[str, Path]): 清单文件路径
+        sep (str): 列之间的分隔符
+        img_folder (Optional[str]): 图片路径为相对路径时，所相对的目录
+
+    Returns:
+        list: 图片路径
+    """
+    img_fp_list = []
+    with open(fp, encoding='utf-8') as f:
+        for line in f:
+            img_fp = line.rstrip('\n').split(sep)[0].strip()
+            if not img_fp:
+                continue
+            if img_folder is not None:
+                img_fp = os.path.join(img_folder, img_fp)
+            img_fp_list.append(img_fp)
+    return img_fp_list
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """把形如 `'i/n'` 的字符串解析为 `(i, n)`，其中 `0 <= i < n`。"""
+    try:
+        shard_idx, num_shards = [int(v) for v in shard.split('/')]
+    except ValueError:
+        raise ValueError('shard should be like "i/n", but got "%s"' % shard)
+    if num_shards < 1 or not 0 <= shard_idx < num_shards:
+        raise ValueError('shard should satisfy 0 <= i < n, but got "%s"' % shard)
+    return shard_idx, num_shards
+
+
+def select_shard(img_fp_list: List[str], shard_idx: int, num_shards: int) -> List[str]:
+    """
+    按图片路径的 CRC32 值选出属于第 `shard_idx` 个分片的图片。
+    结果只与路径有关，所以多台机器使用同一份清单时分片互不重叠，清单中增删条目也不会影响其他条目所在的分片。
+    """
+    if num_shards == 1:
+        return list(img_fp_list)
+    return [
+        img_fp
+        for img_fp in img_fp_list
+        if zlib.crc32(img_fp.encode('utf-8')) % num_shards == shard_idx
+    ]
+
+
+class BatchOcrJob(object):
+    """
+    逐张识别清单中的图片，每张图片的结果立即以一行 JSON 追加到输出文件中。
+
+    每写完一条结果并落盘（fsync），就在进度文件中追加一行 `<image>\\t<输出文件的字节数>`。
+    任务中断后重新运行时，输出文件会被截断到最后一条完整记录的位置，所以中断时写了一半的结果不会留下重复或损坏的行；
+    已完成的图片根据输出文件中实际存在的记录确定，并被跳过。
+    出错的图片不记录进度，重新运行时会再次识别，所以输出文件中同一张图片可能有多条记录，以最后一条为准。
+    """
+
+    def __init__(
+        self,
+        ocr,
+        img_fp_list: List[str],
+        output_fp: Union[str, Path],
+        progress_fp: Optional[Union[str, Path]] = None,
+        report_interval: float = 30.0,
+        **ocr_kwargs,
+    ):
+        """
+        Args:
+            ocr (CnOcr): 识别模型
+            img_fp_list (List[str]): 待识别的图片路径
+            output_fp (Union[str, Path]): 输出的 JSONL 文件路径，每行为 `{"image": <fp>, "results": [...]}`，
+                出错的图片为 `{"image": <fp>, "error": <message>}`
+            progress_fp (Optional[Union[str, Path]]): 进度文件路径；默认为 `None`，表示使用 `<output_fp>.progress`
+            report_interval (float): 每隔多少秒打印一次速度和预计剩余时间
+            **ocr_kwargs: 调用 `ocr.ocr()` 时传入的其他参数
+        """
+        self.ocr = ocr
+        self.img_fp_list = img_fp_list
+        self.output_fp = str(output_fp)
+        self.progress_fp = str(progress_fp or self.output_fp + '.progress')
+        self.report_interval = report_interval
+        self.ocr_kwargs = ocr_kwargs
+
+    def _load_progress(self) -> Tuple[set, int]:
+        offset, valid_size = 0, 0
+        if not os.path.isfile(self.progress_fp):
+            return set(), offset
+        output_size = (
+            os.path.getsize(self.output_fp) if os.path.isfile(self.output_fp) else 0
+        )
+        with open(self.progress_fp, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # 中断时写了一半的行
+                fields = line.decode('utf-8').rstrip('\n').rsplit('\t', 1)
+                if len(fields) != 2 or not fields[1].isdigit():
+                    break
+                if int(fields[1]) > output_size:
+                    break  # 进度已写入，但输出文件的内容没有落盘
+                offset = int(fields[1])
+                valid_size += len(line)
+        # 去掉写了一半或超出输出文件的行，避免和后面追加的内容连在一起
+        with open(self.progress_fp, 'r+b') as f:
+            f.truncate(valid_size)
+        return self._load_done(offset)
+
+    def _load_done(self, offset: int) -> Tuple[set, int]:
+        """从输出文件的前 `offset` 个字节中读取已完成的图片，遇到损坏的行时在其之前截断。"""
+        done, valid_offset = set(), 0
+        if offset == 0:
+            return done, valid_offset
+        with open(self.output_fp, 'rb') as f:
+            for line in f:
+                if valid_offset + len(line) > offset or not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                    img_fp = record['image']
+                except (ValueError, KeyError, TypeError):
+                    break
+                # 同一张图片可能有多条记录（出错后重试），以最后一条为准
+                if 'error' in record:
+                    done.discard(img_fp)
+                else:
+                    done.add(img_fp)
+                valid_offset += len(line)
+        return done, valid_offset
+
+    def run(self) -> Dict[str, Any]:
+        """
+        运行任务。
+
+        Returns:
+            dict: 统计信息，包含 `num_images`、`num_skipped`、`num_done`、`num_errors` 和 `images_per_second`
+        """
+        done, offset = self._load_progress()
+        todo = [img_fp for img_fp in self.img_fp_list if img_fp not in done]
+        num_skipped = len(self.img_fp_list) - len(todo)
+        if num_skipped > 0:
+            logger.info(
+                'resume from %s: %d images are already done'
+                % (self.progress_fp, num_skipped)
+            )
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_fp)), exist_ok=True)
+        mode = 'r+b' if os.path.isfile(self.output_fp) else 'wb'
+        start_time = last_report = time.time()
+        num_done, num_errors = 0, 0
+        with open(self.output_fp, mode) as fout, open(
+            self.progress_fp, 'ab'
+        ) as fprogress:
+            fout.seek(offset)
+            fout.truncate()
+            for img_fp in todo:
+                try:
+                    results = self.ocr.ocr(img_fp, **self.ocr_kwargs)
+                    record = {'image': img_fp, 'results': to_jsonable(results)}
+                except Exception as e:
+                    logger.warning('failed to ocr %s: %s' % (img_fp, e))
+                    record = {'image': img_fp, 'error': str(e)}
+                    num_errors += 1
+
+                line = json.dumps(record, ensure_ascii=False) + '\n'
+                fout.write(line.encode('utf-8'))
+                fout.flush()
+                if 'error' not in record:
+                    # 结果落盘之后再记录进度，这样进度文件中的位置总是指向完整的记录
+                    os.fsync(fout.fileno())
+                    fprogress.write(
+                        ('%s\t%d\n' % (img_fp, fout.tell())).encode('utf-8')
+                    )
+                    fprogress.flush()
+                num_done += 1
+
+                now = time.time()
+                if now - last_report >= self.report_interval or num_done == len(todo):
+                    last_report = now
+                    speed = num_done / max(now - start_time, 1e-6)
+                    logger.info(
+                        '%d/%d images done, %.2f images/s, ETA: %.0fs'
+                        % (
+                            num_skipped + num_done,
+                            len(self.img_fp_list),
+                            speed,
+                            (len(todo) - num_done) / max(speed, 1e-6),
+                        )
+                    )
+
+        return {
+            'num_images': len(self.img_fp_list),
+            'num_skipped': num_skipped,
+            'num_done': num_done,
+            'num_errors': num_errors,
+            'images_per_second': num_done / max(time.time() - start_time, 1e-6),
+        }
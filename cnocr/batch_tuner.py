@@ -0,0 +1,229 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 根据本机上实测的识别速度，自动选择识别时的 batch size。
+
+import os
+import json
+import time
+import logging
+import platform
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .consts import IMG_STANDARD_HEIGHT
+from .utils import data_dir, _file_hash
+from .batching import plan_batches, DEFAULT_PIXEL_BUDGET
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+DEFAULT_WIDTHS = (64, 128, 256, 512, 1024)
+# 做 benchmark 时，每次调用最多包含的宽度之和，避免在大 batch 和宽图片上花太多时间
+MAX_BENCHMARK_TOTAL_WIDTH = 32 * 512
+
+
+def get_model_height(rec_model) -> int:
+    """识别模型输入图片的高度。"""
+    rec_image_shape = getattr(rec_model, 'rec_image_shape', None)
+    if rec_image_shape is not None:
+        return rec_image_shape[1]
+    return IMG_STANDARD_HEIGHT
+
+
+def get_min_padded_width(rec_model) -> int:
+    """识别模型每批图片补齐（padding）后的最小宽度，如输入宽度固定的 PP-OCR 模型。"""
+    return getattr(rec_model, 'min_padded_width', 0)
+
+
+class BatchSizeTuner(object):
+    """
+    在本机上测量识别模型在不同 batch size 和图片宽度下的耗时，拟合一个线性的延迟模型：
+        `latency(batch_size, padded_width) = a + b * batch_size + c * batch_size * padded_width`，
+    其中 `a` 为每次调用的固定开销，`c` 为每个像素列的开销。
+    识别时用此模型估算每个候选 batch size 的总耗时，选出最快的那个。
+
+    测量结果（profile）存入 `profile_dir`，之后的进程直接读取，无需再次测量。
+    """
+
+    def __init__(
+        self,
+        rec_model,
+        batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+        profile_dir: Optional[Union[str, Path]] = None,
+    ):
+        """
+        Args:
+            rec_model: 已经加载好的识别模型，如 `Recognizer`、`PPRecognizer` 或 `RapidRecognizer`
+            batch_sizes (Sequence[int]): 候选的 batch size
+            profile_dir (Optional[Union[str, Path]]): profile 的存储目录；
+                默认为 `None`，表示使用 `data_dir()/batch-profiles`
+        """
+        self.rec_model = rec_model
+        self.batch_sizes = sorted(batch_sizes)
+        self.height = get_model_height(rec_model)
+        self.min_padded_width = get_min_padded_width(rec_model)
+        self.profile_dir = profile_dir or os.path.join(data_dir(), 'batch-profiles')
+        self.profile_fp = self._gen_profile_fp()
+        self.coefs = None  # [a, b, c]
+
+    def _gen_profile_fp(self) -> str:
+        model_fp = getattr(self.rec_model, '_model_fp', None)
+        model_key = (
+            _file_hash(model_fp)[:16]
+            if model_fp is not None and os.path.isfile(model_fp)
+            else getattr(self.rec_model, '_model_name', 'unknown')
+        )
+        # 耗时与机器相关，所以文件名中也包含机器信息
+        fn = '%s-%s-%s-%s-cpu%d.json' % (
+            self.rec_model.__class__.__name__,
+            model_key,
+            getattr(self.rec_model, '_model_backend', 'onnx'),
+            platform.machine(),
+            os.cpu_count() or 1,
+        )
+        return os.path.join(self.profile_dir, fn)
+
+    def load_or_tune(self, force: bool = False, **kwargs) -> 'BatchSizeTuner':
+        """
+        读取已有的 profile；如果不存在，或者 `force==True`，则重新测量并保存。
+
+        Args:
+            force (bool): 是否忽略已有的 profile，重新测量
+            **kwargs: 传给 `tune()` 的参数
+        """
+        if not force and os.path.isfile(self.profile_fp):
+            with open(self.profile_fp) as f:
+                self.coefs = json.load(f)['coefs']
+            logger.info('use the batch size profile %s' % self.profile_fp)
+            return self
+
+        self.tune(**kwargs)
+        self.save()
+        return self
+
+    def tune(
+        self, widths: Sequence[int] = DEFAULT_WIDTHS, repeats: int = 2
+    ) -> List[Dict[str, float]]:
+        """
+        使用随机生成的图片测量各种 (batch_size, width) 下的耗时，并拟合延迟模型。
+
+        Args:
+            widths (Sequence[int]): 测量时使用的图片宽度（resize 到模型输入高度之后）
+            repeats (int): 每种组合重复测量的次数，取最小值
+
+        Returns:
+            list: 每个元素为一次测量结果，包含 `batch_size`、`width` 和 `latency`（秒）
+        """
+        rng = np.random.RandomState(0)
+        records = []
+        for width in widths:
+            img = rng.randint(0, 255, size=(self.height, width, 3), dtype=np.uint8)
+            for batch_size in self.batch_sizes:
+                if batch_size > 1 and batch_size * width > MAX_BENCHMARK_TOTAL_WIDTH:
+                    break
+                imgs = [img] * batch_size
+                self.rec_model.recognize(imgs, batch_size=batch_size)  # warmup
+                latency = float('inf')
+                for _ in range(repeats):
+                    start_time = time.perf_counter()
+                    self.rec_model.recognize(imgs, batch_size=batch_size)
+                    latency = min(latency, time.perf_counter() - start_time)
+                records.append(
+                    {'batch_size': batch_size, 'width': width, 'latency': latency}
+                )
+                logger.debug('batch benchmark: %s' % records[-1])
+
+        features = np.array(
+            [
+                [
+                    1.0,
+                    r['batch_size'],
+                    r['batch_size'] * max(r['width'], self.min_padded_width),
+                ]
+                for r in records
+            ]
+        )
+        latencies = np.array([r['latency'] for r in records])
+        coefs, *_ = np.linalg.lstsq(features, latencies, rcond=None)
+        self.coefs = np.maximum(coefs, 0.0).tolist()
+        logger.info('fitted latency model: %s' % self.coefs)
+        return records
+
+    def save(self):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        tmp_fp = '%s.%d.tmp' % (self.profile_fp, os.getpid())
+        with open(tmp_fp, 'w') as f:
+            profile = {
+                'coefs': self.coefs,
+                'batch_sizes': self.batch_sizes,
+                'height': self.height,
+            }
+            json.dump(profile, f, indent=2)
+        os.replace(tmp_fp, self.profile_fp)
+        logger.info('batch size profile is saved to %s' % self.profile_fp)
+
+    def estimate_latency(
+        self, widths: Sequence[int], batch_size: int, pixel_budget: Optional[int]
+    ) -> float:
+        """按 `plan_batches()` 分批后，估算识别这些图片的总耗时（秒）。"""
+        a, b, c = self.coefs
+        batches, _ = plan_batches(
+            widths,
+            batch_size,
+            pixel_budget=pixel_budget,
+            height=self.height,
+            min_padded_width=self.min_padded_width,
+        )
+        latency = 0.0
+        for batch in batches:
+            padded_width = max(max(widths[i] for i in batch), self.min_padded_width)
+            latency += a + b * len(batch) + c * len(batch) * padded_width
+        return latency
+
+    def choose_batch_size(
+        self,
+        img_shapes: Sequence[Sequence[int]],
+        pixel_budget: Optional[int] = DEFAULT_PIXEL_BUDGET,
+    ) -> int:
+        """
+        根据待识别图片的数量和宽度，选出估算耗时最短的 batch size。
+
+        Args:
+            img_shapes (Sequence[Sequence[int]]): 每张图片的形状，前两个值为 (height, width)
+            pixel_budget (Optional[int]): 分批时使用的像素预算，参考 `plan_batches()`
+
+        Returns:
+            int: batch size
+        """
+        if self.coefs is None:
+            raise RuntimeError('call `load_or_tune()` before choosing batch sizes')
+        if len(img_shapes) <= 1:
+            return 1
+        widths = [
+            max(1, int(round(self.height * shape[1] / max(shape[0], 1))))
+            for shape in img_shapes
+        ]
+        candidates = [bs for bs in self.batch_sizes if bs < len(widths)]
+        candidates.append(min(len(widths), self.batch_sizes[-1]))
+        return min(
+            candidates,
+            key=lambda bs: self.estimate_latency(widths, bs, pixel_budget),
+        )
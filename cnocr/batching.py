@@ -0,0 +1,125 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 文本行识别时的分批策略。
+
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 每个 batch 最多包含的图片数
+DEFAULT_MAX_BATCH_SIZE = 32
+# 每个 batch 最多包含的像素数（batch_size * height * padded_width），
+# 对高度为 32 的模型，大约相当于 32 张宽度为 512 的图片
+DEFAULT_PIXEL_BUDGET = 32 * 32 * 512
+# 同一个 batch 中最宽图片与最窄图片的宽度之比的上限
+DEFAULT_MAX_WIDTH_RATIO = 2.0
+
+
+@dataclass
+class BatchingStats(object):
+    """分批结果的统计信息，`padded_pixels` 为补齐（padding）所浪费的计算量。"""
+
+    num_images: int = 0
+    num_batches: int = 0
+    valid_pixels: int = 0
+    padded_pixels: int = 0
+
+    @property
+    def padding_ratio(self) -> float:
+        """补齐的像素占所有输入像素的比例。"""
+        total = self.valid_pixels + self.padded_pixels
+        return self.padded_pixels / total if total > 0 else 0.0
+
+    def update(self, other: 'BatchingStats') -> 'BatchingStats':
+        self.num_images += other.num_images
+        self.num_batches += other.num_batches
+        self.valid_pixels += other.valid_pixels
+        self.padded_pixels += other.padded_pixels
+        return self
+
+
+def plan_batches(
+    widths: Sequence[int],
+    batch_size: int,
+    *,
+    pixel_budget: Optional[int] = None,
+    height: int = 32,
+    max_width_ratio: float = DEFAULT_MAX_WIDTH_RATIO,
+    min_padded_width: int = 0,
+    sort: bool = True,
+) -> Tuple[List[List[int]], BatchingStats]:
+    """
+    把一组文本行图片分成多个 batch。
+
+    - `pixel_budget is None` 时，按固定大小 `batch_size` 依次切分（`sort==True` 时先按宽度排序）；
+    - 否则先按宽度从小到大排序，再依次放入当前 batch；如果加入后 batch 超过 `batch_size` 张图片、
+      padding 后的像素数超过 `pixel_budget`，或者宽度超过 batch 中最窄图片的 `max_width_ratio` 倍，
+      就开始一个新的 batch。这样宽度相近的图片会被分在一起，很宽的图片不会让一批窄图片都补齐到它的宽度。
+
+    Args:
+        widths (Sequence[int]): 每张图片 resize 到模型输入高度之后的宽度
+        batch_size (int): 每个 batch 最多包含的图片数
+        pixel_budget (Optional[int]): 每个 batch 最多包含的像素数（batch_size * height * padded_width）
+        height (int): 模型输入的高度
+        max_width_ratio (float): 同一个 batch 中最宽图片与最窄图片的宽度之比的上限
+        min_padded_width (int): 模型输入的最小宽度，不足的会被补齐到此宽度
+        sort (bool): 使用固定大小切分时，是否先按宽度排序
+
+    Returns:
+        tuple: (batches, stats)，batches 中每个元素为一个 batch 中图片的下标；stats 为 `BatchingStats`
+    """
+    batch_size = max(1, batch_size)
+    indices = list(range(len(widths)))
+    if sort or pixel_budget is not None:
+        indices.sort(key=lambda i: widths[i])
+
+    batches = []
+    if pixel_budget is None:
+        batches = [
+            indices[start : start + batch_size]
+            for start in range(0, len(indices), batch_size)
+        ]
+    else:
+        for idx in indices:
+            padded_width = max(widths[idx], min_padded_width)
+            if batches:
+                batch = batches[-1]
+                first_width = max(widths[batch[0]], min_padded_width, 1)
+                if (
+                    len(batch) < batch_size
+                    and (len(batch) + 1) * height * padded_width <= pixel_budget
+                    and padded_width <= max_width_ratio * first_width
+                ):
+                    batch.append(idx)
+                    continue
+            batches.append([idx])
+
+    stats = BatchingStats(num_images=len(widths), num_batches=len(batches))
+    for batch in batches:
+        batch_widths = [widths[i] for i in batch]
+        padded_width = max(max(batch_widths), min_padded_width)
+        stats.valid_pixels += height * sum(batch_widths)
+        stats.padded_pixels += height * (len(batch) * padded_width - sum(batch_widths))
+    logger.debug(
+        'split %d images into %d batches, padding ratio: %.4f'
+        % (stats.num_images, stats.num_batches, stats.padding_ratio)
+    )
+    return batches, stats
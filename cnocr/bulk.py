@@ -0,0 +1,244 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 用多进程批量识别大量图片文件，结果写入 JSONL 文件。
+
+import os
+import time
+import logging
+import multiprocessing as mp
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .result_sink import open_result_sink
+
+logger = logging.getLogger(__name__)
+
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# 每个 worker 进程中的 OCR 配置，由 `_init_worker()` 设置
+_WORKER_STATE = {}
+
+
+def iter_image_files(
+    root: Union[str, Path],
+    recursive: bool = True,
+    extensions: Sequence[str] = IMG_EXTENSIONS,
+) -> Iterator[str]:
+    """
+    按文件名排序，依次返回目录中的图片文件路径。
+
+    Args:
+        root (Union[str, Path]): 图片文件或者目录
+        recursive (bool): 是否遍历子目录
+        extensions (Sequence[str]): 图片文件的扩展名（小写）
+
+    Returns:
+        Iterator[str]: 图片文件路径
+    """
+    root = str(root)
+    if os.path.isfile(root):
+        yield root
+        return
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        for fn in sorted(file_names):
+            if os.path.splitext(fn)[1].lower() in extensions:
+                yield os.path.join(dir_path, fn)
+        if not recursive:
+            break
+
+
+def split_cores(num_workers: int) -> List[List[int]]:
+    """把当前进程可以使用的 CPU 核尽量平均地分给 `num_workers` 个 worker。"""
+    if hasattr(os, 'sched_getaffinity'):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    num_workers = max(1, num_workers)
+    if num_workers > len(cores):
+        return [[cores[idx % len(cores)]] for idx in range(num_workers)]
+    return [[int(c) for c in chunk] for chunk in np.array_split(cores, num_workers)]
+
+
+def _init_worker(
+    ocr_kwargs: Dict[str, Any],
+    det_kwargs: Dict[str, Any],
+    core_groups: Optional[List[List[int]]],
+    counter,
+):
+    with counter.get_lock():
+        worker_idx = counter.value
+        counter.value += 1
+
+    ocr_kwargs = dict(ocr_kwargs)
+    if core_groups:
+        cores = core_groups[worker_idx % len(core_groups)]
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+        # 每个 worker 的线程数不超过分给它的核数，避免进程之间互相争抢
+        import torch
+
+        torch.set_num_threads(len(cores))
+        rec_more_configs = dict(ocr_kwargs.get('rec_more_configs') or {})
+        ort_session_options = dict(rec_more_configs.get('ort_session_options') or {})
+        ort_session_options.setdefault('intra_op_num_threads', len(cores))
+        rec_more_configs['ort_session_options'] = ort_session_options
+        ocr_kwargs['rec_more_configs'] = rec_more_configs
+        logger.debug('worker %d is pinned to cores %s' % (worker_idx, cores))
+
+    from .cn_ocr import CnOcr
+
+    _WORKER_STATE['ocr'] = CnOcr(**ocr_kwargs)
+    _WORKER_STATE['det_kwargs'] = det_kwargs
+
+
+def _ocr_imgs(
+    ocr, imgs: List[np.ndarray], single_line: bool, rec_batch_size: Optional[int]
+) -> List[Any]:
+    if single_line:
+        # 所有单行图片一次送入识别模型，由其内部按宽度分批
+        return [
+            [out] for out in ocr.ocr_for_single_lines(imgs, batch_size=rec_batch_size)
+        ]
+    return ocr.ocr_batch(
+        imgs, rec_batch_size=rec_batch_size, **_WORKER_STATE['det_kwargs']
+    )
+
+
+def _ocr_chunk(
+    task: Tuple[bool, Optional[int], List[Tuple[int, str]]]
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    在 worker 进程中识别一组图片，返回 `(idx, record)` 的列表。
+    整组识别失败时，再逐张重新识别，只有出错的图片才会得到 `error` 记录。
+    """
+    from .utils import read_img
+
+    single_line, rec_batch_size, items = task
+    ocr = _WORKER_STATE['ocr']
+
+    records, imgs, ok_indices = {}, [], []
+    for idx, fp in items:
+        try:
+            imgs.append(read_img(fp, gray=False))
+            ok_indices.append(idx)
+        except Exception as e:
+            records[idx] = {'image': fp, 'error': str(e)}
+
+    fps = dict(items)
+    try:
+        outs = _ocr_imgs(ocr, imgs, single_line, rec_batch_size)
+    except Exception as e:
+        logger.warning(
+            'failed to ocr a chunk of %d images, retrying them one by one: %s'
+            % (len(imgs), e)
+        )
+        outs = None
+    if outs is not None:
+        for idx, out in zip(ok_indices, outs):
+            records[idx] = {'image': fps[idx], 'results': out}
+    else:
+        for idx, img in zip(ok_indices, imgs):
+            try:
+                out = _ocr_imgs(ocr, [img], single_line, rec_batch_size)[0]
+                records[idx] = {'image': fps[idx], 'results': out}
+            except Exception as e:
+                logger.warning('failed to ocr image %s: %s' % (fps[idx], e))
+                records[idx] = {'image': fps[idx], 'error': str(e)}
+
+    return sorted(records.items())
+
+
+def run_bulk_ocr(
+    fp_list: Sequence[str],
+    output_fp: Union[str, Path],
+    ocr_kwargs: Optional[Dict[str, Any]] = None,
+    det_kwargs: Optional[Dict[str, Any]] = None,
+    *,
+    num_workers: int = 1,
+    pin_cores: bool = True,
+    single_line: bool = False,
+    rec_batch_size: Optional[int] = None,
+    chunk_size: int = 16,
+    ordered: bool = True,
+    **sink_kwargs,
+) -> Dict[str, Any]:
+    """
+    使用 `num_workers` 个进程批量识别图片，每个进程只初始化一次 `CnOcr`。
+    结果写入 `output_fp`：文件后缀为 `.parquet`、`.arrow` 或 `.feather` 时使用列式格式（参考 `ArrowResultSink`），
+    否则每行结果以 JSON 的格式写入，格式为 `{"image": <fp>, "results": [...]}`，
+    出错的图片为 `{"image": <fp>, "error": <message>}`。
+
+    Args:
+        fp_list (Sequence[str]): 图片文件路径
+        output_fp (Union[str, Path]): 输出文件路径
+        ocr_kwargs (Optional[Dict[str, Any]]): 初始化 `CnOcr` 的参数
+        det_kwargs (Optional[Dict[str, Any]]): 检测模型 `detect()` 的参数，参考 `CnOcr.ocr()`
+        num_workers (int): 进程数
+        pin_cores (bool): 是否把每个进程绑定到不同的一组 CPU 核上
+        single_line (bool): 图片是否只包含单行文字
+        rec_batch_size (Optional[int]): 识别时的 `batch_size`，参考 `CnOcr.ocr_for_single_lines()`
+        chunk_size (int): 每次交给一个进程的图片数；同一组的图片会一起送入模型
+        ordered (bool): 是否按输入的顺序写出结果；为 `False` 时按完成的顺序写出，慢图片不会阻塞输出
+        **sink_kwargs: 列式输出的其他参数，如 `row_group_size`，参考 `ArrowResultSink`
+
+    Returns:
+        dict: 统计信息，包含 `num_images`、`num_errors`、`seconds` 和 `images_per_second`
+    """
+    ocr_kwargs = ocr_kwargs or {}
+    det_kwargs = det_kwargs or {}
+    num_workers = max(1, num_workers)
+    chunk_size = max(1, chunk_size)
+    items = list(enumerate(fp_list))
+    tasks = [
+        (single_line, rec_batch_size, items[start : start + chunk_size])
+        for start in range(0, len(items), chunk_size)
+    ]
+    core_groups = split_cores(num_workers) if pin_cores else None
+
+    ctx = mp.get_context('spawn')
+    counter = ctx.Value('i', 0)
+    start_time = time.time()
+    num_done, num_errors = 0, 0
+    with open_result_sink(output_fp, **sink_kwargs) as sink, ctx.Pool(
+        num_workers,
+        initializer=_init_worker,
+        initargs=(ocr_kwargs, det_kwargs, core_groups, counter),
+    ) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for records in imap(_ocr_chunk, tasks):
+            for _, record in records:
+                sink.write(**record)
+                num_errors += 'error' in record
+            num_done += len(records)
+            elapsed = time.time() - start_time
+            logger.info(
+                '%d/%d images done, %.2f images/s'
+                % (num_done, len(items), num_done / max(elapsed, 1e-6))
+            )
+
+    elapsed = time.time() - start_time
+    return {
+        'num_images': num_done,
+        'num_errors': num_errors,
+        'seconds': elapsed,
+        'images_per_second': num_done / max(elapsed, 1e-6),
+    }
@@ -0,0 +1,141 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 识别模型的级联：先用快速的模型识别所有文本行，得分低或未通过校验的文本行再用更准确的模型识别。
+
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FALLBACK_SCORE_THRESH = 0.8
+
+
+class RecognizerCascade(object):
+    """
+    两级的识别模型。所有文本行先由 `primary` 识别；得分低于 `score_thresh`，
+    或识别出的文本未通过 `validator` 校验的文本行，再由 `fallback` 重新识别。
+
+    合并结果时：指定了 `validator` 且两个结果中只有一个通过校验时，使用通过校验的结果；
+    否则使用 `fallback` 的结果（两个模型的得分不可直接比较，所以不按得分选择）。
+
+    与 `Recognizer` 等识别模型的 `recognize()` 接口相同，可以直接替换。
+    """
+
+    def __init__(
+        self,
+        primary,
+        fallback,
+        score_thresh: float = DEFAULT_FALLBACK_SCORE_THRESH,
+        validator: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        Args:
+            primary: 快速的识别模型，如 `densenet_lite_136-gru` 对应的 `Recognizer`
+            fallback: 更准确的识别模型，如 PP-OCR 的 server 模型对应的 `PPRecognizer`
+            score_thresh (float): 得分低于此值的文本行交给 `fallback` 重新识别
+            validator (Optional[Callable[[str], bool]]): 校验识别出的文本，返回 `False` 的文本行交给 `fallback` 重新识别；
+                例如校验身份证号、日期等格式。默认为 `None`，表示只按得分判断
+        """
+        self.primary = primary
+        self.fallback = fallback
+        self.score_thresh = score_thresh
+        self.validator = validator
+        self._lock = threading.Lock()
+        self._counters = {
+            'num_lines': 0,
+            'num_fallback': 0,
+            'num_low_score': 0,
+            'num_invalid': 0,
+            'num_replaced': 0,
+        }
+
+    def _is_valid(self, text: str) -> bool:
+        return self.validator is None or bool(self.validator(text))
+
+    def recognize(
+        self,
+        img_list: List[np.ndarray],
+        batch_size: int = 1,
+        pixel_budget: Optional[int] = None,
+        return_stats: bool = False,
+        **kwargs,
+    ):
+        """
+        参数和返回值与 `Recognizer.recognize()` 相同；`kwargs`（如 `cand_alphabet`）传给两个模型。
+        `return_stats` 为 `True` 时，返回的分批统计信息包含两个模型的分批。
+        """
+        outs, batching_stats = self.primary.recognize(
+            img_list,
+            batch_size=batch_size,
+            pixel_budget=pixel_budget,
+            return_stats=True,
+            **kwargs,
+        )
+        outs = list(outs)
+        low_score, invalid = set(), set()
+        for idx, (text, score) in enumerate(outs):
+            if score < self.score_thresh:
+                low_score.add(idx)
+            if not self._is_valid(text):
+                invalid.add(idx)
+        todo = sorted(low_score | invalid)
+
+        num_replaced = 0
+        if todo:
+            fallback_outs, fallback_stats = self.fallback.recognize(
+                [img_list[idx] for idx in todo],
+                batch_size=batch_size,
+                pixel_budget=pixel_budget,
+                return_stats=True,
+                **kwargs,
+            )
+            batching_stats.update(fallback_stats)
+            for idx, fallback_out in zip(todo, fallback_outs):
+                if self.validator is not None:
+                    primary_valid = idx not in invalid
+                    if primary_valid and not self._is_valid(fallback_out[0]):
+                        continue
+                if fallback_out[0] != outs[idx][0]:
+                    num_replaced += 1
+                outs[idx] = fallback_out
+            logger.debug(
+                'fallback recognizer is used for %d of %d lines'
+                % (len(todo), len(img_list))
+            )
+
+        with self._lock:
+            self._counters['num_lines'] += len(img_list)
+            self._counters['num_fallback'] += len(todo)
+            self._counters['num_low_score'] += len(low_score)
+            self._counters['num_invalid'] += len(invalid)
+            self._counters['num_replaced'] += num_replaced
+        return (outs, batching_stats) if return_stats else outs
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        识别的文本行数、交给 `fallback` 的文本行数（及其中得分低、未通过校验的行数），
+        以及 `fallback` 改变了识别文本的行数。
+        """
+        with self._lock:
+            res = dict(self._counters)
+        res['fallback_rate'] = res['num_fallback'] / max(res['num_lines'], 1)
+        return res
@@ -23,7 +23,6 @@ import logging
 import time
 from collections import Counter
 import json
-import glob
 from operator import itemgetter
 from pathlib import Path
 from multiprocessing import Process
@@ -49,6 +48,10 @@ from cnocr.data_utils.aug import NormalizeAug
 from cnocr.trainer import PlTrainer, resave_model, Metrics
 from cnocr import CnOcr, gen_model
 from cnocr.recognizer import Recognizer
+from cnocr.bulk import iter_image_files, run_bulk_ocr
+from cnocr.result_sink import COLUMNAR_SUFFIXES, DEFAULT_ROW_GROUP_SIZE
+from cnocr.batch_job import BatchOcrJob, parse_shard, read_manifest, select_shard
+from cnocr.cascade import DEFAULT_FALLBACK_SCORE_THRESH
 
 _CONTEXT_SETTINGS = {"help_option_names": ['-h', '--help']}
 logger = set_logger(log_level=logging.INFO)
@@ -234,6 +237,18 @@ def visualize_example(example, fp_prefix):
     default=None,
     help='识别模型使用训练好的模型。默认为 `None`，表示使用系统自带的预训练模型',
 )
+@click.option(
+    '--fallback-rec-model-name',
+    type=str,
+    default=None,
+    help='备用识别模型名称，如 `ch_PP-OCRv4_server`。得分低的文本行会再用此模型识别。默认为 `None`，表示不使用备用模型',
+)
+@click.option(
+    '--fallback-score-thresh',
+    type=float,
+    default=DEFAULT_FALLBACK_SCORE_THRESH,
+    help='得分低于此值的文本行交给备用识别模型重新识别。默认值为 `%s`' % DEFAULT_FALLBACK_SCORE_THRESH,
+)
 @click.option(
     "-c",
     "--context",
@@ -260,6 +275,34 @@ def visualize_example(example, fp_prefix):
 @click.option(
     "--verbose", is_flag=True, default=False, help="是否打印详细日志信息。默认值为 `False`",
 )
+@click.option(
+    "-r", "--recursive", is_flag=True, default=False, help="输入为文件夹时，是否也识别其子文件夹中的图片",
+)
+@click.option(
+    "-o",
+    "--output-fp",
+    default=None,
+    help="批量模式：识别结果写入此文件。后缀为 `.parquet`、`.arrow` 或 `.feather` 时使用列式格式（需安装 pyarrow），"
+    "每个文本框一行；否则写为 JSONL，每行对应一张图片。取值为 `None` 表示逐张识别并打印结果",
+)
+@click.option(
+    "--num-workers", type=int, default=1, help="批量模式下使用的进程数，每个进程绑定到不同的 CPU 核上。默认值为 `1`",
+)
+@click.option(
+    "--chunk-size", type=int, default=16, help="批量模式下每次交给一个进程的图片数。默认值为 `16`",
+)
+@click.option(
+    "--rec-batch-size", type=int, default=None, help="批量模式下识别时的 batch size。默认值为 `None`，表示自动分批",
+)
+@click.option(
+    "--unordered", is_flag=True, default=False, help="批量模式下按完成的顺序（而不是输入的顺序）写出结果",
+)
+@click.option(
+    "--row-group-size",
+    type=int,
+    default=DEFAULT_ROW_GROUP_SIZE,
+    help="批量模式下使用列式格式时，每个 row group 包含的文本框数。默认值为 `%d`" % DEFAULT_ROW_GROUP_SIZE,
+)
 def predict(
     rec_model_name,
     rec_model_backend,
@@ -268,6 +311,8 @@ def predict(
     det_model_backend,
     det_resized_shape,
     pretrained_model_fp,
+    fallback_rec_model_name,
+    fallback_score_thresh,
     context,
     img_file_or_dir,
     single_line,
@@ -275,6 +320,13 @@ def predict(
     draw_font_path,
     show_details,
     verbose,
+    recursive,
+    output_fp,
+    num_workers,
+    chunk_size,
+    rec_batch_size,
+    unordered,
+    row_group_size,
 ):
     """模型预测""",
     if verbose:
@@ -282,20 +334,15 @@ def predict(
     else:
         logger = set_logger(log_level=logging.INFO)
 
-    fp_list = []
-    if os.path.isfile(img_file_or_dir):
-        fp_list.append(img_file_or_dir)
-    elif os.path.isdir(img_file_or_dir):
-        fn_list = glob.glob1(img_file_or_dir, '*g')
-        fp_list = [os.path.join(img_file_or_dir, fn) for fn in fn_list]
-    else:
+    if not os.path.exists(img_file_or_dir):
         raise ValueError(
             f'"{img_file_or_dir}" is not found, which must be a file or a directory'
         )
+    fp_list = list(iter_image_files(img_file_or_dir, recursive=recursive))
     if len(fp_list) == 0:
         raise ValueError(f'No image is found from "{img_file_or_dir}".')
 
-    ocr = CnOcr(
+    ocr_kwargs = dict(
         rec_model_name=rec_model_name,
         rec_model_backend=rec_model_backend,
         rec_vocab_fp=rec_vocab_fp,
@@ -303,8 +350,31 @@ def predict(
         det_model_backend=det_model_backend,
         rec_model_fp=pretrained_model_fp,
         context=context,
+        fallback_rec_model_name=fallback_rec_model_name,
+        fallback_score_thresh=fallback_score_thresh,
         # det_more_configs={'rotated_bbox': False},
     )
+    if output_fp is not None:
+        stats = run_bulk_ocr(
+            fp_list,
+            output_fp,
+            ocr_kwargs,
+            det_kwargs={'resized_shape': det_resized_shape},
+            num_workers=num_workers,
+            single_line=single_line,
+            rec_batch_size=rec_batch_size,
+            chunk_size=chunk_size,
+            ordered=not unordered,
+            **(
+                {'row_group_size': row_group_size}
+                if output_fp.lower().endswith(COLUMNAR_SUFFIXES)
+                else {}
+            ),
+        )
+        logger.info('bulk ocr is done: %s' % stats)
+        return
+
+    ocr = CnOcr(**ocr_kwargs)
     ocr_func = ocr.ocr_for_single_line if single_line else ocr.ocr
     ocr_kwargs = {}
     if not single_line:
@@ -343,6 +413,121 @@ def predict(
                     fp, res, out_draw_fp=out_draw_fp, font_path=draw_font_path
                 )
 
+    if ocr.rec_cascade is not None:
+        logger.info('fallback recognizer stats: %s' % ocr.rec_cascade.stats())
+
+
+@cli.command('batch')
+@click.option(
+    '-m',
+    '--rec-model-name',
+    type=str,
+    default=DEFAULT_MODEL_NAME,
+    help='识别模型名称。默认值为 %s' % DEFAULT_MODEL_NAME,
+)
+@click.option(
+    '-b',
+    '--rec-model-backend',
+    type=click.Choice(['pytorch', 'onnx']),
+    default='onnx',
+    help='识别模型类型。默认值为 `onnx`',
+)
+@click.option(
+    '-d',
+    '--det-model-name',
+    type=str,
+    default='ch_PP-OCRv5_det',
+    help='检测模型名称。默认值为 ch_PP-OCRv5_det',
+)
+@click.option(
+    '--det-model-backend',
+    type=click.Choice(['pytorch', 'onnx']),
+    default='onnx',
+    help='检测模型类型。默认值为 `onnx`',
+)
+@click.option(
+    '--det-resized-shape', type=int, default=768, help='检测模型输入图像尺寸。默认值为 768',
+)
+@click.option(
+    '-p',
+    '--pretrained-model-fp',
+    type=str,
+    default=None,
+    help='识别模型使用训练好的模型。默认为 `None`，表示使用系统自带的预训练模型',
+)
+@click.option(
+    "-c",
+    "--context",
+    help="使用cpu还是 `gpu` 运行代码，也可指定为特定gpu，如`cuda:0`。默认为 `cpu`",
+    type=str,
+    default='cpu',
+)
+@click.option(
+    "-i",
+    "--manifest-fp",
+    required=True,
+    help="任务清单文件，每行的第一列为图片路径（可以直接使用训练/评估用的 tsv 文件）",
+)
+@click.option(
+    "--img-folder", default=None, help="清单中的图片路径为相对路径时，所相对的目录",
+)
+@click.option("-o", "--output-fp", required=True, help="识别结果写入此 JSONL 文件，每行对应一张图片")
+@click.option(
+    "--progress-fp",
+    default=None,
+    help="进度文件路径，用于中断后继续运行。默认值为 `None`，表示使用 `<output-fp>.progress`",
+)
+@click.option(
+    "--shard",
+    default='0/1',
+    help="形如 `i/n`，表示只处理清单的第 i 个分片（共 n 个，i 从 0 开始），多台机器可用同一清单分工。默认值为 `0/1`",
+)
+@click.option(
+    "--report-interval", type=float, default=30.0, help="每隔多少秒打印一次速度和预计剩余时间。默认值为 `30`",
+)
+def batch(
+    rec_model_name,
+    rec_model_backend,
+    det_model_name,
+    det_model_backend,
+    det_resized_shape,
+    pretrained_model_fp,
+    context,
+    manifest_fp,
+    img_folder,
+    output_fp,
+    progress_fp,
+    shard,
+    report_interval,
+):
+    """可断点续跑、可分片的批量识别任务"""
+    shard_idx, num_shards = parse_shard(shard)
+    img_fp_list = select_shard(
+        read_manifest(manifest_fp, img_folder=img_folder), shard_idx, num_shards
+    )
+    logger.info(
+        'shard %d/%d: %d images to process' % (shard_idx, num_shards, len(img_fp_list))
+    )
+
+    ocr = CnOcr(
+        rec_model_name=rec_model_name,
+        rec_model_backend=rec_model_backend,
+        det_model_name=det_model_name,
+        det_model_backend=det_model_backend,
+        rec_model_fp=pretrained_model_fp,
+        context=context,
+    )
+    job = BatchOcrJob(
+        ocr,
+        img_fp_list,
+        output_fp,
+        progress_fp=progress_fp,
+        report_interval=report_interval,
+        resized_shape=det_resized_shape,
+    )
+    stats = job.run()
+    logger.info('batch job is done: %s' % stats)
+
 
 @cli.command('evaluate')
 @click.option(
@@ -542,8 +727,111 @@ def resave_model_file(
     resave_model(input_model_fp, output_model_fp, map_location='cpu')
 
 
-def export_to_onnx(model_name, vocab_fp, output_model_fp, input_model_fp=None):
+def export_to_onnx(
+    model_name,
+    vocab_fp,
+    output_model_fp,
+    input_model_fp=None,
+    with_best_path=False,
+    with_cand_mask=False,
+    with_uint8_input=False,
+    input_norm='cnocr',
+    quantize_mode=None,
+    calib_index_fp=None,
+    image_folder=None,
+    calib_size=200,
+    eval_index_fp=None,
+    report_fp=None,
+):
+    import tempfile
+
+    from cnocr.onnx_utils import quantize_onnx_model
+
+    if quantize_mode == 'static':
+        if calib_index_fp is None or image_folder is None:
+            raise ValueError(
+                '`calib_index_fp` and `image_folder` are required for static quantization'
+            )
+        _check_static_quantization(model_name)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 需要量化时，fp32 模型先存在临时目录中，量化后的模型才存入 `output_model_fp`
+        fp32_model_fp = (
+            output_model_fp
+            if quantize_mode is None
+            else os.path.join(tmp_dir, 'fp32.onnx')
+        )
+        _export_fp32_onnx(
+            model_name,
+            vocab_fp,
+            fp32_model_fp,
+            input_model_fp,
+            with_best_path=with_best_path,
+            with_cand_mask=with_cand_mask,
+            with_uint8_input=with_uint8_input,
+            input_norm=input_norm,
+        )
+        if quantize_mode is None:
+            return
+
+        calibration_inputs = None
+        if quantize_mode == 'static':
+            img_fps = [
+                os.path.join(image_folder, fn)
+                for fn, _ in read_input_file(calib_index_fp)[:calib_size]
+            ]
+            calib_ocr = _build_onnx_ocr(model_name, vocab_fp, fp32_model_fp)
+            calibration_inputs = gen_calibration_inputs(calib_ocr.rec_model, img_fps)
+        quantize_onnx_model(
+            fp32_model_fp,
+            output_model_fp,
+            mode=quantize_mode,
+            calibration_inputs=calibration_inputs,
+        )
+
+        if eval_index_fp is not None and image_folder is not None:
+            if calib_index_fp is not None and os.path.abspath(
+                eval_index_fp
+            ) == os.path.abspath(calib_index_fp):
+                logger.warning(
+                    'the evaluation data is the calibration data, '
+                    'so the reported INT8 accuracy is likely to be overestimated'
+                )
+            report_fp = report_fp or os.path.splitext(output_model_fp)[0] + '-report.json'
+            report_quantization(
+                model_name,
+                vocab_fp,
+                {'fp32': fp32_model_fp, 'int8': output_model_fp},
+                read_input_file(eval_index_fp),
+                image_folder,
+                report_fp,
+            )
+
+
+def _export_fp32_onnx(
+    model_name,
+    vocab_fp,
+    output_model_fp,
+    input_model_fp=None,
+    with_best_path=False,
+    with_cand_mask=False,
+    with_uint8_input=False,
+    input_norm='cnocr',
+):
     import onnx
+    from cnocr.onnx_utils import transform_onnx_model
+
+    if input_model_fp is not None and input_model_fp.endswith('.onnx'):
+        # 已经是 ONNX 模型，只做图层面的改写
+        transform_onnx_model(
+            input_model_fp,
+            output_model_fp,
+            with_best_path=with_best_path,
+            with_cand_mask=with_cand_mask,
+            with_uint8_input=with_uint8_input,
+            input_norm=input_norm,
+        )
+        return
 
     ocr = Recognizer(
         model_name, model_backend='pytorch', model_fp=input_model_fp, vocab_fp=vocab_fp,
@@ -575,9 +863,103 @@ def export_to_onnx(model_name, vocab_fp, output_model_fp, input_model_fp=None):
 
     onnx_model = onnx.load(output_model_fp)
     onnx.checker.check_model(onnx_model)
+    if with_best_path or with_uint8_input:
+        transform_onnx_model(
+            output_model_fp,
+            output_model_fp,
+            with_best_path=with_best_path,
+            with_cand_mask=with_cand_mask,
+            with_uint8_input=with_uint8_input,
+            input_norm=input_norm,
+        )
     logger.info('model is exported to %s' % output_model_fp)
 
 
+def _build_onnx_ocr(model_name, vocab_fp, model_fp):
+    return CnOcr(
+        rec_model_name=model_name,
+        rec_model_backend='onnx',
+        rec_vocab_fp=vocab_fp,
+        rec_model_fp=model_fp,
+        det_model_name='naive_det',
+    )
+
+
+_STATIC_QUANT_MSG = (
+    'static quantization only supports cnocr models (`Recognizer`) '
+    'and PaddleOCR models loaded by `PPRecognizer`, not %s'
+)
+
+
+def _check_static_quantization(model_name):
+    """rapidocr 的识别模型（`RapidRecognizer`）不暴露模型输入，无法生成校准数据。"""
+    from cnocr.consts import AVAILABLE_MODELS
+
+    rec_name = AVAILABLE_MODELS.get_value(model_name, 'onnx', 'recognizer')
+    if rec_name == 'RapidRecognizer':
+        raise ValueError(_STATIC_QUANT_MSG % model_name)
+
+
+def gen_calibration_inputs(rec_model, img_fps):
+    """逐张图片生成静态量化使用的校准数据，即 ONNX 模型的输入。"""
+    from cnocr.ppocr import RapidRecognizer
+
+    if isinstance(rec_model, RapidRecognizer):
+        raise ValueError(_STATIC_QUANT_MSG % rec_model._model_name)
+    return _iter_calibration_inputs(rec_model, img_fps)
+
+
+def _iter_calibration_inputs(rec_model, img_fps):
+    from cnocr.ppocr import PPRecognizer
+    from cnocr.utils import get_resized_width
+
+    for img_fp in img_fps:
+        img = rec_model._prepare_img(img_fp)
+        height, width = img.shape[:2]
+        if isinstance(rec_model, PPRecognizer):
+            inputs = rec_model._onnx_inputs(
+                rec_model.resize_norm_img_batch([img], width / height)
+            )
+        else:
+            imgs, img_lengths = rec_model._transform_batch(
+                [img], [get_resized_width(height, width)]
+            )
+            inputs = rec_model._onnx_inputs(imgs, img_lengths)
+        # batch 数组会被复用，所以需要复制
+        yield {name: value.copy() for name, value in inputs.items()}
+
+
+def report_quantization(
+    model_name, vocab_fp, model_fps, fn_labels_list, image_folder, report_fp
+):
+    """在同一份评估数据上比较 fp32 模型与量化模型的精度和速度，结果存入 `report_fp`（json）。"""
+    cer = torchmetrics.text.CharErrorRate()
+    img_fps = [os.path.join(image_folder, fn) for fn, _ in fn_labels_list]
+    reals = [''.join(labels) for _, labels in fn_labels_list]
+    imgs = [read_img(img_fp) for img_fp in img_fps]
+
+    report = {'num_images': len(imgs)}
+    for tag, model_fp in model_fps.items():
+        ocr = _build_onnx_ocr(model_name, vocab_fp, model_fp)
+        ocr.ocr_for_single_lines(imgs[:1])  # warmup
+        start_time = time.time()
+        outs = ocr.ocr_for_single_lines(imgs, batch_size=1)
+        time_cost = time.time() - start_time
+        preds = [out['text'] for out in outs]
+        report[tag] = {
+            'model_size_mb': os.path.getsize(model_fp) / 1024 ** 2,
+            'accuracy': float(np.mean([p == r for p, r in zip(preds, reals)])),
+            'cer': float(cer(preds=preds, target=reals)),
+            'ms_per_image': 1000 * time_cost / max(len(imgs), 1),
+        }
+        logger.info('%s model: %s' % (tag, report[tag]))
+
+    with open(report_fp, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info('quantization report is saved to %s' % report_fp)
+    return report
+
+
 @cli.command('export-onnx')
 @click.option(
     '-m',
@@ -598,17 +980,245 @@ def export_to_onnx(model_name, vocab_fp, output_model_fp, input_model_fp=None):
     '--input-model-fp',
     type=str,
     default=None,
-    help='输入的识别模型文件路径。 默认为 `None`，表示使用系统自带的预训练模型',
+    help='输入的识别模型文件路径。 默认为 `None`，表示使用系统自带的预训练模型。'
+    '如果传入的是 `.onnx` 文件（包括 PaddleOCR 的识别模型），则只对其做图层面的改写',
 )
 @click.option(
     '-o', '--output-model-fp', type=str, required=True, help='输出的识别模型文件路径（.onnx）'
 )
+@click.option(
+    '--with-best-path',
+    is_flag=True,
+    help='在图内追加 ArgMax/ReduceMax 节点，模型只输出每帧的 best path 索引（int32）及其概率，'
+    '而不是完整的 logits。默认为 `False`',
+)
+@click.option(
+    '--with-cand-mask',
+    is_flag=True,
+    help='与 `--with-best-path` 一起使用，增加 `cand_mask` 输入，使模型在图内支持候选字符集合。默认为 `False`',
+)
+@click.option(
+    '--with-uint8-input',
+    is_flag=True,
+    help='把模型的图片输入改为 uint8，类型转换和归一化都在图内完成。默认为 `False`',
+)
+@click.option(
+    '--input-norm',
+    type=click.Choice(['cnocr', 'ppocr']),
+    default='cnocr',
+    help='与 `--with-uint8-input` 一起使用，指定模型的归一化方式：'
+    '`cnocr` 为 `x / 255`，`ppocr` 为 `(x / 255 - 0.5) / 0.5`（PaddleOCR 的识别模型）。'
+    '注：`ppocr` 的 uint8 模型用 128 填充，归一化后不是 0，所以与 float32 模型的结果不是逐位相同的。默认为 `cnocr`',
+)
+@click.option(
+    '-q',
+    '--quantize-mode',
+    type=click.Choice(['dynamic', 'static']),
+    default=None,
+    help='把导出的模型量化为 INT8 模型：`dynamic` 为动态量化，无需校准数据；'
+    '`static` 为静态量化，需要通过 `--calib-index-fp` 和 `--image-folder` 提供校准数据。'
+    '默认为 `None`，表示不量化',
+)
+@click.option(
+    '--calib-index-fp',
+    type=str,
+    default=None,
+    help='静态量化使用的校准数据索引文件，格式与 `cnocr evaluate` 的 `--eval-index-fp` 相同',
+)
+@click.option(
+    '--image-folder', type=str, default=None, help='校准及评估图片所在的文件夹',
+)
+@click.option(
+    '--calib-size', type=int, default=200, help='最多使用多少张图片做校准。默认为 `200`',
+)
+@click.option(
+    '--eval-index-fp',
+    type=str,
+    default=None,
+    help='比较 fp32 与量化模型精度和速度时使用的评估数据索引文件，应与校准数据不同，'
+    '否则会高估量化模型的精度。默认为 `None`，表示不做比较',
+)
+@click.option(
+    '--report-fp',
+    type=str,
+    default=None,
+    help='精度与速度比较结果的存储路径（json）。默认为 `None`，表示存在输出模型旁边的 `*-report.json` 文件中',
+)
 def export_onnx_model(
-    rec_model_name, rec_vocab_fp, input_model_fp, output_model_fp,
+    rec_model_name,
+    rec_vocab_fp,
+    input_model_fp,
+    output_model_fp,
+    with_best_path,
+    with_cand_mask,
+    with_uint8_input,
+    input_norm,
+    quantize_mode,
+    calib_index_fp,
+    image_folder,
+    calib_size,
+    eval_index_fp,
+    report_fp,
 ):
-    """把训练好的识别模型导出为 ONNX 格式。
+    """把训练好的识别模型导出为 ONNX 格式，可选量化为 INT8 模型。
     """
-    export_to_onnx(rec_model_name, rec_vocab_fp, output_model_fp, input_model_fp)
+    export_to_onnx(
+        rec_model_name,
+        rec_vocab_fp,
+        output_model_fp,
+        input_model_fp,
+        with_best_path=with_best_path,
+        with_cand_mask=with_cand_mask,
+        with_uint8_input=with_uint8_input,
+        input_norm=input_norm,
+        quantize_mode=quantize_mode,
+        calib_index_fp=calib_index_fp,
+        image_folder=image_folder,
+        calib_size=calib_size,
+        eval_index_fp=eval_index_fp,
+        report_fp=report_fp,
+    )
+
+
+def slice_model_vocab(
+    model_name,
+    vocab_fp,
+    input_model_fp,
+    output_model_fp,
+    chars,
+    output_vocab_fp=None,
+):
+    """
+    只保留 `chars` 中的字符，生成输出层更小的识别模型及其对应的词表文件，返回词表文件路径。
+    输入为 `.onnx` 文件时直接改写图中输出层的权重；否则载入 PyTorch 模型，切片后按
+    `output_model_fp` 的后缀存为 `.ckpt` 文件或者导出为 `.onnx` 文件。
+    """
+    import tempfile
+
+    import onnx
+    from cnocr.consts import AVAILABLE_MODELS
+    from cnocr.onnx_utils import slice_output_head
+
+    is_onnx_input = input_model_fp is not None and input_model_fp.endswith('.onnx')
+    if vocab_fp is None:
+        vocab_fp = AVAILABLE_MODELS.get_vocab_fp(
+            model_name, 'onnx' if is_onnx_input else 'pytorch'
+        )
+    vocab, letter2id = read_charset(vocab_fp)
+
+    chars = set(word if word != ' ' else '<space>' for word in chars)
+    excluded = chars - set(vocab)
+    if excluded:
+        logger.warning('chars not in the vocab are ignored: %s' % excluded)
+    new_vocab = [word for word in vocab if word in chars]
+    if not new_vocab:
+        raise ValueError('none of the chars is in the vocab %s' % vocab_fp)
+
+    output_vocab_fp = (
+        output_vocab_fp or os.path.splitext(output_model_fp)[0] + '-vocab.txt'
+    )
+    with open(output_vocab_fp, 'w', encoding='utf-8') as f:
+        for word in new_vocab:
+            f.write(word + '\n')
+
+    if is_onnx_input:
+        if not output_model_fp.endswith('.onnx'):
+            raise ValueError('the output model should be an ONNX model for ONNX input')
+        model = onnx.load(input_model_fp)
+        class_index = [letter2id[word] for word in new_vocab] + [len(vocab)]
+        slice_output_head(model, class_index)
+        onnx.checker.check_model(model)
+        onnx.save(model, output_model_fp)
+    else:
+        ocr = Recognizer(
+            model_name,
+            model_backend='pytorch',
+            model_fp=input_model_fp,
+            vocab_fp=vocab_fp,
+        )
+        model = ocr._model.slice_vocab(new_vocab)
+        if output_model_fp.endswith('.onnx'):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                ckpt_fp = os.path.join(tmp_dir, 'sliced.ckpt')
+                torch.save({'state_dict': model.state_dict()}, ckpt_fp)
+                _export_fp32_onnx(model_name, output_vocab_fp, output_model_fp, ckpt_fp)
+        else:
+            torch.save({'state_dict': model.state_dict()}, output_model_fp)
+
+    logger.info(
+        'output layer is sliced from %d to %d classes; model is saved to %s, vocab to %s'
+        % (len(vocab) + 1, len(new_vocab) + 1, output_model_fp, output_vocab_fp)
+    )
+    return output_vocab_fp
+
+
+@cli.command('slice-vocab')
+@click.option(
+    '-m',
+    '--rec-model-name',
+    type=str,
+    default=DEFAULT_MODEL_NAME,
+    help='识别模型名称。默认值为 `%s`' % DEFAULT_MODEL_NAME,
+)
+@click.option(
+    '-v',
+    '--rec-vocab-fp',
+    type=str,
+    default=None,
+    help='识别模型使用的词表。默认取值为 `None` 表示使用系统设定的词表',
+)
+@click.option(
+    '-i',
+    '--input-model-fp',
+    type=str,
+    default=None,
+    help='输入的识别模型文件路径（.ckpt 或者 cnocr 导出的 .onnx 文件）。默认为 `None`，表示使用系统自带的预训练模型',
+)
+@click.option(
+    '-o',
+    '--output-model-fp',
+    type=str,
+    required=True,
+    help='输出的识别模型文件路径；后缀为 `.onnx` 时输出 ONNX 模型，否则输出 PyTorch 模型',
+)
+@click.option('-c', '--chars', type=str, default=None, help='保留的字符，如 `0123456789`')
+@click.option(
+    '--chars-fp',
+    type=str,
+    default=None,
+    help='保留的字符所在的文件，每行一个字符，格式与词表文件相同；可以与 `--chars` 一起使用',
+)
+@click.option(
+    '--output-vocab-fp',
+    type=str,
+    default=None,
+    help='输出的词表文件路径，使用新模型时通过 `rec_vocab_fp` 指定。'
+    '默认为 `None`，表示存在输出模型旁边的 `*-vocab.txt` 文件中',
+)
+def slice_vocab(
+    rec_model_name,
+    rec_vocab_fp,
+    input_model_fp,
+    output_model_fp,
+    chars,
+    chars_fp,
+    output_vocab_fp,
+):
+    """只保留部分字符（如数字、字母和常用汉字），生成输出层更小的识别模型及其词表文件。
+    """
+    all_chars = list(chars or '')
+    if chars_fp is not None:
+        all_chars.extend(read_charset(chars_fp)[0])
+    if not all_chars:
+        raise click.UsageError('`--chars` or `--chars-fp` is required')
+    slice_model_vocab(
+        rec_model_name,
+        rec_vocab_fp,
+        input_model_fp,
+        output_model_fp,
+        all_chars,
+        output_vocab_fp=output_vocab_fp,
+    )
 
 
 @cli.command('serve')
@@ -623,23 +1233,56 @@ def export_onnx_model(
     is_flag=True,
     help='whether to reload the server when the codes have been changed',
 )
-def serve(host, port, reload):
+@click.option(
+    '--infer-workers',
+    type=int,
+    default=None,
+    help='number of inference threads. Default: `None`, meaning a quarter of the CPU cores',
+)
+@click.option(
+    '--max-concurrency',
+    type=int,
+    default=None,
+    help='max number of requests processed at the same time. Default: `None`, meaning 4 * infer-workers',
+)
+@click.option(
+    '--auto-tune-batch-size',
+    is_flag=True,
+    help='benchmark the recognition model once before starting the server, '
+    'and choose the recognition batch size from the measured latencies',
+)
+def serve(host, port, reload, infer_workers, max_concurrency, auto_tune_batch_size):
     """开启HTTP服务。"""
 
     path = os.path.realpath(os.path.dirname(__file__))
+    env = {}
+    if infer_workers is not None:
+        env['CNOCR_INFER_WORKERS'] = str(infer_workers)
+    if max_concurrency is not None:
+        env['CNOCR_MAX_CONCURRENCY'] = str(max_concurrency)
+    if auto_tune_batch_size:
+        # 在启动服务之前测量一次并保存结果，服务进程只读取保存的结果，不会同时测量
+        CnOcr(det_model_name='naive_det').tune_rec_batch_size()
+        env['CNOCR_AUTO_TUNE_BATCH_SIZE'] = '1'
     api = Process(
         target=start_server,
-        kwargs={'path': path, 'host': host, 'port': port, 'reload': reload},
+        kwargs={
+            'path': path,
+            'host': host,
+            'port': port,
+            'reload': reload,
+            'env': env,
+        },
     )
     api.start()
     api.join()
 
 
-def start_server(path, host, port, reload):
+def start_server(path, host, port, reload, env=None):
     cmd = ['uvicorn', 'serve:app', '--host', host, '--port', str(port)]
     if reload:
         cmd.append('--reload')
-    subprocess.call(cmd, cwd=path)
+    subprocess.call(cmd, cwd=path, env=dict(os.environ, **(env or {})))
 
 
 if __name__ == "__main__":
@@ -18,10 +18,11 @@
 # under the License.
 
 import os
+import json
 import logging
-from copy import deepcopy
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Union, List, Any, Dict, Optional, Collection
+from typing import Union, List, Any, Dict, Optional, Collection, Iterable, Iterator, Tuple, Callable
 from pathlib import Path
 
 import numpy as np
@@ -35,6 +36,11 @@ from .consts import AVAILABLE_MODELS as REC_AVAILABLE_MODELS
 from .utils import data_dir, read_img
 from .line_split import line_split
 from .recognizer import Recognizer
+from .batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_PIXEL_BUDGET
+from .batch_tuner import BatchSizeTuner
+from .pipeline import run_pipeline
+from .cascade import DEFAULT_FALLBACK_SCORE_THRESH, RecognizerCascade
+from .result_cache import RecognitionCache, ResultCache, image_cache_key
 from .ppocr import PPRecognizer, RapidRecognizer, PP_SPACE
 
 logger = logging.getLogger(__name__)
@@ -43,6 +49,38 @@ DET_MODLE_NAMES, _ = zip(*DET_AVAILABLE_MODELS.all_models())
 DET_MODLE_NAMES = set(DET_MODLE_NAMES)
 
 
+def _cand_key(cand_alphabet) -> Optional[List[str]]:
+    """候选字符集合在缓存 key 中的形式，与字符的顺序和重复无关。"""
+    return None if cand_alphabet is None else sorted(set(cand_alphabet))
+
+
+def _plain_configs(configs: Optional[Dict[str, Any]]) -> List[Tuple[str, Any]]:
+    """只保留取值为基本类型的配置项，如 `ort_session_options` 等对象不影响识别结果，其 `repr()` 在各个进程中也不相同。"""
+    plain_types = (str, int, float, bool, type(None), list, tuple, dict)
+    return sorted(
+        (key, val) for key, val in (configs or {}).items() if isinstance(val, plain_types)
+    )
+
+
+def _callable_key(fn: Optional[Callable], use_cache: bool) -> Optional[str]:
+    """
+    函数在缓存 key 中的标识：`<module>.<qualname>`，在各个进程中都相同。
+    lambda 和嵌套函数的标识不能区分不同的函数，所以使用缓存时不接受它们。
+    """
+    if fn is None:
+        return None
+    qualname = getattr(fn, '__qualname__', None)
+    if qualname is None:  # 如可调用的对象，只在当前进程中可以区分
+        return repr(fn)
+    if use_cache and ('<lambda>' in qualname or '<locals>' in qualname):
+        raise ValueError(
+            '%s can not be told apart from other functions in cache keys; '
+            'use a module-level function when `result_cache` or `rec_cache` is set'
+            % qualname
+        )
+    return '%s.%s' % (getattr(fn, '__module__', None), qualname)
+
+
 @dataclass
 class OcrResult(object):
     text: str
@@ -51,7 +89,8 @@ class OcrResult(object):
     cropped_img: np.ndarray = None
 
     def to_dict(self):
-        res = deepcopy(self.__dict__)
+        # 浅拷贝即可，`position` 和 `cropped_img` 都是只读的结果数组，没必要复制
+        res = dict(self.__dict__)
         if self.position is None:
             res.pop('position')
         if self.cropped_img is None:
@@ -59,6 +98,124 @@ class OcrResult(object):
         return res
 
 
+class OcrResults(object):
+    """
+    一张图片的所有识别结果，按列紧凑存储：
+
+        - `texts` (List[str]): 识别出的文本
+        - `scores` (np.ndarray): 得分，shape: (N,)；dtype 与识别模型给出的得分一致
+          （如 Python float 对应 float64），`to_compact()` 后为 float32
+        - `boxes` (np.ndarray or None): 文本框，shape: (N, 4, 2)；dtype 与检测模型给出的文本框一致，
+          `to_compact()` 后为 float32；未使用检测模型时为 `None`
+        - `crops` (List[np.ndarray] or None): 文本框图片，为检测结果中图片的引用而非拷贝；
+          只有 `return_cropped_image==True` 时才有值
+
+    `results[i]` 返回第 i 个文本框的 `OcrResult`，其中 `position` 为 `boxes` 的视图（view）；
+    `to_dicts()` 返回与 `CnOcr.ocr()` 相同格式的结果，得分和文本框的类型与之前逐个文本框构建的结果相同。
+    """
+
+    __slots__ = ('texts', 'scores', 'boxes', 'crops')
+
+    def __init__(
+        self,
+        texts: List[str],
+        scores: Union[List[float], np.ndarray],
+        boxes: Optional[Union[List[np.ndarray], np.ndarray]] = None,
+        crops: Optional[List[np.ndarray]] = None,
+    ):
+        self.texts = list(texts)
+        self.scores = np.asarray(scores).reshape(-1)
+        if boxes is not None:
+            boxes = np.asarray(boxes).reshape(-1, 4, 2)
+        self.boxes = boxes
+        self.crops = crops
+
+    @classmethod
+    def from_dicts(cls, dicts: List[Dict[str, Any]]) -> 'OcrResults':
+        """从 `CnOcr.ocr()` 格式的结果构建。"""
+        has_box = len(dicts) > 0 and dicts[0].get('position') is not None
+        has_crop = len(dicts) > 0 and dicts[0].get('cropped_img') is not None
+        return cls(
+            texts=[d['text'] for d in dicts],
+            scores=[d['score'] for d in dicts],
+            boxes=[d['position'] for d in dicts] if has_box else None,
+            crops=[d['cropped_img'] for d in dicts] if has_crop else None,
+        )
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, idx: int) -> OcrResult:
+        score = self.scores[idx]
+        if self.scores.dtype == np.float64:
+            score = score.item()  # 由 Python float 构建，还原为 Python float
+        return OcrResult(
+            text=self.texts[idx],
+            score=score,
+            position=self.boxes[idx] if self.boxes is not None else None,
+            cropped_img=self.crops[idx] if self.crops is not None else None,
+        )
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __repr__(self):
+        return 'OcrResults(%s)' % self.to_dicts()
+
+    def to_compact(self) -> 'OcrResults':
+        """得分和文本框都转为 float32 的紧凑格式；已经是 float32 时不复制。"""
+        return OcrResults(
+            self.texts,
+            self.scores.astype(np.float32, copy=False),
+            None if self.boxes is None else self.boxes.astype(np.float32, copy=False),
+            self.crops,
+        )
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """返回与 `CnOcr.ocr()` 相同格式的结果，`position` 为 `boxes` 的视图。"""
+        return [res.to_dict() for res in self]
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        返回可以直接被 JSON 序列化的结果（不包含 `cropped_img`）。
+        `position` 为嵌套的 list，由 `boxes` 一次性转换得到，而不是逐个文本框调用 `tolist()`。
+        """
+        scores = self.scores.tolist()
+        if self.boxes is None:
+            return [
+                {'text': text, 'score': score}
+                for text, score in zip(self.texts, scores)
+            ]
+        return [
+            {'text': text, 'score': score, 'position': position}
+            for text, score, position in zip(self.texts, scores, self.boxes.tolist())
+        ]
+
+    def to_json(self) -> bytes:
+        """
+        序列化为 JSON（不包含 `cropped_img`），格式与 `to_records()` 相同。
+        安装了 `orjson` 时使用它直接序列化 `boxes` 中的数组，否则使用标准库 `json`。
+        """
+        try:
+            import orjson
+        except ImportError:
+            return json.dumps(self.to_records(), ensure_ascii=False).encode('utf-8')
+
+        scores = self.scores.tolist()
+        if self.boxes is None:
+            records = [
+                {'text': text, 'score': score}
+                for text, score in zip(self.texts, scores)
+            ]
+        else:
+            records = [
+                {'text': text, 'score': score, 'position': position}
+                for text, score, position in zip(self.texts, scores, self.boxes)
+            ]
+        return orjson.dumps(records, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
 class CnOcr(object):
     def __init__(
         self,
@@ -76,6 +233,15 @@ class CnOcr(object):
         det_model_backend: str = 'onnx',  # ['pytorch', 'onnx']
         det_more_configs: Optional[Dict[str, Any]] = None,
         det_root: Union[str, Path] = det_data_dir(),
+        auto_tune_batch_size: bool = False,
+        result_cache: Optional[ResultCache] = None,
+        rec_cache: Optional[RecognitionCache] = None,
+        fallback_rec_model_name: Optional[str] = None,
+        fallback_rec_model_backend: str = 'onnx',
+        fallback_rec_model_fp: Optional[str] = None,
+        fallback_rec_more_configs: Optional[Dict[str, Any]] = None,
+        fallback_score_thresh: float = DEFAULT_FALLBACK_SCORE_THRESH,
+        fallback_validator: Optional[Callable[[str], bool]] = None,
         **kwargs,
     ):
         """
@@ -103,6 +269,25 @@ class CnOcr(object):
             det_root: 检测模型文件所在的根目录。
                 Linux/Mac下默认值为 `~/.cnstd`，表示模型文件所处文件夹类似 `~/.cnstd/1.2/db_resnet18`
                 Windows下默认值为 `C:/Users/<username>/AppData/Roaming/cnstd`。
+            auto_tune_batch_size (bool): 是否根据本机实测的识别速度，自动选择每次识别时的 batch size。
+                初始化时会读取已保存的测量结果，没有的话先测量一次并保存，参考 `tune_rec_batch_size()`。
+                默认为 `False`。
+            result_cache (Optional[ResultCache]): 识别结果的缓存。同一张图片（像素完全相同）使用相同的检测参数再次识别时，
+                `ocr()` 直接返回缓存的结果。默认为 `None`，表示不使用缓存；参考 `ResultCache`。
+            rec_cache (Optional[RecognitionCache]): 文本行级别的识别缓存。识别前先按文本行图片的指纹去重并查找缓存，
+                只有未命中的文本行才送入识别模型，适合表格、票据等模板化的文档。
+                默认为 `None`，表示不使用缓存；参考 `RecognitionCache`。
+            fallback_rec_model_name (Optional[str]): 备用识别模型的名称，通常是更慢但更准确的模型，如 `ch_PP-OCRv4_server`。
+                指定后，所有文本行先用 `rec_model_name` 识别，得分低于 `fallback_score_thresh`
+                或未通过 `fallback_validator` 校验的文本行再用备用模型识别，参考 `RecognizerCascade`。
+                默认为 `None`，表示不使用备用模型
+            fallback_rec_model_backend (str): 备用识别模型的后端，'pytorch', or 'onnx'。默认为 'onnx'
+            fallback_rec_model_fp (Optional[str]): 备用识别模型的模型文件路径
+            fallback_rec_more_configs (Optional[Dict[str, Any]]): 备用识别模型初始化时传入的其他参数
+            fallback_score_thresh (float): 得分低于此值的文本行交给备用模型重新识别。默认为 `0.8`
+            fallback_validator (Optional[Callable[[str], bool]]): 校验识别出的文本，返回 `False` 的文本行交给备用模型重新识别。
+                使用 `result_cache` 或 `rec_cache` 时须为模块级的函数（不能是 lambda 或嵌套函数），
+                缓存 key 中以 `<module>.<qualname>` 区分不同的函数。默认为 `None`
             **kwargs: 目前未被使用。
 
         Examples:
@@ -115,6 +300,9 @@ class CnOcr(object):
             识别时只考虑数字：
             >>> ocr = CnOcr(rec_model_name='densenet_lite_136-gru', det_model_name='naive_det', cand_alphabet='0123456789')
 
+            识别得分低的文本行再用更准确的模型识别：
+            >>> ocr = CnOcr('densenet_lite_136-gru', fallback_rec_model_name='ch_PP-OCRv4_server', fallback_score_thresh=0.8)
+
             只检测和识别水平文字：
             >>> ocr = CnOcr(rec_model_name='densenet_lite_136-gru', det_model_name='db_shufflenet_v2_small', det_more_configs={'rotated_bbox': False})
 
@@ -123,47 +311,38 @@ class CnOcr(object):
             # 兼容前面的版本
             rec_model_name = kwargs.get('model_name')
 
-        self.rec_space = REC_AVAILABLE_MODELS.get_space(
-            rec_model_name, rec_model_backend
-        )
-        if self.rec_space is None:
-            logger.warning(
-                'no available model is found for name %s and backend %s'
-                % (rec_model_name, rec_model_backend)
-            )
-            rec_model_backend = 'onnx' if rec_model_backend == 'pytorch' else 'pytorch'
-            logger.warning(
-                'trying to use name %s and backend %s'
-                % (rec_model_name, rec_model_backend)
-            )
-            self.rec_space = REC_AVAILABLE_MODELS.get_space(
-                rec_model_name, rec_model_backend
-            )
-
-        if self.rec_space == REC_AVAILABLE_MODELS.CNOCR_SPACE:
-            rec_cls = Recognizer
-        elif self.rec_space == PP_SPACE:
-            rec_name = REC_AVAILABLE_MODELS.get_value(rec_model_name, rec_model_backend, 'recognizer')
-            rec_cls = RapidRecognizer if rec_name == 'RapidRecognizer' else PPRecognizer
-            if rec_vocab_fp is not None:
-                logger.warning('param `vocab_fp` is invalid for %s models' % PP_SPACE)
-        else:
-            raise NotImplementedError(
-                '%s is not supported currently' % ((rec_model_name, rec_model_backend),)
-            )
-
         rec_more_configs = rec_more_configs or dict()
-        self.rec_model = rec_cls(
-            model_name=rec_model_name,
-            model_backend=rec_model_backend,
+        self.rec_space, self.rec_model = self._create_rec_model(
+            rec_model_name,
+            rec_model_backend,
             cand_alphabet=cand_alphabet,
             context=context,
             model_fp=rec_model_fp,
             root=rec_root,
             vocab_fp=rec_vocab_fp,
-            **rec_more_configs,
+            more_configs=rec_more_configs,
         )
 
+        self.fallback_rec_model = None
+        self.rec_cascade = None
+        if fallback_rec_model_name is not None:
+            _, self.fallback_rec_model = self._create_rec_model(
+                fallback_rec_model_name,
+                fallback_rec_model_backend,
+                cand_alphabet=cand_alphabet,
+                context=context,
+                model_fp=fallback_rec_model_fp,
+                root=rec_root,
+                vocab_fp=None,
+                more_configs=fallback_rec_more_configs or dict(),
+            )
+            self.rec_cascade = RecognizerCascade(
+                self.rec_model,
+                self.fallback_rec_model,
+                score_thresh=fallback_score_thresh,
+                validator=fallback_validator,
+            )
+
         self.det_model = None
         if det_model_name in DET_MODLE_NAMES:
             det_more_configs = det_more_configs or dict()
@@ -176,13 +355,130 @@ class CnOcr(object):
                 **det_more_configs,
             )
 
+        self.batch_tuner = None
+        if auto_tune_batch_size:
+            self.tune_rec_batch_size()
+
+        self.result_cache = result_cache
+        self.rec_cache = rec_cache
+        # 影响识别结果的模型参数，是缓存 key 的一部分。候选字符可以用 `rec_model.set_cand_alphabet()` 修改，
+        # 所以不在这里，而是在每次调用时由 `_rec_signature()` 加入
+        self._rec_configs = (
+            rec_model_name,
+            rec_model_backend,
+            rec_model_fp,
+            None if rec_vocab_fp is None else str(rec_vocab_fp),
+            _plain_configs(rec_more_configs),
+            fallback_rec_model_name,
+            fallback_rec_model_fp,
+            fallback_score_thresh if fallback_rec_model_name is not None else None,
+            _callable_key(
+                fallback_validator,
+                use_cache=result_cache is not None or rec_cache is not None,
+            ),
+        )
+        self._rec_signature_memo = None
+        self._det_signature = (
+            det_model_name if self.det_model is not None else None,
+            det_model_backend,
+            det_model_fp,
+            _plain_configs(det_more_configs),
+        )
+
+    def _rec_signature(self) -> str:
+        """识别模型及其当前候选字符的标识；候选字符没有变化时直接返回上次的结果。"""
+        rec_models = [self.rec_model, self.fallback_rec_model]
+        candidates = tuple(getattr(model, 'candidates', None) for model in rec_models)
+        memo = self._rec_signature_memo
+        if memo is not None and all(a is b for a, b in zip(memo[0], candidates)):
+            return memo[1]
+        signature = repr(
+            (
+                self._rec_configs,
+                [None if cands is None else sorted(cands) for cands in candidates],
+            )
+        )
+        self._rec_signature_memo = (candidates, signature)
+        return signature
+
+    @staticmethod
+    def _create_rec_model(
+        model_name: str,
+        model_backend: str,
+        *,
+        cand_alphabet,
+        context: str,
+        model_fp: Optional[str],
+        root: Union[str, Path],
+        vocab_fp: Optional[Union[str, Path]],
+        more_configs: Dict[str, Any],
+    ):
+        """根据模型名称和后端选出识别模型的类并初始化，返回 (rec_space, rec_model)。"""
+        rec_space = REC_AVAILABLE_MODELS.get_space(model_name, model_backend)
+        if rec_space is None:
+            logger.warning(
+                'no available model is found for name %s and backend %s'
+                % (model_name, model_backend)
+            )
+            model_backend = 'onnx' if model_backend == 'pytorch' else 'pytorch'
+            logger.warning(
+                'trying to use name %s and backend %s' % (model_name, model_backend)
+            )
+            rec_space = REC_AVAILABLE_MODELS.get_space(model_name, model_backend)
+
+        if rec_space == REC_AVAILABLE_MODELS.CNOCR_SPACE:
+            rec_cls = Recognizer
+        elif rec_space == PP_SPACE:
+            rec_name = REC_AVAILABLE_MODELS.get_value(model_name, model_backend, 'recognizer')
+            rec_cls = RapidRecognizer if rec_name == 'RapidRecognizer' else PPRecognizer
+            if vocab_fp is not None:
+                logger.warning('param `vocab_fp` is invalid for %s models' % PP_SPACE)
+        else:
+            raise NotImplementedError(
+                '%s is not supported currently' % ((model_name, model_backend),)
+            )
+
+        rec_model = rec_cls(
+            model_name=model_name,
+            model_backend=model_backend,
+            cand_alphabet=cand_alphabet,
+            context=context,
+            model_fp=model_fp,
+            root=root,
+            vocab_fp=vocab_fp,
+            **more_configs,
+        )
+        return rec_space, rec_model
+
+    def tune_rec_batch_size(
+        self, force: bool = False, **kwargs
+    ) -> BatchSizeTuner:
+        """
+        测量识别模型在本机上不同 batch size 和图片宽度下的耗时，之后调用 `ocr()` 或 `ocr_for_single_lines()`
+        且不指定 batch size 时，会根据图片的数量和宽度自动选择最快的 batch size。
+        测量结果会存入 `data_dir()`，之后的进程直接读取。
+
+        Args:
+            force (bool): 是否忽略已保存的测量结果，重新测量。默认为 `False`
+            **kwargs: 传给 `BatchSizeTuner.tune()` 的参数，如 `widths`、`repeats`
+
+        Returns:
+            BatchSizeTuner: 测量好的 tuner
+        """
+        self.batch_tuner = BatchSizeTuner(self.rec_model).load_or_tune(
+            force=force, **kwargs
+        )
+        return self.batch_tuner
+
     def ocr(
         self,
         img_fp: Union[str, Path, Image.Image, torch.Tensor, np.ndarray],
-        rec_batch_size=1,
+        rec_batch_size: Optional[int] = None,
         return_cropped_image=False,
+        return_compact=False,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
         **det_kwargs,
-    ) -> List[Dict[str, Any]]:
+    ) -> Union[List[Dict[str, Any]], OcrResults]:
         """
         识别函数。
 
@@ -192,8 +488,13 @@ class CnOcr(object):
                 or color image torch.Tensor or np.ndarray,
                     with shape [height, width] or [height, width, channel].
                     channel should be 1 (gray image) or 3 (RGB formatted color image). scaled in [0, 255];
-            rec_batch_size: `batch_size` when recognizing detected text boxes. Default: `1`.
+            rec_batch_size: `batch_size` when recognizing detected text boxes. Default: `None`,
+                which means the default of `ocr_for_single_lines()`.
             return_cropped_image: 是否返回检测出的文本框图片数据.
+            return_compact: 是否返回紧凑格式的 `OcrResults`（按列存储，不为每个文本框创建 dict），
+                而不是 list of dict。默认为 `False`
+            cand_alphabet: 只对本次调用生效的候选字符集合，参考 `ocr_for_single_lines()`。
+                默认为 `None`，表示使用初始化时指定的 `cand_alphabet`
             **det_kwargs: kwargs for the detector model when calling its `detect()` function.
                 - resized_shape: `int` or `tuple`, `tuple` 含义为 (height, width), `int` 则表示高宽都为此值；
                       检测前，先把原始图片resize到接近此大小（只是接近，未必相等）。默认为 `(768, 768)`。
@@ -237,14 +538,226 @@ class CnOcr(object):
              ]
             ```
         """
+        cache_key = None
+        if self.result_cache is not None and not return_cropped_image:
+            img_fp = self._load_img(img_fp)
+            cache_key, results = self.lookup_cache(
+                img_fp, cand_alphabet=cand_alphabet, **det_kwargs
+            )
+            if results is not None:
+                return results.to_compact() if return_compact else results.to_dicts()
+
+        detected_texts, crops = self.detect_lines(img_fp, **det_kwargs)
+        ocr_outs = self.ocr_for_single_lines(
+            crops, batch_size=rec_batch_size, cand_alphabet=cand_alphabet
+        )
+        results = self.gen_results(
+            ocr_outs, detected_texts, crops, return_cropped_image
+        )
+        if cache_key is not None:
+            self.update_cache(cache_key, results)
+        return results.to_compact() if return_compact else results.to_dicts()
+
+    def lookup_cache(
+        self,
+        img: np.ndarray,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+        **det_kwargs,
+    ) -> Tuple[Optional[str], Optional[OcrResults]]:
+        """
+        在结果缓存中查找图片的识别结果。
+
+        Args:
+            img (np.ndarray): 解码后的图片
+            cand_alphabet (Optional[Union[Collection, str]]): 只对本次调用生效的候选字符集合，参考 `ocr()`；
+                不同的集合对应不同的缓存条目
+            **det_kwargs: 检测模型 `detect()` 的参数，参考 `ocr()`；不同的参数对应不同的缓存条目
+
+        Returns:
+            tuple: (cache_key, results)。未使用缓存时 `cache_key` 为 `None`；
+                未命中时 `results` 为 `None`，识别后可以用 `update_cache(cache_key, results)` 写入缓存
+        """
+        if self.result_cache is None:
+            return None, None
+        if isinstance(img, torch.Tensor):
+            img = img.numpy()
+        params = [self._rec_signature(), self._det_signature, sorted(det_kwargs.items())]
+        if cand_alphabet is not None:
+            params.append(_cand_key(cand_alphabet))
+        cache_key = image_cache_key(img, *params)
+        value = self.result_cache.get(cache_key)
+        if value is None:
+            return cache_key, None
+        texts, scores, boxes = value
+        # 返回副本，调用方修改结果时不会影响缓存
+        return cache_key, OcrResults(
+            texts, scores.copy(), None if boxes is None else boxes.copy()
+        )
+
+    def update_cache(self, cache_key: Optional[str], results: OcrResults):
+        """把 `lookup_cache()` 未命中的图片的识别结果写入缓存；`cache_key` 为 `None` 时什么都不做。"""
+        if self.result_cache is None or cache_key is None:
+            return
+        boxes = None if results.boxes is None else results.boxes.copy()
+        self.result_cache.put(
+            cache_key, (list(results.texts), results.scores.copy(), boxes)
+        )
+
+    def detect_lines(
+        self,
+        img_fp: Union[str, Path, Image.Image, torch.Tensor, np.ndarray],
+        **det_kwargs,
+    ) -> Tuple[Optional[List[Dict[str, Any]]], List[np.ndarray]]:
+        """
+        只检测图片中的文本行，不做识别；未使用检测模型时，直接把图片按行切分。
+        与 `ocr_for_single_lines()` 和 `gen_results()` 配合使用时，检测和识别可以分开调度，
+        如 `serve.py` 中把多个并发请求的文本行合在一起识别。
+
+        Args:
+            img_fp (Union[str, Path, Image.Image, torch.Tensor, np.ndarray]): 图片，格式与 `ocr()` 的 `img_fp` 相同
+            **det_kwargs: 检测模型 `detect()` 的参数，参考 `ocr()`
+
+        Returns:
+            tuple: (detected_texts, crops)。`detected_texts` 为检测模型返回的文本框信息，
+                未使用检测模型时为 `None`；`crops` 为各个文本行的图片
+        """
         if isinstance(img_fp, Image.Image):  # Image to np.ndarray
             img_fp = np.asarray(img_fp.convert('RGB'))
 
+        if self.det_model is None:
+            return None, self._split_lines(img_fp)
+
+        box_infos = self.det_model.detect(self._prepare_det_img(img_fp), **det_kwargs)
+        detected_texts = box_infos['detected_texts']
+        return detected_texts, [box_info['cropped_img'] for box_info in detected_texts]
+
+    def ocr_batch(
+        self,
+        img_list: List[Union[str, Path, Image.Image, torch.Tensor, np.ndarray]],
+        rec_batch_size: Optional[int] = None,
+        return_cropped_image=False,
+        return_compact=False,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+        **det_kwargs,
+    ) -> List[Union[List[Dict[str, Any]], OcrResults]]:
+        """
+        批量识别多张图片。检测模型一次处理一组图片（CnStd 的批量 `detect()`），
+        所有图片中检测出的文本框再合在一起，按宽度分桶后送入识别模型，最后再把结果分回到各张图片。
+        图片较多且每张图片中有很多短文本行时（如扫描的文档），比逐张调用 `ocr()` 快很多。
+
+        Args:
+            img_list (List[Union[str, Path, Image.Image, torch.Tensor, np.ndarray]]): 图片列表，
+                每个元素的格式与 `ocr()` 的 `img_fp` 相同。
+                注：所有图片及其文本框会同时放在内存中，图片很多时请分组调用。
+            rec_batch_size: 识别时的 `batch_size`，参考 `ocr_for_single_lines()`。默认为 `None`
+            return_cropped_image: 是否返回检测出的文本框图片数据
+            return_compact: 是否返回紧凑格式的 `OcrResults`，参考 `ocr()`
+            cand_alphabet: 只对本次调用生效的候选字符集合，参考 `ocr()`
+            **det_kwargs: 检测模型 `detect()` 的参数，参考 `ocr()`；其中 `batch_size` 为检测时每批的图片数
+
+        Returns:
+            list: 与 `img_list` 一一对应，每个元素为对应图片的识别结果，格式与 `ocr()` 的返回值相同
+        """
+        img_list = [
+            np.asarray(img.convert('RGB')) if isinstance(img, Image.Image) else img
+            for img in img_list
+        ]
+        if len(img_list) == 0:
+            return []
+
         if self.det_model is not None:
-            return self._ocr_with_det_model(
-                img_fp, rec_batch_size, return_cropped_image, **det_kwargs
+            det_outs = self.det_model.detect(
+                [self._prepare_det_img(img) for img in img_list], **det_kwargs
+            )
+            crops_per_img = [
+                [box_info['cropped_img'] for box_info in det_out['detected_texts']]
+                for det_out in det_outs
+            ]
+        else:
+            crops_per_img = [self._split_lines(img) for img in img_list]
+
+        all_crops = [crop for crops in crops_per_img for crop in crops]
+        all_outs = self.ocr_for_single_lines(
+            all_crops, batch_size=rec_batch_size, cand_alphabet=cand_alphabet
+        )
+
+        results = []
+        start = 0
+        for idx, crops in enumerate(crops_per_img):
+            ocr_outs = all_outs[start : start + len(crops)]
+            start += len(crops)
+            detected_texts = (
+                det_outs[idx]['detected_texts'] if self.det_model is not None else None
+            )
+            res = self.gen_results(
+                ocr_outs, detected_texts, crops, return_cropped_image
+            )
+            results.append(res.to_compact() if return_compact else res.to_dicts())
+
+        return results
+
+    def ocr_stream(
+        self,
+        img_iter: Iterable[Union[str, Path, Image.Image, torch.Tensor, np.ndarray]],
+        rec_batch_size: Optional[int] = None,
+        return_cropped_image=False,
+        queue_size: int = 4,
+        return_compact=False,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+        **det_kwargs,
+    ) -> Iterator[Union[List[Dict[str, Any]], OcrResults]]:
+        """
+        以流水线的方式依次识别多张图片。图片解码、文本检测和文本识别分别在不同的线程中运行，
+        阶段之间用大小为 `queue_size` 的队列连接，所以识别第 N 张图片时，第 N+1 张图片的检测可以同时进行。
+        适合处理很多图片（如目录或视频帧）的场景，同时在内存中的图片数量是有界的。
+
+        Args:
+            img_iter (Iterable[Union[str, Path, Image.Image, torch.Tensor, np.ndarray]]): 图片的可迭代对象，
+                每个元素的格式与 `ocr()` 的 `img_fp` 相同；可以是生成器，会被逐个读取
+            rec_batch_size: 识别时的 `batch_size`，参考 `ocr_for_single_lines()`。默认为 `None`
+            return_cropped_image: 是否返回检测出的文本框图片数据
+            queue_size (int): 相邻阶段之间队列的大小，用于限制占用的内存。默认为 `4`
+            return_compact: 是否返回紧凑格式的 `OcrResults`，参考 `ocr()`
+            cand_alphabet: 只对本次调用生效的候选字符集合，参考 `ocr()`
+            **det_kwargs: 检测模型 `detect()` 的参数，参考 `ocr()`
+
+        Returns:
+            生成器，按输入的顺序依次返回每张图片的识别结果，格式与 `ocr()` 的返回值相同。
+            某张图片处理出错时，异常会在该图片对应的位置被抛出。
+        """
+
+        def _detect(img):
+            return self.detect_lines(img, **det_kwargs)
+
+        def _recognize(det_out):
+            detected_texts, crops = det_out
+            ocr_outs = self.ocr_for_single_lines(
+                crops, batch_size=rec_batch_size, cand_alphabet=cand_alphabet
             )
+            res = self.gen_results(ocr_outs, detected_texts, crops, return_cropped_image)
+            return res.to_compact() if return_compact else res.to_dicts()
+
+        return run_pipeline(
+            img_iter, [self._load_img, _detect, _recognize], queue_size=queue_size
+        )
+
+    @staticmethod
+    def _load_img(
+        img: Union[str, Path, Image.Image, torch.Tensor, np.ndarray]
+    ) -> Union[torch.Tensor, np.ndarray]:
+        """读取图片文件，或把 `Image.Image` 转为 RGB 格式的 np.ndarray。"""
+        if isinstance(img, Image.Image):
+            return np.asarray(img.convert('RGB'))
+        if isinstance(img, (str, Path)):
+            if not os.path.isfile(img):
+                raise FileNotFoundError(img)
+            return read_img(img, gray=False)
+        return img
 
+    def _split_lines(
+        self, img_fp: Union[str, Path, torch.Tensor, np.ndarray]
+    ) -> List[np.ndarray]:
+        """不使用检测模型时，直接把图片按行切分。"""
         img = self._prepare_img(img_fp)
 
         if min(img.shape[0], img.shape[1]) < 2:
@@ -254,23 +767,12 @@ class CnOcr(object):
         if len(img.shape) == 3 and img.shape[2] == 1:
             img = np.squeeze(img, axis=-1)
         line_imgs = line_split(img, blank=True)
-        line_img_list = [line_img for line_img, _ in line_imgs]
-        line_chars_list = self.ocr_for_single_lines(
-            line_img_list, batch_size=rec_batch_size
-        )
-        if return_cropped_image:
-            for _out, line_img in zip(line_chars_list, line_img_list):
-                _out['cropped_img'] = line_img
-
-        return line_chars_list
+        return [line_img for line_img, _ in line_imgs]
 
-    def _ocr_with_det_model(
-        self,
-        img: Union[str, Path, torch.Tensor, np.ndarray],
-        rec_batch_size: int,
-        return_cropped_image: bool,
-        **det_kwargs,
-    ) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _prepare_det_img(
+        img: Union[str, Path, torch.Tensor, np.ndarray]
+    ) -> Union[str, Path, np.ndarray]:
         if isinstance(img, torch.Tensor):
             img = img.numpy()
         if isinstance(img, np.ndarray):
@@ -280,24 +782,40 @@ class CnOcr(object):
             if len(img.shape) == 2:
                 # (H, W) -> (H, W, 3)
                 img = np.array(Image.fromarray(img).convert('RGB'))
+        return img
 
-        box_infos = self.det_model.detect(img, **det_kwargs)
+    @staticmethod
+    def gen_results(
+        ocr_outs: List[Dict[str, Any]],
+        detected_texts: Optional[List[Dict[str, Any]]],
+        crops: List[np.ndarray],
+        return_cropped_image: bool = False,
+    ) -> OcrResults:
+        """
+        把 `ocr_for_single_lines()` 的识别结果和 `detect_lines()` 的检测结果合并为 `OcrResults`。
 
-        cropped_img_list = [
-            box_info['cropped_img'] for box_info in box_infos['detected_texts']
-        ]
-        ocr_outs = self.ocr_for_single_lines(
-            cropped_img_list, batch_size=rec_batch_size
-        )
-        results = []
-        for box_info, ocr_out in zip(box_infos['detected_texts'], ocr_outs):
-            _out = OcrResult(**ocr_out)
-            _out.position = box_info['box']
-            if return_cropped_image:
-                _out.cropped_img = box_info['cropped_img']
-            results.append(_out.to_dict())
+        Args:
+            ocr_outs (List[Dict[str, Any]]): 各个文本行的识别结果
+            detected_texts (Optional[List[Dict[str, Any]]]): 检测结果；未使用检测模型时为 `None`
+            crops (List[np.ndarray]): 各个文本行的图片
+            return_cropped_image (bool): 结果中是否包含文本行图片
 
-        return results
+        Returns:
+            OcrResults: 识别结果
+        """
+        boxes = None
+        if detected_texts is not None:
+            boxes = (
+                np.stack([box_info['box'] for box_info in detected_texts])
+                if detected_texts
+                else np.zeros((0, 4, 2))
+            )
+        return OcrResults(
+            texts=[out['text'] for out in ocr_outs],
+            scores=[out['score'] for out in ocr_outs],
+            boxes=boxes,
+            crops=list(crops) if return_cropped_image else None,
+        )
 
     def _prepare_img(
         self, img_fp: Union[str, Path, torch.Tensor, np.ndarray]
@@ -332,7 +850,9 @@ class CnOcr(object):
         return img
 
     def ocr_for_single_line(
-        self, img_fp: Union[str, Path, torch.Tensor, np.ndarray]
+        self,
+        img_fp: Union[str, Path, torch.Tensor, np.ndarray],
+        cand_alphabet: Optional[Union[Collection, str]] = None,
     ) -> Dict[str, Any]:
         """
         Recognize characters from an image with only one-line characters.
@@ -342,6 +862,7 @@ class CnOcr(object):
                 image file path; or image torch.Tensor or np.ndarray,
                 with shape [height, width] or [height, width, channel].
                 The optional channel should be 1 (gray image) or 3 (color image).
+            cand_alphabet: 只对本次调用生效的候选字符集合，参考 `ocr_for_single_lines()`
 
         Returns:
             dict, with keys:
@@ -355,13 +876,15 @@ class CnOcr(object):
             ```
         """
         img = self._prepare_img(img_fp)
-        res = self.ocr_for_single_lines([img])
+        res = self.ocr_for_single_lines([img], cand_alphabet=cand_alphabet)
         return res[0]
 
     def ocr_for_single_lines(
         self,
         img_list: List[Union[str, Path, torch.Tensor, np.ndarray]],
-        batch_size: int = 1,
+        batch_size: Optional[int] = None,
+        pixel_budget: Optional[int] = DEFAULT_PIXEL_BUDGET,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Batch recognize characters from a list of one-line-characters images.
@@ -374,7 +897,16 @@ class CnOcr(object):
                 and with shape [height, width] or [height, width, channel].
                 The optional channel should be 1 (gray image) or 3 (color image).
                 注：img_list 不宜包含太多图片，否则同时导入这些图片会消耗很多内存。
-            batch_size: 待处理图片很多时，需要分批处理，每批图片的数量由此参数指定。默认为 `1`。
+            batch_size: 待处理图片很多时，需要分批处理，每批图片的数量不超过此参数。
+                默认为 `None`，表示使用 `tune_rec_batch_size()` 选出的 batch size；
+                未调用过 `tune_rec_batch_size()` 时使用 `cnocr.batching.DEFAULT_MAX_BATCH_SIZE`。
+            pixel_budget: 每批图片最多包含的像素数（batch_size * height * padded_width）。
+                宽度相近的图片会被分在同一批，每批的大小由此预算决定，参考 `cnocr.batching.plan_batches()`。
+                默认为 `cnocr.batching.DEFAULT_PIXEL_BUDGET`；取值为 `None` 表示按固定的 `batch_size` 分批。
+            cand_alphabet: 只对本次调用生效的候选字符集合，不改变初始化时指定的 `cand_alphabet`，
+                所以不同的调用（如并发的请求）可以使用不同的集合。编译好的集合会被识别模型缓存；
+                候选字符很少时，识别模型只计算这些字符对应的输出。
+                默认为 `None`，表示使用初始化时指定的 `cand_alphabet`
 
         Returns:
             list of detected texts, which element is a dict, with keys:
@@ -396,7 +928,12 @@ class CnOcr(object):
             return []
 
         img_list = [self._prepare_img(img) for img in img_list]
-        outs = self.rec_model.recognize(img_list, batch_size=batch_size)
+        if self.rec_cache is not None:
+            outs = self._recognize_with_cache(
+                img_list, batch_size, pixel_budget, cand_alphabet
+            )
+        else:
+            outs = self._recognize(img_list, batch_size, pixel_budget, cand_alphabet)
 
         results = []
         for text, score in outs:
@@ -404,3 +941,63 @@ class CnOcr(object):
             results.append(_out.to_dict())
 
         return results
+
+    def _recognize(
+        self,
+        img_list: List[np.ndarray],
+        batch_size: Optional[int],
+        pixel_budget: Optional[int],
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+    ) -> List[Tuple[str, float]]:
+        if len(img_list) == 0:
+            return []
+        if batch_size is None and self.batch_tuner is not None:
+            batch_size = self.batch_tuner.choose_batch_size(
+                [img.shape for img in img_list], pixel_budget=pixel_budget
+            )
+        elif batch_size is None:
+            batch_size = DEFAULT_MAX_BATCH_SIZE
+        rec_model = self.rec_cascade if self.rec_cascade is not None else self.rec_model
+        kwargs = {} if cand_alphabet is None else {'cand_alphabet': cand_alphabet}
+        return rec_model.recognize(
+            img_list, batch_size=batch_size, pixel_budget=pixel_budget, **kwargs
+        )
+
+    def _recognize_with_cache(
+        self,
+        img_list: List[np.ndarray],
+        batch_size: Optional[int],
+        pixel_budget: Optional[int],
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """先查 `rec_cache`，指纹相同的文本行只识别一次，再把结果分回到各个位置。"""
+        salt = self._rec_signature()
+        if cand_alphabet is not None:
+            salt += repr(_cand_key(cand_alphabet))
+        outs = [None] * len(img_list)
+        todo = OrderedDict()  # fingerprint -> indices
+        for idx, img in enumerate(img_list):
+            key = self.rec_cache.fingerprint(img, salt=salt)
+            if key in todo:
+                todo[key].append(idx)
+                continue
+            cached = self.rec_cache.get(key)
+            if cached is not None:
+                outs[idx] = cached
+            else:
+                todo[key] = [idx]
+
+        num_deduped = sum(len(indices) - 1 for indices in todo.values())
+        if num_deduped > 0:
+            self.rec_cache.record_deduped(num_deduped)
+        new_outs = self._recognize(
+            [img_list[indices[0]] for indices in todo.values()],
+            batch_size,
+            pixel_budget,
+            cand_alphabet,
+        )
+        for (key, indices), out in zip(todo.items(), new_outs):
+            self.rec_cache.put(key, out)
+            for idx in indices:
+                outs[idx] = out
+        return outs
@@ -158,6 +158,21 @@ def format_hf_hub_url(url: str, is_paid_model=False) -> dict:
     return out_dict
 
 
+# 量化（INT8）模型的名称后缀，如 `densenet_lite_136-gru-int8`、`ch_PP-OCRv3-int8`；
+# 量化模型的文件名为在原模型文件名后面加上此后缀，如 `ch_PP-OCRv3_rec_infer-int8.onnx`
+QUANTIZED_MODEL_SUFFIX = '-int8'
+
+
+def split_quantized_model_name(model_name: str) -> Tuple[str, bool]:
+    """
+    把模型名称拆分为原始模型名称，以及是否为量化模型。
+    如 `densenet_lite_136-gru-int8` -> (`densenet_lite_136-gru`, True)。
+    """
+    if model_name.endswith(QUANTIZED_MODEL_SUFFIX):
+        return model_name[: -len(QUANTIZED_MODEL_SUFFIX)], True
+    return model_name, False
+
+
 class AvailableModels(object):
     CNOCR_SPACE = '__cnocr__'
 
@@ -300,7 +315,13 @@ class AvailableModels(object):
         return set(self.CNOCR_MODELS.keys()) | set(self.OUTER_MODELS.keys())
 
     def __contains__(self, model_name_backend: Tuple[str, str]) -> bool:
-        return model_name_backend in self.all_models()
+        return self._resolve(*model_name_backend) in self.all_models()
+
+    def _resolve(self, model_name, model_backend) -> Tuple[str, str]:
+        """量化模型（名称以 `-int8` 结尾）使用其原始模型的配置。"""
+        if (model_name, model_backend) not in self.all_models():
+            model_name, _ = split_quantized_model_name(model_name)
+        return model_name, model_backend
 
     def register_models(self, model_dict: Dict[Tuple[str, str], Any], space: str):
         assert not space.startswith('__')
@@ -315,6 +336,7 @@ class AvailableModels(object):
             self.OUTER_MODELS[key] = val
 
     def get_space(self, model_name, model_backend) -> Optional[str]:
+        model_name, model_backend = self._resolve(model_name, model_backend)
         if (model_name, model_backend) in self.CNOCR_MODELS:
             return self.CNOCR_SPACE
         elif (model_name, model_backend) in self.OUTER_MODELS:
@@ -324,6 +346,7 @@ class AvailableModels(object):
     def get_vocab_fp(
         self, model_name: str, model_backend: str
     ) -> Optional[Union[str, Path]]:
+        model_name, model_backend = self._resolve(model_name, model_backend)
         if (model_name, model_backend) in self.CNOCR_MODELS:
             return self.CNOCR_MODELS[(model_name, model_backend)]['vocab_fp']
         elif (model_name, model_backend) in self.OUTER_MODELS:
@@ -336,6 +359,7 @@ class AvailableModels(object):
             return CN_VOCAB_FP
 
     def get_value(self, model_name, model_backend, key) -> Optional[Any]:
+        model_name, model_backend = self._resolve(model_name, model_backend)
         if (model_name, model_backend) in self.CNOCR_MODELS:
             info = self.CNOCR_MODELS[(model_name, model_backend)]
         elif (model_name, model_backend) in self.OUTER_MODELS:
@@ -348,11 +372,13 @@ class AvailableModels(object):
         return info.get(key)
 
     def get_epoch(self, model_name, model_backend) -> Optional[int]:
+        model_name, model_backend = self._resolve(model_name, model_backend)
         if (model_name, model_backend) in self.CNOCR_MODELS:
             return self.CNOCR_MODELS[(model_name, model_backend)]['epoch']
         return None
 
     def get_url(self, model_name, model_backend) -> Optional[dict]:
+        model_name, model_backend = self._resolve(model_name, model_backend)
         is_paid_model = False
         if (model_name, model_backend) in self.CNOCR_MODELS:
             url = self.CNOCR_MODELS[(model_name, model_backend)]['url']
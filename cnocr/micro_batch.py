@@ -0,0 +1,221 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 把并发请求中的待处理元素合并成一批，一次送入模型（micro-batching）。
+
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .admission import DeadlineExceeded
+from .lanes import LaneQueues
+
+logger = logging.getLogger(__name__)
+
+
+class _Request(object):
+    __slots__ = ('items', 'future', 'deadline', 'outs', 'num_taken', 'num_done')
+
+    def __init__(self, items: List[Any], future: Future, deadline: Optional[float]):
+        self.items = items
+        self.future = future
+        self.deadline = deadline
+        self.outs = [None] * len(items)
+        self.num_taken = 0
+        self.num_done = 0
+
+
+class MicroBatcher(object):
+    """
+    把多个调用方（如并发的 HTTP 请求）提交的元素合并为一批，调用一次 `batch_fn`，
+    再把结果按顺序分回给各个调用方的 `Future`。
+
+    后台线程取到第一个请求后，最多再等待 `max_wait_ms` 毫秒收集其他请求，
+    或者一直收集到元素总数达到 `max_batch_size`。
+    请求按类别（lane）分开排队：每一批先用 `LaneQueues.pick_lane()` 按权重选出一个类别，
+    从它的队列中取元素，剩下的空间再按优先级从其他类别中取。元素很多的请求会被拆到多批中，
+    所以大的批量请求不会一直占着模型，交互式请求可以在下一批开始时插进来。
+
+    在开始处理之前就已被取消（`future.cancel()`）的请求会被直接跳过；
+    截止时间（`deadline`）已过的请求，其剩下的元素不再处理，`Future` 的结果为 `DeadlineExceeded`。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        num_workers: int = 1,
+        name: str = 'micro-batcher',
+        lane_weights: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Args:
+            batch_fn (Callable[[List[Any]], List[Any]]): 批量处理函数，返回值与输入一一对应
+            max_batch_size (int): 每批最多包含的元素数
+            max_wait_ms (float): 收到第一个请求后，最多等待多少毫秒以收集更多请求
+            num_workers (int): 运行 `batch_fn` 的后台线程数
+            name (str): 后台线程的名称前缀，用于日志
+            lane_weights (Optional[Dict[str, int]]): 各个类别的权重，参考 `LaneQueues`
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self.num_batches = 0
+        self.num_items = 0
+        self._queues = LaneQueues(lane_weights)
+        self._num_queued_items = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads = [
+            threading.Thread(
+                target=self._loop, name='%s-%d' % (name, idx), daemon=True
+            )
+            for idx in range(max(1, num_workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(
+        self,
+        items: Sequence[Any],
+        lane: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Future:
+        """
+        提交一个请求的所有元素。
+
+        Args:
+            items (Sequence[Any]): 待处理的元素
+            lane (Optional[str]): 请求的类别；默认为 `None`，表示优先级最高的类别
+            deadline (Optional[float]): 截止时间（Unix 时间戳）；默认为 `None`，表示没有截止时间
+
+        Returns:
+            Future: 结果为与 `items` 一一对应的 list
+        """
+        future = Future()
+        if len(items) == 0:
+            future.set_result([])
+            return future
+        with self._cond:
+            self._queues.put(lane, _Request(list(items), future, deadline))
+            self._num_queued_items += len(items)
+            self._cond.notify()
+        return future
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._queues and not self._stopping:
+                    self._cond.wait()
+                if not self._queues:
+                    return
+                end_time = time.monotonic() + self.max_wait
+                while self._num_queued_items < self.max_batch_size and not self._stopping:
+                    timeout = end_time - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                chunks = self._take_batch()
+            if chunks:
+                self._run(chunks)
+
+    def _take_batch(self):
+        """从各个类别的队列中取出一批元素，返回 `(request, start, end)` 的列表。调用时需持有锁。"""
+        chunks, capacity = [], self.max_batch_size
+        for lane in self._queues.lanes_by_priority(first=self._queues.pick_lane()):
+            while capacity > 0 and self._queues.size(lane) > 0:
+                request = self._queues.peek(lane)
+                num_left = len(request.items) - request.num_taken
+                if request.num_taken == 0 and not request.future.set_running_or_notify_cancel():
+                    self._pop(lane, num_left)  # 已被取消
+                    continue
+                if request.future.done():
+                    self._pop(lane, num_left)  # 前面的批次已出错
+                    continue
+                if request.deadline is not None and time.time() > request.deadline:
+                    self._pop(lane, num_left)
+                    request.future.set_exception(
+                        DeadlineExceeded('deadline exceeded before %s' % self.name)
+                    )
+                    continue
+                num = min(capacity, num_left)
+                chunks.append((request, request.num_taken, request.num_taken + num))
+                request.num_taken += num
+                self._num_queued_items -= num
+                capacity -= num
+                if request.num_taken == len(request.items):
+                    self._queues.pop(lane)
+        return chunks
+
+    def _pop(self, lane: str, num_left: int):
+        self._queues.pop(lane)
+        self._num_queued_items -= num_left
+
+    def _run(self, chunks):
+        all_items = [
+            item
+            for request, start, end in chunks
+            for item in request.items[start:end]
+        ]
+        try:
+            outs = self.batch_fn(all_items)
+        except Exception as e:
+            for request, _, _ in chunks:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        logger.debug(
+            '%s: %d chunks, %d items in one batch'
+            % (self.name, len(chunks), len(all_items))
+        )
+        finished = []
+        with self._cond:  # 同一个请求的多个部分可能在不同的线程中被处理
+            self.num_batches += 1
+            self.num_items += len(all_items)
+            offset = 0
+            for request, start, end in chunks:
+                request.outs[start:end] = outs[offset : offset + end - start]
+                offset += end - start
+                request.num_done += end - start
+                if request.num_done == len(request.items):
+                    finished.append(request)
+        for request in finished:
+            if not request.future.done():
+                request.future.set_result(request.outs)
+
+    def stats(self) -> Dict[str, Any]:
+        """批次数、元素数，以及各个类别的排队情况。"""
+        with self._cond:
+            return {
+                'num_batches': self.num_batches,
+                'num_items': self.num_items,
+                'lanes': self._queues.stats(),
+            }
+
+    def close(self):
+        """处理完队列中已有的请求后，停止后台线程。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
@@ -18,13 +18,10 @@
 # under the License.
 # Credits: adapted from https://github.com/mindee/doctr
 
-from itertools import groupby
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
+import numpy as np
 import torch
-from torch.nn import functional as F
-
-from ..utils import gen_length_mask
 
 
 class CTCPostProcessor(object):
@@ -46,62 +43,143 @@ class CTCPostProcessor(object):
         vocab: List[str],
         input_lengths: Optional[torch.Tensor] = None,
         blank: int = 0,
+        class_index: Optional[np.ndarray] = None,
     ) -> List[Tuple[List[str], float]]:
         """Implements best path decoding as shown by Graves (Dissertation, p63), highly inspired from
         <https://github.com/githubharald/CTCDecoder>`_.
 
+        No softmax is computed over the whole vocabulary: the best path is the argmax of the raw logits,
+        and the probability of each winning index is `exp(max_logit - logsumexp(logits))`.
+
         Args:
             logits: model output, shape: N x T x C
             vocab: vocabulary to use
             input_lengths: valid sequence lengths
             blank: index of blank label
+            class_index: if given, `logits` only contain these columns of the full output,
+                and the best path is mapped back to the full vocabulary through it
 
         Returns:
             A list of tuples: (word, confidence)
         """
-        # compute softmax
-        probs = F.softmax(logits.permute(0, 2, 1), dim=1)
-        # get char indices along best path
-        best_path = torch.argmax(probs, dim=1)  # [N, T]
+        with torch.no_grad():
+            max_logits, best_path = torch.max(logits, dim=-1)  # [N, T]
+            probs = torch.exp(max_logits - torch.logsumexp(logits, dim=-1))  # [N, T]
+        if input_lengths is not None:
+            input_lengths = input_lengths.cpu().numpy()
+        best_path = best_path.cpu().numpy()
+        if class_index is not None:
+            best_path = class_index[best_path]
+        return CTCPostProcessor.decode_best_path(
+            best_path, probs.cpu().numpy(), vocab, input_lengths, blank
+        )
+
+    @staticmethod
+    def ctc_best_path_np(
+        logits: np.ndarray,
+        vocab: List[str],
+        input_lengths: Optional[np.ndarray] = None,
+        blank: int = 0,
+        class_index: Optional[np.ndarray] = None,
+    ) -> List[Tuple[List[str], float]]:
+        """NumPy version of `ctc_best_path()`, which does not depend on torch.
 
+        Args:
+            logits: model output, shape: N x T x C
+            vocab: vocabulary to use
+            input_lengths: valid sequence lengths
+            blank: index of blank label
+            class_index: if given, `logits` only contain these columns of the full output
+
+        Returns:
+            A list of tuples: (word, confidence)
+        """
+        best_path = logits.argmax(axis=-1)  # [N, T]
+        max_logits = np.take_along_axis(
+            logits, np.expand_dims(best_path, axis=-1), axis=-1
+        )  # [N, T, 1]
+        # exp(max_logit - logsumexp(logits)) == 1 / sum(exp(logits - max_logit))
+        probs = 1.0 / np.exp(logits - max_logits).sum(axis=-1)  # [N, T]
+        if class_index is not None:
+            best_path = class_index[best_path]
+        return CTCPostProcessor.decode_best_path(
+            best_path, probs, vocab, input_lengths, blank
+        )
+
+    @staticmethod
+    def decode_best_path(
+        best_path: np.ndarray,
+        probs: np.ndarray,
+        vocab: List[str],
+        input_lengths: Optional[np.ndarray] = None,
+        blank: int = 0,
+    ) -> List[Tuple[List[str], float]]:
+        """Collapse the best paths of the whole batch at once: a frame is kept only if it is not blank
+        and differs from its previous frame.
+
+        Args:
+            best_path: char indices along the best path, shape: N x T
+            probs: probabilities of the chars along the best path, shape: N x T
+            vocab: vocabulary to use
+            input_lengths: valid sequence lengths
+            blank: index of blank label
+
+        Returns:
+            A list of tuples: (word, confidence)
+        """
         if input_lengths is not None:
-            length_mask = gen_length_mask(input_lengths, probs.shape).to(
-                device=probs.device
-            )  # [N, 1, T]
-            probs.masked_fill_(length_mask, 1.0)
-            best_path.masked_fill_(length_mask.squeeze(1), blank)
+            length_mask = (
+                np.arange(best_path.shape[1])[np.newaxis, :]
+                >= np.asarray(input_lengths)[:, np.newaxis]
+            )  # [N, T]
+            best_path = np.where(length_mask, blank, best_path)
+            probs = np.where(length_mask, probs.dtype.type(1.0), probs)
 
         # define word proba as min proba of sequence
-        probs, _ = torch.max(probs, dim=1)  # [N, T]
-        probs, _ = torch.min(probs, dim=1)  # [N]
+        word_probs = probs.min(axis=1, initial=1.0)  # [N]
 
-        words = []
-        for sequence in best_path:
-            # collapse best path (using itertools.groupby), map to chars, join char list to string
-            collapsed = [vocab[k] for k, _ in groupby(sequence) if k != blank]
-            words.append(collapsed)
+        keep = best_path != blank
+        keep[:, 1:] &= best_path[:, 1:] != best_path[:, :-1]
+        chars = [vocab[k] for k in best_path[keep].tolist()]
+        ends = np.cumsum(keep.sum(axis=1)).tolist()
+        words = [chars[start:end] for start, end in zip([0] + ends[:-1], ends)]
 
-        return list(zip(words, probs.tolist()))
+        return list(zip(words, word_probs.tolist()))
 
     def __call__(  # type: ignore[override]
-        self, logits: torch.Tensor, input_lengths: torch.Tensor = None
+        self,
+        logits: Union[torch.Tensor, np.ndarray],
+        input_lengths: Optional[Union[torch.Tensor, np.ndarray]] = None,
+        class_index: Optional[np.ndarray] = None,
     ) -> List[Tuple[List[str], float]]:
         """
         Performs decoding of raw output with CTC and decoding of CTC predictions
         with label_to_idx mapping dictionnary
 
         Args:
-            logits: raw output of the model, shape (N, C + 1, seq_len)
+            logits: raw output of the model, shape (N, C + 1, seq_len);
+                `np.ndarray` is decoded by `ctc_best_path_np()` without torch
             input_lengths: valid sequence lengths
+            class_index: if given, `logits` only contain these columns of the full output,
+                e.g. the output projection was sliced to the candidate chars
 
         Returns:
             A tuple of 2 lists: a list of str (words) and a list of float (probs)
 
         """
         # Decode CTC
+        if isinstance(logits, np.ndarray):
+            return self.ctc_best_path_np(
+                logits=logits,
+                vocab=self.vocab,
+                input_lengths=input_lengths,
+                blank=len(self.vocab),
+                class_index=class_index,
+            )
         return self.ctc_best_path(
             logits=logits,
             vocab=self.vocab,
             input_lengths=input_lengths,
             blank=len(self.vocab),
+            class_index=class_index,
         )
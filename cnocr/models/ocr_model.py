@@ -26,11 +26,13 @@ import numpy as np
 import torch
 from torch import nn
 from torch.nn import functional as F
+import torch.nn.quantized.dynamic as nnqd
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 from .ctc import CTCPostProcessor
 from ..consts import ENCODER_CONFIGS, DECODER_CONFIGS
 from ..data_utils.utils import encode_sequences
+from ..utils import CandidateMask
 from .densenet import DenseNet, DenseNetLite
 from .mobilenet import gen_mobilenet_v3
 
@@ -166,6 +168,58 @@ class OcrModel(nn.Module):
         )
         return cls(encoder, decoder, decoder_out_len, vocab)
 
+    def quantize_dynamic(self) -> 'OcrModel':
+        """
+        对 GRU/LSTM/Linear 层做 INT8 动态量化（权重量化为 int8，激活值在运行时量化），
+        只能在 CPU 上运行。
+
+        Returns:
+            OcrModel: 量化后的模型（新的对象）
+        """
+        return torch.quantization.quantize_dynamic(
+            self, {nn.GRU, nn.LSTM, nn.Linear}, dtype=torch.qint8
+        )
+
+    def slice_vocab(self, vocab: List[str]) -> 'OcrModel':
+        """
+        只保留词表中的部分字符：输出层只保留这些字符（及最后的 blank）对应的行，
+        其他层不变。只需识别少量字符（如数字、字母和部分常用汉字）时，输出层及之后的解码都会变快。
+
+        Args:
+            vocab (List[str]): 保留的字符，必须都在原词表中；按原词表中的顺序排列
+
+        Returns:
+            OcrModel: 新的模型（原模型不变），其 `vocab` 为 `vocab`
+        """
+        missing = [word for word in vocab if word not in self.letter2id]
+        if missing:
+            raise ValueError('chars not in the vocab of the model: %s' % missing)
+        index = [self.letter2id[word] for word in vocab]
+        if index != sorted(index):
+            raise ValueError('`vocab` should be in the order of the original vocab')
+        index.append(len(self.vocab))  # 间隔符号/填充符号
+
+        # 不复制原模型的输出层，复制后马上替换掉
+        linear, postprocessor = self.linear, self.postprocessor
+        self.linear = self.postprocessor = None
+        try:
+            model = deepcopy(self)
+        finally:
+            self.linear, self.postprocessor = linear, postprocessor
+
+        index = torch.tensor(index, dtype=torch.int64, device=linear.weight.device)
+        model.linear = nn.Linear(
+            linear.in_features, len(index), bias=linear.bias is not None
+        ).to(device=linear.weight.device)
+        with torch.no_grad():
+            model.linear.weight.copy_(linear.weight.index_select(0, index))
+            if linear.bias is not None:
+                model.linear.bias.copy_(linear.bias.index_select(0, index))
+        model.vocab = list(vocab)
+        model.letter2id = {letter: idx for idx, letter in enumerate(model.vocab)}
+        model.postprocessor = CTCPostProcessor(vocab=model.vocab)
+        return model
+
     def calculate_loss(
         self, batch, return_model_output: bool = False, return_preds: bool = False,
     ):
@@ -180,7 +234,7 @@ class OcrModel(nn.Module):
         x: torch.Tensor,
         input_lengths: torch.Tensor,
         target: Optional[List[str]] = None,
-        candidates: Optional[Union[str, List[str]]] = None,
+        candidates: Optional[Union[str, List[str], CandidateMask]] = None,
         return_logits: bool = True,
         return_preds: bool = False,
     ) -> Dict[str, Any]:
@@ -189,7 +243,9 @@ class OcrModel(nn.Module):
         :param x: [B, 1, H, W]; 一组padding后的图片
         :param input_lengths: shape: [B]；每张图片padding前的真实长度（宽度）
         :param target: 真实的字符串
-        :param candidates: None or candidate strs; 允许的候选字符集合
+        :param candidates: None or candidate strs; 允许的候选字符集合。
+            取值为编译好的 `CandidateMask` 时（推理时），输出层只计算候选字符（及 blank）对应的列，
+            返回的 logits 也只包含这些列，列对应的类别索引见返回值中的 `class_index`
         :param return_logits: 是否返回预测的logits值
         :param return_preds: 是否返回预测的字符串
         :return: 预测结果
@@ -213,19 +269,30 @@ class OcrModel(nn.Module):
         logits = self._decode(features_seq, input_lengths)
         # print(f'forward decode: {logits.shape=}, {logits.min()=}, {logits.max()=}')
 
-        logits = self.linear(logits)
-        logits = self.mask_by_candidates(logits, candidates, self.vocab, self.letter2id)
+        class_index = None
+        if isinstance(candidates, CandidateMask) and target is None:
+            class_index = candidates.index
+            logits = self._sliced_linear(logits, class_index)
+        else:
+            logits = self.linear(logits)
+            logits = self.mask_by_candidates(
+                logits, candidates, self.vocab, self.letter2id
+            )
         # print(f'forward linear: {logits.shape=}, {logits.min()=}, {logits.max()=}')
 
         out: OrderedDict[str, Any] = {}
         if return_logits:
             out["logits"] = logits
+            if class_index is not None:
+                out['class_index'] = class_index
         out['output_lengths'] = input_lengths
 
         if target is None or return_preds:
             # Post-process boxes
             if self.postprocessor is not None:
-                out["preds"] = self.postprocessor(logits, input_lengths)
+                out["preds"] = self.postprocessor(
+                    logits, input_lengths, class_index=class_index
+                )
                 # print(f'forward postprocessor: {out["preds"]=}')
 
         if target is not None:
@@ -236,7 +303,9 @@ class OcrModel(nn.Module):
         return dict(out)
 
     def _decode(self, features_seq, input_lengths):
-        if not isinstance(self.decoder, (nn.LSTM, nn.GRU)):
+        if not isinstance(
+            self.decoder, (nn.LSTM, nn.GRU, nnqd.LSTM, nnqd.GRU)
+        ):  # nnqd.*: 见 `quantize_dynamic()`
             return self.decoder(features_seq)
 
         w = features_seq.shape[1]
@@ -252,6 +321,23 @@ class OcrModel(nn.Module):
         )
         return logits
 
+    def _sliced_linear(self, features: torch.Tensor, class_index: np.ndarray):
+        """
+        只计算输出层中 `class_index` 对应的列：候选字符很少时，
+        `[D, k]` 的投影比 `[D, vocab_size+1]` 的投影再屏蔽省很多计算。
+        """
+        index = torch.from_numpy(class_index).to(device=features.device)
+        if isinstance(self.linear, nn.Linear):
+            weight = self.linear.weight.index_select(0, index)
+            bias = (
+                self.linear.bias.index_select(0, index)
+                if self.linear.bias is not None
+                else None
+            )
+            return F.linear(features, weight, bias)
+        # 如量化后的 Linear，其权重不能直接切片，算完整的输出后再取列
+        return self.linear(features).index_select(-1, index)
+
     @classmethod
     def mask_by_candidates(
         cls,
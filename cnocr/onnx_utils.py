@@ -0,0 +1,444 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 对导出的 ONNX 识别模型做图（graph）层面的改写。
+
+import os
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+import numpy as np
+
+from .consts import QUANTIZED_MODEL_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+BEST_PATH_OUTPUT = 'best_path'
+BEST_PATH_PROBS_OUTPUT = 'best_path_probs'
+CAND_MASK_INPUT = 'cand_mask'
+UINT8_INPUT_TYPE = 'tensor(uint8)'
+# 各类识别模型对输入图片的归一化参数：`(x / 255 - mean) / std`
+INPUT_NORM_PARAMS = {
+    'cnocr': (0.0, 1.0),
+    'ppocr': (0.5, 0.5),
+}
+
+
+def _get_opset_version(model) -> int:
+    for opset in model.opset_import:
+        if opset.domain in ('', 'ai.onnx'):
+            return opset.version
+    raise ValueError('no default opset is found in the ONNX model')
+
+
+def _make_reduce_node(op_type, input_name, output_name, axis, opset_version, graph):
+    from onnx import helper, TensorProto
+
+    if opset_version >= 18:  # 从 opset 18 开始，`axes` 变成了输入而不是属性
+        axes_name = output_name + '_axes'
+        graph.initializer.append(
+            helper.make_tensor(axes_name, TensorProto.INT64, [1], [axis])
+        )
+        return helper.make_node(
+            op_type, [input_name, axes_name], [output_name], keepdims=0
+        )
+    return helper.make_node(
+        op_type, [input_name], [output_name], axes=[axis], keepdims=0
+    )
+
+
+def append_best_path_nodes(model, with_cand_mask: bool = False):
+    """
+    在识别模型的输出后面追加 ArgMax/ReduceMax 节点，使模型直接输出 best path，
+    而不是形状为 [B, T, V] 的完整 logits。
+
+    改写后的模型：
+        - 输出 `best_path`：int32, [B, T]，每帧得分最高的字符索引；
+        - 输出 `best_path_probs`：float32, [B, T]，每帧得分最高字符的概率；
+        - 其他输出（如 `output_lengths`）保持不变；
+        - 当 `with_cand_mask==True` 时，多一个输入 `cand_mask`：bool, [V]，
+          取值为 `False` 的字符在图内被屏蔽（与 `mask_by_candidates()` 一致）。
+
+    如果原始输出已经是 Softmax 的结果（如 PaddleOCR 的模型），概率直接取最大值；
+    否则用 `exp(max_logit - logsumexp(logits))` 计算概率，无需对整个词表做 softmax。
+
+    Args:
+        model (onnx.ModelProto): 原始的识别模型，第一个输出为 [B, T, V] 的 logits 或者概率
+        with_cand_mask (bool): 是否增加候选字符 mask 输入
+
+    Returns:
+        onnx.ModelProto: 改写后的模型（原地修改）
+    """
+    from onnx import helper, TensorProto
+
+    graph = model.graph
+    opset_version = _get_opset_version(model)
+    logits_info = graph.output[0]
+    logits_name = logits_info.name
+    if logits_name == BEST_PATH_OUTPUT:
+        raise ValueError('best path nodes have already been appended to the model')
+
+    producers = [node for node in graph.node if logits_name in node.output]
+    is_prob = len(producers) > 0 and producers[0].op_type == 'Softmax'
+
+    dims = logits_info.type.tensor_type.shape.dim
+    out_shape = [d.dim_param if d.dim_param else d.dim_value for d in dims[:2]]
+    num_classes = dims[2].dim_value if len(dims) > 2 and dims[2].dim_value else None
+
+    scores_name = logits_name
+    if with_cand_mask:
+        graph.input.append(
+            helper.make_tensor_value_info(
+                CAND_MASK_INPUT, TensorProto.BOOL, [num_classes or 'num_classes']
+            )
+        )
+        fill_name = 'cand_mask_fill_value'
+        graph.initializer.append(
+            helper.make_tensor(fill_name, TensorProto.FLOAT, [], [-100.0])
+        )
+        scores_name = logits_name + '_masked'
+        graph.node.append(
+            helper.make_node(
+                'Where', [CAND_MASK_INPUT, logits_name, fill_name], [scores_name]
+            )
+        )
+
+    best_path_int64 = BEST_PATH_OUTPUT + '_int64'
+    graph.node.append(
+        helper.make_node(
+            'ArgMax', [scores_name], [best_path_int64], axis=2, keepdims=0
+        )
+    )
+    graph.node.append(
+        helper.make_node(
+            'Cast', [best_path_int64], [BEST_PATH_OUTPUT], to=TensorProto.INT32
+        )
+    )
+    if is_prob:
+        graph.node.append(
+            _make_reduce_node(
+                'ReduceMax',
+                scores_name,
+                BEST_PATH_PROBS_OUTPUT,
+                2,
+                opset_version,
+                graph,
+            )
+        )
+    else:
+        max_name = scores_name + '_max'
+        lse_name = scores_name + '_logsumexp'
+        graph.node.append(
+            _make_reduce_node('ReduceMax', scores_name, max_name, 2, opset_version, graph)
+        )
+        graph.node.append(
+            _make_reduce_node(
+                'ReduceLogSumExp', scores_name, lse_name, 2, opset_version, graph
+            )
+        )
+        log_prob_name = scores_name + '_max_log_prob'
+        graph.node.append(helper.make_node('Sub', [max_name, lse_name], [log_prob_name]))
+        graph.node.append(
+            helper.make_node('Exp', [log_prob_name], [BEST_PATH_PROBS_OUTPUT])
+        )
+
+    other_outputs = list(graph.output[1:])
+    del graph.output[:]
+    graph.output.extend(
+        [
+            helper.make_tensor_value_info(
+                BEST_PATH_OUTPUT, TensorProto.INT32, out_shape
+            ),
+            helper.make_tensor_value_info(
+                BEST_PATH_PROBS_OUTPUT, TensorProto.FLOAT, out_shape
+            ),
+        ]
+        + other_outputs
+    )
+    return model
+
+
+def prepend_normalization_nodes(model, mean: float = 0.0, std: float = 1.0):
+    """
+    把识别模型的图片输入改为 uint8，并在图内完成类型转换和归一化：
+    `(float(x) / 255 - mean) / std`，计算时合并为一次乘法和一次减法。
+    这样调用方只需准备 uint8 的 batch 数组，不用再在 NumPy 中转成 float32 并归一化。
+
+    注意：`mean=0.5, std=0.5`（PaddleOCR 的模型）时，float32 输入可以用 127.5 填充，归一化后恰好为 0，
+    而 uint8 输入只能用 128 填充，归一化后为 1/255。所以改写后的模型与原模型在有填充的 batch 上
+    结果不是逐位相同的；没有填充的图片结果相同。
+
+    Args:
+        model (onnx.ModelProto): 原始的识别模型，第一个输入为 float32 的 [B, C, H, W] 图片
+        mean (float): 归一化使用的均值
+        std (float): 归一化使用的标准差
+
+    Returns:
+        onnx.ModelProto: 改写后的模型（原地修改）
+    """
+    from onnx import helper, TensorProto
+
+    graph = model.graph
+    img_info = graph.input[0]
+    img_name = img_info.name
+    tensor_type = img_info.type.tensor_type
+    if tensor_type.elem_type == TensorProto.UINT8:
+        raise ValueError('the image input of the model is already uint8')
+    if tensor_type.elem_type != TensorProto.FLOAT:
+        raise ValueError('only models with float32 image input are supported')
+
+    # 原来使用图片输入的节点，改为使用归一化之后的结果
+    normalized_name = img_name + '_normalized'
+    for node in graph.node:
+        for idx, name in enumerate(node.input):
+            if name == img_name:
+                node.input[idx] = normalized_name
+    for output in graph.output:
+        if output.name == img_name:
+            raise ValueError('the image input is also an output of the model')
+
+    scale_name = img_name + '_norm_scale'
+    bias_name = img_name + '_norm_bias'
+    graph.initializer.extend(
+        [
+            helper.make_tensor(
+                scale_name, TensorProto.FLOAT, [], [1.0 / (255.0 * std)]
+            ),
+            helper.make_tensor(bias_name, TensorProto.FLOAT, [], [mean / std]),
+        ]
+    )
+    float_name = img_name + '_float'
+    scaled_name = img_name + '_scaled'
+    new_nodes = [
+        helper.make_node('Cast', [img_name], [float_name], to=TensorProto.FLOAT),
+        helper.make_node('Mul', [float_name, scale_name], [scaled_name]),
+        helper.make_node('Sub', [scaled_name, bias_name], [normalized_name]),
+    ]
+    # 保持节点的拓扑序
+    old_nodes = list(graph.node)
+    del graph.node[:]
+    graph.node.extend(new_nodes + old_nodes)
+
+    tensor_type.elem_type = TensorProto.UINT8
+    return model
+
+
+def slice_output_head(model, class_index: Iterable[int]):
+    """
+    只保留识别模型输出层中 `class_index` 对应的类别：把最后的 `MatMul`（或 `Gemm`）的权重
+    和 `Add` 的偏置按列切片，模型输出 [B, T, len(class_index)] 的 logits（或概率）。
+    输出层之后逐元素的节点（如 PaddleOCR 模型的 `Mul` 和 `Softmax`）保持不变。
+
+    Args:
+        model (onnx.ModelProto): 原始的识别模型，第一个输出为 [B, T, V] 的 logits 或者概率；
+            不能已经追加了 best path 节点（可以在切片后再追加）
+        class_index (Iterable[int]): 保留的类别索引，按原来的顺序排列
+
+    Returns:
+        onnx.ModelProto: 改写后的模型（原地修改）
+    """
+    from onnx import numpy_helper
+
+    graph = model.graph
+    if graph.output[0].name == BEST_PATH_OUTPUT:
+        raise ValueError(
+            'best path nodes have been appended to the model; slice the model before that'
+        )
+    class_index = np.asarray(list(class_index), dtype=np.int64)
+    initializers = {init.name: init for init in graph.initializer}
+    producers = {out: node for node in graph.node for out in node.output}
+
+    def _non_const_input(node):
+        inputs = [name for name in node.input if name not in initializers]
+        inputs = [
+            name
+            for name in inputs
+            if name not in producers or producers[name].op_type != 'Constant'
+        ]
+        return inputs[0] if len(inputs) == 1 else None
+
+    # 从输出往前找到输出层，跳过逐元素的节点
+    node = producers.get(graph.output[0].name)
+    while node is not None and node.op_type in ('Softmax', 'Mul', 'Div', 'Identity'):
+        name = _non_const_input(node)
+        node = producers.get(name) if name is not None else None
+
+    def _slice_init(name, axis):
+        init = initializers[name]
+        value = np.take(numpy_helper.to_array(init), class_index, axis=axis)
+        init.CopyFrom(numpy_helper.from_array(value, name))
+
+    if node is not None and node.op_type == 'Gemm':
+        trans_b = any(attr.name == 'transB' and attr.i for attr in node.attribute)
+        _slice_init(node.input[1], 0 if trans_b else 1)
+        if len(node.input) > 2 and node.input[2] in initializers:
+            _slice_init(node.input[2], 0)
+    elif node is not None and node.op_type == 'Add':
+        bias = [name for name in node.input if name in initializers]
+        matmuls = [
+            producers[name]
+            for name in node.input
+            if name in producers and producers[name].op_type == 'MatMul'
+        ]
+        if len(bias) != 1 or len(matmuls) != 1 or matmuls[0].input[1] not in initializers:
+            raise ValueError('the output layer of the model is not a MatMul + Add')
+        _slice_init(matmuls[0].input[1], 1)
+        _slice_init(bias[0], 0)
+    else:
+        raise ValueError('cannot find the output layer (MatMul + Add, or Gemm) of the model')
+
+    dims = graph.output[0].type.tensor_type.shape.dim
+    if len(dims) > 2:
+        dims[2].Clear()
+        dims[2].dim_value = len(class_index)
+    # 中间结果的形状可能已经过时，交给 onnxruntime 重新推断
+    del graph.value_info[:]
+    return model
+
+
+def transform_onnx_model(
+    input_model_fp: Union[str, Path],
+    output_model_fp: Union[str, Path],
+    *,
+    with_best_path: bool = False,
+    with_cand_mask: bool = False,
+    with_uint8_input: bool = False,
+    input_norm: str = 'cnocr',
+):
+    """
+    读入 ONNX 识别模型，按需改写后存入新的文件。
+
+    Args:
+        input_model_fp (Union[str, Path]): 输入的 ONNX 模型文件路径
+        output_model_fp (Union[str, Path]): 输出的 ONNX 模型文件路径
+        with_best_path (bool): 是否在图内计算 best path，参考 `append_best_path_nodes()`
+        with_cand_mask (bool): 是否在图内支持候选字符 mask；只在 `with_best_path==True` 时有效
+        with_uint8_input (bool): 是否把图片输入改为 uint8 并在图内归一化，参考 `prepend_normalization_nodes()`
+        input_norm (str): 模型使用的归一化方式，取值为 `INPUT_NORM_PARAMS` 的 key；
+            cnocr 自己的模型为 `'cnocr'`，PaddleOCR 的模型为 `'ppocr'`
+
+    Returns:
+        None
+    """
+    import onnx
+
+    if input_norm not in INPUT_NORM_PARAMS:
+        raise ValueError(
+            'unsupported input_norm: %s, should be one of %s'
+            % (input_norm, list(INPUT_NORM_PARAMS.keys()))
+        )
+
+    model = onnx.load(str(input_model_fp))
+    if with_uint8_input:
+        mean, std = INPUT_NORM_PARAMS[input_norm]
+        prepend_normalization_nodes(model, mean=mean, std=std)
+    if with_best_path:
+        append_best_path_nodes(model, with_cand_mask=with_cand_mask)
+    elif with_cand_mask:
+        logger.warning('`with_cand_mask` is only valid when `with_best_path` is True')
+
+    onnx.checker.check_model(model)
+    onnx.save(model, str(output_model_fp))
+    logger.info('transformed model is saved to %s' % output_model_fp)
+
+
+def get_quantized_model_fp(model_fp: Union[str, Path]) -> str:
+    """
+    原始 ONNX 模型文件对应的量化模型文件路径，如 `a/b.onnx` -> `a/b-int8.onnx`。
+    """
+    stem, ext = os.path.splitext(str(model_fp))
+    return stem + QUANTIZED_MODEL_SUFFIX + ext
+
+
+def quantize_onnx_model(
+    input_model_fp: Union[str, Path],
+    output_model_fp: Union[str, Path],
+    mode: str = 'dynamic',
+    calibration_inputs: Optional[Iterable[Dict[str, np.ndarray]]] = None,
+):
+    """
+    把 fp32 的 ONNX 识别模型量化为 INT8 模型。
+
+    Args:
+        input_model_fp (Union[str, Path]): 输入的 fp32 模型文件路径
+        output_model_fp (Union[str, Path]): 输出的 INT8 模型文件路径
+        mode (str): 量化方式，取值为：
+            - `'dynamic'`：动态量化，只量化权重，激活值在运行时量化，无需校准数据；
+            - `'static'`：静态量化（QDQ 格式），权重和激活值都量化，需要提供 `calibration_inputs`
+        calibration_inputs (Optional[Iterable[Dict[str, np.ndarray]]]): 静态量化使用的校准数据，
+            每个元素为一次 `InferenceSession.run()` 的输入
+
+    Returns:
+        None
+    """
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    if mode == 'dynamic':
+        quantize_dynamic(
+            str(input_model_fp), str(output_model_fp), weight_type=QuantType.QInt8
+        )
+    elif mode == 'static':
+        if calibration_inputs is None:
+            raise ValueError('`calibration_inputs` is required for static quantization')
+
+        class _CalibrationDataReader(CalibrationDataReader):
+            def __init__(self, inputs):
+                self._inputs = iter(inputs)
+
+            def get_next(self):
+                return next(self._inputs, None)
+
+        quantize_static(
+            str(input_model_fp),
+            str(output_model_fp),
+            _CalibrationDataReader(calibration_inputs),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+    else:
+        raise ValueError('unsupported quantization mode: %s' % mode)
+    logger.info('quantized (%s) model is saved to %s' % (mode, output_model_fp))
+
+
+def prepare_quantized_model(model_fp: Union[str, Path]) -> str:
+    """
+    返回原始 ONNX 模型对应的 INT8 模型文件路径。
+    如果 INT8 模型文件还不存在，就对原始模型做动态量化并存在原始模型旁边。
+
+    Args:
+        model_fp (Union[str, Path]): 原始的 fp32 模型文件路径
+
+    Returns:
+        str: INT8 模型文件路径
+    """
+    quantized_fp = get_quantized_model_fp(model_fp)
+    if not os.path.isfile(quantized_fp):
+        logger.info('no quantized model is found, quantizing %s dynamically' % model_fp)
+        # 先写入临时文件，避免其他进程读到写了一半的模型
+        tmp_fp = '%s.%d.tmp' % (quantized_fp, os.getpid())
+        quantize_onnx_model(model_fp, tmp_fp, mode='dynamic')
+        os.replace(tmp_fp, quantized_fp)
+    return quantized_fp
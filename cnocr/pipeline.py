@@ -0,0 +1,119 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 用线程和有界队列把多个处理阶段串成流水线，使相邻元素的不同阶段可以同时运行。
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+_POLL_INTERVAL = 0.1
+
+
+class _StageError(object):
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: Sequence[Callable[[Any], Any]],
+    queue_size: int = 4,
+) -> Iterator[Any]:
+    """
+    依次用 `stages` 中的函数处理 `source` 中的每个元素，每个阶段在各自的线程中运行，
+    阶段之间通过大小为 `queue_size` 的队列连接，所以同时在内存中的元素数量是有界的。
+    每个阶段只有一个线程，所以输出的顺序与输入相同。
+
+    onnxruntime 和 OpenCV 在计算时会释放 GIL，所以前一个元素的识别可以与后一个元素的检测同时进行。
+
+    Args:
+        source (Iterable[Any]): 输入；在单独的线程中迭代
+        stages (Sequence[Callable[[Any], Any]]): 各个阶段的处理函数
+        queue_size (int): 相邻阶段之间队列的大小
+
+    Returns:
+        Iterator[Any]: 最后一个阶段的输出。某个阶段抛出异常时，异常会在对应的位置被重新抛出。
+            提前停止迭代时，所有线程都会退出
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)]
+
+    def _put(q, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _feed():
+        try:
+            for item in source:
+                if not _put(queues[0], item):
+                    return
+        except Exception as e:
+            _put(queues[0], _StageError(e))
+        _put(queues[0], _END)
+
+    def _work(fn, in_q, out_q):
+        while True:
+            item = _get(in_q)
+            if item is _END:
+                _put(out_q, _END)
+                return
+            if not isinstance(item, _StageError):
+                try:
+                    item = fn(item)
+                except Exception as e:
+                    logger.debug('pipeline stage %s failed: %s' % (fn, e))
+                    item = _StageError(e)
+            if not _put(out_q, item):
+                return
+
+    threads = [threading.Thread(target=_feed, daemon=True)]
+    for fn, in_q, out_q in zip(stages, queues[:-1], queues[1:]):
+        threads.append(threading.Thread(target=_work, args=(fn, in_q, out_q), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _END:
+                break
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
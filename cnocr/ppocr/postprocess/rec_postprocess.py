@@ -24,7 +24,7 @@ from typing import Optional, Union, Collection
 
 import numpy as np
 
-from ...utils import mask_by_candidates
+from ...utils import gen_candidates_mask, CandidateMask, CandidateMaskCache
 
 logger = logging.getLogger(__name__)
 
@@ -60,8 +60,12 @@ class BaseRecLabelDecode(object):
         for i, char in enumerate(dict_character):
             self.dict[char] = i
         self.character = dict_character
+        self._character_array = np.array(dict_character, dtype=object)
 
         self._candidates = None
+        self._cand_cache = CandidateMaskCache(
+            self.dict, len(self.character), self.get_ignored_tokens()
+        )
         self.set_cand_alphabet(cand_alphabet)
 
     def set_cand_alphabet(self, cand_alphabet: Optional[Union[Collection, str]]):
@@ -75,50 +79,52 @@ class BaseRecLabelDecode(object):
             None
 
         """
-        if cand_alphabet is None:
-            self._candidates = None
-        else:
-            cand_alphabet = [
-                word if word != ' ' else '<space>' for word in cand_alphabet
-            ]
-            excluded = set([word for word in cand_alphabet if word not in self.dict])
-            if excluded:
-                logger.warning(
-                    'chars in candidates are not in the vocab, ignoring them: %s'
-                    % excluded
-                )
-            candidates = [word for word in cand_alphabet if word in self.dict]
-            self._candidates = None if len(candidates) == 0 else candidates
-            logger.debug('candidate chars: %s' % self._candidates)
+        self._candidates = self.compile_candidates(cand_alphabet)
+
+    def compile_candidates(
+        self, cand_alphabet: Optional[Union[Collection, str]]
+    ) -> Optional[CandidateMask]:
+        """ compiled (and cached) candidates; `None` if not restricted. """
+        return self._cand_cache.get(cand_alphabet)
+
+    def candidates_mask(
+        self, candidates: Optional[CandidateMask] = None
+    ) -> np.ndarray:
+        """ bool mask with shape [num_classes] for the given compiled candidates; all `True` for `None`. """
+        if candidates is not None:
+            return candidates.mask
+        return gen_candidates_mask(
+            None, self.dict, len(self.character), self.get_ignored_tokens()
+        )
 
     def add_special_char(self, dict_character):
         return dict_character
 
     def decode(self, text_index, text_prob=None, is_remove_duplicate=False):
-        """ convert text-index into text-label. """
+        """ convert text-index into text-label. The whole batch is processed with array ops. """
+        text_index = np.asarray(text_index)
+        # keep a frame only if it is not ignored, and (optionally) differs from its previous frame
+        keep = ~np.isin(text_index, self.get_ignored_tokens())
+        if is_remove_duplicate:
+            # only for predict
+            keep[:, 1:] &= text_index[:, 1:] != text_index[:, :-1]
+
+        counts = keep.sum(axis=1)
+        if text_prob is not None:
+            text_prob = np.asarray(text_prob)
+            conf_sums = np.where(keep, text_prob, 0).sum(axis=1)
+        else:
+            conf_sums = counts.astype('float64')
+        # mean confidence of the kept frames; `nan` if nothing is kept, the same as `np.mean([])`
+        confs = np.full(conf_sums.shape, np.nan, dtype=conf_sums.dtype)
+        np.divide(conf_sums, counts, out=confs, where=counts > 0)
+
+        chars = self._character_array[text_index[keep].astype(int)]
+        ends = np.cumsum(counts).tolist()
         result_list = []
-        ignored_tokens = self.get_ignored_tokens()
-        batch_size = len(text_index)
-        for batch_idx in range(batch_size):
-            char_list = []
-            conf_list = []
-            for idx in range(len(text_index[batch_idx])):
-                if text_index[batch_idx][idx] in ignored_tokens:
-                    continue
-                if is_remove_duplicate:
-                    # only for predict
-                    if (
-                        idx > 0
-                        and text_index[batch_idx][idx - 1] == text_index[batch_idx][idx]
-                    ):
-                        continue
-                char_list.append(self.character[int(text_index[batch_idx][idx])])
-                if text_prob is not None:
-                    conf_list.append(text_prob[batch_idx][idx])
-                else:
-                    conf_list.append(1)
-            text = ''.join(char_list)
-            result_list.append((text, np.mean(conf_list)))
+        for batch_idx, (start, end) in enumerate(zip([0] + ends[:-1], ends)):
+            text = ''.join(chars[start:end])
+            result_list.append((text, confs[batch_idx]))
         return result_list
 
     def get_ignored_tokens(self):
@@ -140,17 +146,19 @@ class CTCLabelDecode(BaseRecLabelDecode):
         )
 
     def __call__(self, preds, label=None, *args, **kwargs):
+        """
+        `candidates` in `kwargs` (compiled by `compile_candidates()`) overrides the candidates
+        set by `set_cand_alphabet()` for this call only.
+        """
         if isinstance(preds, (tuple, list)):
             preds = preds[-1]
-        preds = mask_by_candidates(
-            preds,
-            self._candidates,
-            self.character,
-            self.dict,
-            self.get_ignored_tokens(),
-        )
-
-        preds_idx = preds.argmax(axis=2)
+        candidates = kwargs.get('candidates', self._candidates)
+        if candidates is not None:
+            # only the columns of the candidate chars (and blank) are decoded
+            preds = np.take(preds, candidates.index, axis=2)
+            preds_idx = candidates.index[preds.argmax(axis=2)]
+        else:
+            preds_idx = preds.argmax(axis=2)
         preds_prob = preds.max(axis=2)
         text = self.decode(preds_idx, preds_prob, is_remove_duplicate=True)
         if label is None:
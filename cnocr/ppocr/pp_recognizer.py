@@ -20,7 +20,7 @@
 
 import os
 import logging
-from typing import Union, Optional, Collection, List, Tuple
+from typing import Union, Optional, Collection, List, Tuple, Dict
 from pathlib import Path
 import math
 
@@ -28,12 +28,26 @@ import numpy as np
 from PIL import Image
 from cnstd.utils import get_model_file
 
-from ..utils import resize_img, data_dir, read_img
+from ..utils import (
+    data_dir,
+    read_img,
+    resize_img_batch,
+    normalize_img_batch,
+    ImageBatchBuffer,
+    CandidateMask,
+)
 from ..recognizer import Recognizer
+from ..batching import BatchingStats
 from .postprocess import build_post_process
 from .utility import create_predictor
 from .consts import PP_SPACE
-from ..consts import MODEL_VERSION, AVAILABLE_MODELS, DOWNLOAD_SOURCE
+from ..consts import (
+    MODEL_VERSION,
+    AVAILABLE_MODELS,
+    DOWNLOAD_SOURCE,
+    split_quantized_model_name,
+)
+from ..onnx_utils import CAND_MASK_INPUT, UINT8_INPUT_TYPE, prepare_quantized_model
 
 
 logger = logging.getLogger(__name__)
@@ -55,7 +69,9 @@ class PPRecognizer(Recognizer):
         来自 ppocr 的文本识别器。
 
         Args:
-            model_name (str): 模型名称。默认为 `ch_PP-OCRv3`
+            model_name (str): 模型名称。默认为 `ch_PP-OCRv3`。
+                名称后加上 `-int8` 表示使用其 INT8 量化版本，如 `ch_PP-OCRv3-int8`；
+                如果还没有量化文件，会自动做动态量化后存在原模型文件旁边
             cand_alphabet (Optional[Union[Collection, str]]): 待识别字符所在的候选集合。默认为 `None`，表示不限定识别字符范围
             model_fp (Optional[str]): 如果不使用系统自带的模型，可以通过此参数直接指定所使用的模型文件（'.ckpt' 文件）
             root (Union[str, Path]): 模型文件所在的根目录
@@ -65,10 +81,12 @@ class PPRecognizer(Recognizer):
             use_space_char (bool): 是否使用空格字符，无需更改使用默认值即可。默认值：`True`
             **kwargs:
                 ort_providers (List[str]): 使用 ONNX 模型时，使用此参数指定 `onnxruntime` 识别模型运行的设备。未指定则使用默认值（优先使用 GPU）。
+                ort_session_options (Dict[str, Any]): 创建 `onnxruntime.InferenceSession` 的配置，
+                    可用的 key 见 `cnocr.utils.DEFAULT_ORT_SESSION_OPTIONS`。
         """
         self.rec_image_shape = [int(v) for v in rec_image_shape.split(",")]
         self.rec_algorithm = 'CRNN'
-        self._model_name = model_name
+        self._model_name, self._quantized = split_quantized_model_name(model_name)
         self._model_backend = 'onnx'
 
         vocab_fp = AVAILABLE_MODELS.get_vocab_fp(self._model_name, self._model_backend)
@@ -81,15 +99,51 @@ class PPRecognizer(Recognizer):
             'cand_alphabet': cand_alphabet,
         }
         self.postprocess_op = build_post_process(postprocess_params)
+        self.last_batching_stats = None
         (
             self.predictor,
             self.input_tensor,
             self.output_tensors,
             self.config,
         ) = create_predictor(
-            self._model_fp, 'rec', ort_providers=kwargs.get('ort_providers')
+            self._model_fp,
+            'rec',
+            ort_providers=kwargs.get('ort_providers'),
+            ort_session_options=kwargs.get('ort_session_options'),
         )
         self.use_onnx = True
+        # 图片输入为 uint8 的 ONNX 模型在图内做归一化（`--with-uint8-input`）
+        self._onnx_uint8_input = self.input_tensor.type == UINT8_INPUT_TYPE
+        self._batch_buffer = ImageBatchBuffer(
+            'uint8' if self._onnx_uint8_input else 'float32'
+        )
+        self._onnx_best_path, self._onnx_cand_mask = self._check_onnx_graph(
+            self.predictor
+        )
+        self._check_candidates(self.postprocess_op._candidates)
+
+    def set_cand_alphabet(self, cand_alphabet: Optional[Union[Collection, str]]):
+        """
+        设置待识别字符的候选集合。
+
+        Args:
+            cand_alphabet (Optional[Union[Collection, str]]): 待识别字符所在的候选集合。默认为 `None`，表示不限定识别字符范围
+
+        Returns:
+            None
+
+        """
+        candidates = self.postprocess_op.compile_candidates(cand_alphabet)
+        self._check_candidates(candidates)
+        self.postprocess_op._candidates = candidates
+
+    def _check_candidates(self, candidates: Optional[CandidateMask]):
+        if candidates is not None and self._onnx_best_path and not self._onnx_cand_mask:
+            raise ValueError(
+                'the ONNX model %s computes best paths inside the graph without the `%s` input, '
+                'so `cand_alphabet` is not supported; re-export it with `--with-cand-mask`'
+                % (self._model_fp, CAND_MASK_INPUT)
+            )
 
     def _assert_and_prepare_model_files(self, model_fp, root):
         if model_fp is not None and not os.path.isfile(model_fp):
@@ -115,6 +169,8 @@ class PPRecognizer(Recognizer):
             )  # download the .zip file and unzip
 
         self._model_fp = model_fp
+        if self._quantized:
+            self._model_fp = prepare_quantized_model(self._model_fp)
 
     def resize_norm_img(self, img, max_wh_ratio):
         """
@@ -125,36 +181,61 @@ class PPRecognizer(Recognizer):
 
         Returns:
 
+        """
+        return self.resize_norm_img_batch([img], max_wh_ratio)[0].copy()
+
+    def resize_norm_img_batch(self, img_list, max_wh_ratio):
+        """
+        把一组图片 resize 后直接写入一个可复用的 batch 缓冲区，再一次性做归一化。
+
+        Args:
+            img_list (): list of images, each with shape of (height, width, channel)
+            max_wh_ratio (): 这组图片中最大的宽高比
+
+        Returns:
+            np.ndarray: with shape of (batch_size, channel, height, width), dtype float32；
+                如果 ONNX 模型在图内做归一化，则为未归一化的 uint8 数组。
+                此数组会在下一次调用时被复用
+
+        注：uint8 输入的模型与 float32 输入的模型的结果不是逐位相同的。float32 输入用 127.5 填充，
+        归一化后恰好为 0；uint8 无法表示 127.5，只能用 128 填充，归一化后为 1/255（约 0.004）。
+        真实像素的归一化结果两者相同，差别只在填充区域。
         """
         imgC, imgH, imgW = self.rec_image_shape
 
-        assert imgC == img.shape[2]
         imgW = int((32 * max_wh_ratio))
         if self.use_onnx:
             w = self.input_tensor.shape[3:][0]
-            if w is not None and w > 0:
+            if isinstance(w, int) and w > 0:
                 imgW = w
-        h, w = img.shape[:2]
-        ratio = w / float(h)
-        if math.ceil(imgH * ratio) > imgW:
-            resized_w = imgW
-        else:
-            resized_w = int(math.ceil(imgH * ratio))
-        # resized_image = cv2.resize(img, (resized_w, imgH))
-        resized_image = resize_img(
-            img.transpose((2, 0, 1)), target_h_w=(imgH, resized_w), return_torch=False
-        ).transpose((1, 2, 0))
-        resized_image = resized_image.astype('float32')
-        resized_image = resized_image.transpose((2, 0, 1)) / 255
-        resized_image -= 0.5
-        resized_image /= 0.5
-        padding_im = np.zeros((imgC, imgH, imgW), dtype=np.float32)
-        padding_im[:, :, 0:resized_w] = resized_image
-        return padding_im
+        resized_widths = []
+        for img in img_list:
+            assert imgC == img.shape[2]
+            h, w = img.shape[:2]
+            ratio = w / float(h)
+            if math.ceil(imgH * ratio) > imgW:
+                resized_widths.append(imgW)
+            else:
+                resized_widths.append(int(math.ceil(imgH * ratio)))
+
+        norm_img_batch = self._batch_buffer.take((len(img_list), imgC, imgH, imgW))
+        if self._onnx_uint8_input:
+            # uint8 无法表示 127.5，用 128 填充，归一化后为 1/255 而不是 0（见上面的注）。
+            # 不能通过调整图内的均值让 128 映射到 0，否则所有真实像素都会偏移
+            resize_img_batch(img_list, resized_widths, out=norm_img_batch, pad_value=128)
+            return norm_img_batch
+        # 填充值 127.5 在归一化后恰好为 0
+        resize_img_batch(img_list, resized_widths, out=norm_img_batch, pad_value=127.5)
+        return normalize_img_batch(norm_img_batch, mean=0.5, std=0.5)
 
     def recognize(
-        self, img_list: List[Union[str, Path, np.ndarray]], batch_size: int = 1,
-    ) -> List[Tuple[str, float]]:
+        self,
+        img_list: List[Union[str, Path, np.ndarray]],
+        batch_size: int = 1,
+        pixel_budget: Optional[int] = None,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+        return_stats: bool = False,
+    ) -> Union[List[Tuple[str, float]], Tuple[List[Tuple[str, float]], BatchingStats]]:
         """
         Batch recognize characters from a list of one-line-characters images.
 
@@ -166,13 +247,24 @@ class PPRecognizer(Recognizer):
                 The optional channel should be 1 (gray image) or 3 (RGB-format color image).
                 注：img_list 不宜包含太多图片，否则同时导入这些图片会消耗很多内存。
             batch_size: 待处理图片很多时，需要分批处理，每批图片的数量由此参数指定。默认为 `1`。
+            pixel_budget: 每批图片最多包含的像素数。取值不为 `None` 时按宽度分桶、按像素预算分批，
+                参考 `cnocr.batching.plan_batches()`。默认为 `None`，表示按固定的 `batch_size` 分批。
+            cand_alphabet: 只对本次调用生效的候选字符集合，不改变 `set_cand_alphabet()` 设置的集合。
+                默认为 `None`，表示使用 `set_cand_alphabet()` 设置的集合。
+            return_stats: 是否同时返回本次调用的分批统计信息（`cnocr.batching.BatchingStats`）。默认为 `False`。
 
         Returns:
             list: list of (chars, prob), such as
-            [('第一行', 0.80), ('第二行', 0.75), ('第三行', 0.9)]
+            [('第一行', 0.80), ('第二行', 0.75), ('第三行', 0.9)];
+            `return_stats` 为 `True` 时返回 (list, stats)
         """
         if len(img_list) == 0:
-            return []
+            return ([], BatchingStats()) if return_stats else []
+
+        candidates = self.postprocess_op._candidates
+        if cand_alphabet is not None:
+            candidates = self.postprocess_op.compile_candidates(cand_alphabet)
+            self._check_candidates(candidates)
 
         img_list = [self._prepare_img(img) for img in img_list]
 
@@ -181,36 +273,58 @@ class PPRecognizer(Recognizer):
         width_list = []
         for img in img_list:
             width_list.append(img.shape[1] / float(img.shape[0]))
+        imgH = self.rec_image_shape[1]
         # Sorting can speed up the recognition process
-        indices = np.argsort(np.array(width_list))
+        batches, stats = self._plan_batches(
+            [int(math.ceil(imgH * ratio)) for ratio in width_list],
+            batch_size,
+            pixel_budget=pixel_budget,
+            height=imgH,
+            min_padded_width=self.min_padded_width,
+        )
         rec_res = [['', 0.0]] * img_num
-        for beg_img_no in range(0, img_num, batch_size):
-            end_img_no = min(img_num, beg_img_no + batch_size)
-            norm_img_batch = []
-            max_wh_ratio = 0
-            for ino in range(beg_img_no, end_img_no):
-                h, w = img_list[indices[ino]].shape[0:2]
-                wh_ratio = w * 1.0 / h
-                max_wh_ratio = max(max_wh_ratio, wh_ratio)
-            for ino in range(beg_img_no, end_img_no):
-                if self.rec_algorithm != "SRN" and self.rec_algorithm != "SAR":
-                    norm_img = self.resize_norm_img(
-                        img_list[indices[ino]], max_wh_ratio
-                    )
-                    norm_img = norm_img[np.newaxis, :]
-                    norm_img_batch.append(norm_img)
-            norm_img_batch = np.concatenate(norm_img_batch)
-            norm_img_batch = norm_img_batch.copy()
-
-            input_dict = dict()
-            input_dict[self.input_tensor.name] = norm_img_batch
-            outputs = self.predictor.run(self.output_tensors, input_dict)
-            preds = outputs[0]
-
-            rec_result = self.postprocess_op(preds)
-            for rno in range(len(rec_result)):
-                rec_res[indices[beg_img_no + rno]] = rec_result[rno]
-        return rec_res
+        for batch_ids in batches:
+            max_wh_ratio = max(width_list[ino] for ino in batch_ids)
+            norm_img_batch = self.resize_norm_img_batch(
+                [img_list[ino] for ino in batch_ids], max_wh_ratio,
+            )
+
+            outputs = self.predictor.run(
+                self.output_tensors, self._onnx_inputs(norm_img_batch, candidates)
+            )
+
+            if self._onnx_best_path:
+                # outputs: best_path, best_path_probs
+                rec_result = self.postprocess_op.decode(
+                    outputs[0], outputs[1], is_remove_duplicate=True
+                )
+            else:
+                preds = outputs[0]
+                rec_result = self.postprocess_op(preds, candidates=candidates)
+            for ino, one_res in zip(batch_ids, rec_result):
+                rec_res[ino] = one_res
+        return (rec_res, stats) if return_stats else rec_res
+
+    @property
+    def candidates(self) -> Optional[List[str]]:
+        """当前的候选字符，`None` 表示不限定识别字符范围。"""
+        candidates = self.postprocess_op._candidates
+        return None if candidates is None else candidates.candidates
+
+    @property
+    def min_padded_width(self) -> int:
+        """输入宽度固定的 ONNX 模型会把所有图片补齐到此宽度。"""
+        fixed_width = self.input_tensor.shape[3:][0] if self.use_onnx else None
+        return fixed_width if isinstance(fixed_width, int) else 0
+
+    def _onnx_inputs(
+        self, norm_img_batch: np.ndarray, candidates: Optional[CandidateMask] = None
+    ) -> Dict[str, np.ndarray]:
+        input_dict = dict()
+        input_dict[self.input_tensor.name] = norm_img_batch
+        if self._onnx_cand_mask:
+            input_dict[CAND_MASK_INPUT] = self.postprocess_op.candidates_mask(candidates)
+        return input_dict
 
     def _prepare_img(self, img_fp: Union[str, Path, np.ndarray]) -> np.ndarray:
         """
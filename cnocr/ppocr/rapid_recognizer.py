@@ -4,8 +4,10 @@
 # or more contributor license agreements.
 
 import os
+import sys
+import math
 import logging
-from typing import Union, Optional, List, Tuple
+from typing import Union, Optional, Collection, List, Tuple
 from pathlib import Path
 
 import numpy as np
@@ -16,8 +18,10 @@ from cnstd.utils import prepare_model_files
 
 from ..utils import data_dir, read_img
 from ..recognizer import Recognizer
+from ..batching import BatchingStats
 from .consts import PP_SPACE
-from ..consts import MODEL_VERSION, AVAILABLE_MODELS
+from ..consts import MODEL_VERSION, AVAILABLE_MODELS, split_quantized_model_name
+from ..onnx_utils import prepare_quantized_model
 
 
 logger = logging.getLogger(__name__)
@@ -94,7 +98,8 @@ class RapidRecognizer(Recognizer):
         基于 rapidocr_onnxruntime 的文本识别器。
 
         Args:
-            model_name (str): 模型名称。默认为 `ch_PP-OCRv5`
+            model_name (str): 模型名称。默认为 `ch_PP-OCRv5`。
+                名称后加上 `-int8` 表示使用其 INT8 量化版本，如 `ch_PP-OCRv5-int8`
             model_fp (Optional[str]): 如果不使用系统自带的模型，可以通过此参数直接指定所使用的模型文件（'.onnx' 文件）
             root (Union[str, Path]): 模型文件所在的根目录
             context (str): 使用的设备。默认为 `cpu`，可选 `gpu`
@@ -102,7 +107,7 @@ class RapidRecognizer(Recognizer):
             **kwargs: 其他参数
         """
         self.rec_image_shape = [int(v) for v in rec_image_shape.split(",")]
-        self._model_name = model_name
+        self._model_name, self._quantized = split_quantized_model_name(model_name)
         self._model_backend = "onnx"
         use_gpu = context.lower() not in ("cpu", "mps")
 
@@ -118,11 +123,14 @@ class RapidRecognizer(Recognizer):
         config["rec_img_shape"] = self.rec_image_shape
         config["model_path"] = self._model_fp
         # 从 model_name 中获取 model_type 和 ocr_version
-        config["model_type"] = ModelType.SERVER if "server" in model_name else ModelType.MOBILE
-        config["ocr_version"] = OCRVersion.PPOCRV5 if "v5" in model_name else OCRVersion.PPOCRV4
+        config["model_type"] = ModelType.SERVER if "server" in self._model_name else ModelType.MOBILE
+        config["ocr_version"] = OCRVersion.PPOCRV5 if "v5" in self._model_name else OCRVersion.PPOCRV4
+        # 分批在 `recognize()` 中完成，每批只调用 rapidocr 一次，所以不让 rapidocr 再次分批
+        config["rec_batch_num"] = sys.maxsize
 
         config = Config(config)
         self.recognizer = TextRecognizer(config)
+        self.last_batching_stats = None
 
     def _assert_and_prepare_model_files(self, model_fp, root):
         if model_fp is not None and not os.path.isfile(model_fp):
@@ -148,14 +156,24 @@ class RapidRecognizer(Recognizer):
             model_fp = prepare_model_files(model_fp, remote_repo)
 
         self._model_fp = model_fp
+        if self._quantized:
+            self._model_fp = prepare_quantized_model(self._model_fp)
         logger.info("use model: %s" % self._model_fp)
 
+    @property
+    def min_padded_width(self) -> int:
+        """rapidocr 会把每批图片至少补齐到模型的默认宽度。"""
+        return self.rec_image_shape[2]
+
     def recognize(
         self,
         img_list: List[Union[str, Path, np.ndarray]],
         batch_size: int = 6,
         return_word_box: bool = False,
-    ) -> List[Tuple[str, float]]:
+        pixel_budget: Optional[int] = None,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+        return_stats: bool = False,
+    ) -> Union[List[Tuple[str, float]], Tuple[List[Tuple[str, float]], BatchingStats]]:
         """
         识别图片中的文字。
         Args:
@@ -163,17 +181,25 @@ class RapidRecognizer(Recognizer):
                 + 图片路径
                 + 已经从图片文件中读入的数据
             batch_size: 待处理图片数据的批大小。
+            return_word_box: 是否返回单字的位置信息。
+            pixel_budget: 每批图片最多包含的像素数。取值不为 `None` 时按宽度分桶、按像素预算分批，
+                参考 `cnocr.batching.plan_batches()`。默认为 `None`，表示按宽度排序后按固定的 `batch_size` 分批。
+            cand_alphabet: rapidocr 的识别模型不支持候选字符集合，此参数会被忽略。
+            return_stats: 是否同时返回本次调用的分批统计信息（`cnocr.batching.BatchingStats`）。默认为 `False`。
 
         Returns:
             列表，每个元素是对应图片的识别结果，由 (text, score) 组成，其中：
                 + text: 识别出的文本
                 + score: 识别结果的得分
+            `return_stats` 为 `True` 时返回 (列表, stats)。
         """
+        if cand_alphabet is not None:
+            logger.warning(
+                '`cand_alphabet` is not supported by %s, ignoring it' % self._model_name
+            )
         if not isinstance(img_list, (list, tuple)):
             img_list = [img_list]
 
-        self.recognizer.rec_batch_num = batch_size
-
         img_data_list = []
         for img in img_list:
             if isinstance(img, (str, Path)):
@@ -182,13 +208,29 @@ class RapidRecognizer(Recognizer):
                 img = img[..., ::-1]  # RGB to BGR
             img_data_list.append(img)
 
-        rec_input = TextRecInput(img=img_data_list, return_word_box=return_word_box)
+        imgH = self.rec_image_shape[1]
+        batches, stats = self._plan_batches(
+            [int(math.ceil(imgH * img.shape[1] / img.shape[0])) for img in img_data_list],
+            batch_size,
+            pixel_budget=pixel_budget,
+            height=imgH,
+            min_padded_width=self.min_padded_width,
+        )
+
+        out = [None] * len(img_data_list)
         try:
-            results = self.recognizer(rec_input)
-            return [(txt, score) for txt, score in zip(results.txts, results.scores)]
+            for batch_ids in batches:
+                rec_input = TextRecInput(
+                    img=[img_data_list[i] for i in batch_ids],
+                    return_word_box=return_word_box,
+                )
+                results = self.recognizer(rec_input)
+                for idx, txt, score in zip(batch_ids, results.txts, results.scores):
+                    out[idx] = (txt, score)
         except Exception as e:
             logger.error(f"Error recognizing image: {e}")
-            return []
+            out = []
+        return (out, stats) if return_stats else out
 
     def recognize_one_line(
         self, img: Union[str, Path, np.ndarray]
@@ -27,7 +27,7 @@ import logging
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
-from ..utils import get_default_ort_providers
+from ..utils import create_ort_session
 
 logger = logging.getLogger(__name__)
 
@@ -144,9 +144,7 @@ def parse_args():
     return parser.parse_args()
 
 
-def create_predictor(model_dir, mode, ort_providers=None):
-    import onnxruntime as ort
-
+def create_predictor(model_dir, mode, ort_providers=None, ort_session_options=None):
     # if mode == "det":
     #     model_dir = args.det_model_dir
     # elif mode == 'cls':
@@ -166,10 +164,11 @@ def create_predictor(model_dir, mode, ort_providers=None):
     if not os.path.exists(model_file_path):
         raise ValueError("not find model file path {}".format(
             model_file_path))
-    if ort_providers is None:
-        ort_providers = get_default_ort_providers()
-    logger.debug(f'ort providers: {ort_providers}')
-    sess = ort.InferenceSession(model_file_path, providers=ort_providers)
+    sess = create_ort_session(
+        model_file_path,
+        ort_providers=ort_providers,
+        ort_session_options=ort_session_options,
+    )
     return sess, sess.get_inputs()[0], None, None
 
 
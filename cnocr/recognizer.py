@@ -20,7 +20,7 @@
 import os
 import logging
 from glob import glob
-from typing import Union, List, Tuple, Optional, Collection
+from typing import Union, List, Tuple, Optional, Collection, Dict
 from pathlib import Path
 
 import numpy as np
@@ -28,7 +28,14 @@ from PIL import Image
 import torch
 from cnstd.utils import get_model_file
 
-from .consts import MODEL_VERSION, AVAILABLE_MODELS, DOWNLOAD_SOURCE
+from .consts import (
+    MODEL_VERSION,
+    AVAILABLE_MODELS,
+    DOWNLOAD_SOURCE,
+    IMG_STANDARD_HEIGHT,
+    QUANTIZED_MODEL_SUFFIX,
+    split_quantized_model_name,
+)
 from .models.ocr_model import OcrModel
 from .utils import (
     data_dir,
@@ -37,13 +44,24 @@ from .utils import (
     check_context,
     read_img,
     load_model_params,
-    resize_img,
-    pad_img_seq,
-    to_numpy,
-    get_default_ort_providers,
+    get_resized_width,
+    resize_img_batch,
+    normalize_img_batch,
+    ImageBatchBuffer,
+    gen_candidates_mask,
+    CandidateMask,
+    CandidateMaskCache,
+    create_ort_session,
 )
-from .data_utils.aug import NormalizeAug
 from .models.ctc import CTCPostProcessor
+from .batching import BatchingStats, plan_batches
+from .onnx_utils import (
+    prepare_quantized_model,
+    BEST_PATH_OUTPUT,
+    BEST_PATH_PROBS_OUTPUT,
+    CAND_MASK_INPUT,
+    UINT8_INPUT_TYPE,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -73,7 +91,10 @@ class Recognizer(object):
         识别模型初始化函数。
 
         Args:
-            model_name (str): 模型名称。默认为 `densenet_lite_136-gru`
+            model_name (str): 模型名称。默认为 `densenet_lite_136-gru`。
+                名称后加上 `-int8` 表示使用其 INT8 量化版本，如 `densenet_lite_136-gru-int8`：
+                ONNX 模型如果还没有量化文件，会自动做动态量化后存在原模型文件旁边；
+                PyTorch 模型会对 GRU/LSTM/Linear 层做动态量化（只支持 CPU）。
             cand_alphabet (Optional[Union[Collection, str]]): 待识别字符所在的候选集合。默认为 `None`，表示不限定识别字符范围
             context (str): 'cpu', or 'gpu'。表明预测时是使用CPU还是GPU。默认为 `cpu`。
                 此参数仅在 `model_backend=='pytorch'` 时有效。
@@ -87,6 +108,8 @@ class Recognizer(object):
                 若训练的自有模型更改了字符集，看通过此参数传入新的字符集文件路径。
             **kwargs:
                 ort_providers (List[str]): 使用 ONNX 模型时，使用此参数指定 `onnxruntime` 识别模型运行的设备。未指定则使用默认值（优先使用 GPU）。
+                ort_session_options (Dict[str, Any]): 使用 ONNX 模型时，创建 `onnxruntime.InferenceSession` 的配置，
+                    如优化级别、线程数等，可用的 key 见 `cnocr.utils.DEFAULT_ORT_SESSION_OPTIONS`。
 
         Examples:
             使用默认参数：
@@ -109,7 +132,7 @@ class Recognizer(object):
         check_model_name(model_name)
         check_context(context)
 
-        self._model_name = model_name
+        self._model_name, self._quantized = split_quantized_model_name(model_name)
         self._model_backend = model_backend
         if context == 'gpu':
             context = 'cuda'
@@ -139,11 +162,29 @@ class Recognizer(object):
         self.postprocessor = CTCPostProcessor(vocab=self._vocab)
 
         self._candidates = None
-        self.set_cand_alphabet(cand_alphabet)
-
+        self.last_batching_stats = None
+        self._cand_cache = CandidateMaskCache(
+            self._letter2id,
+            len(self._vocab) + 1,
+            ignored_tokens=[len(self._vocab)],  # 间隔符号/填充符号，必须为真
+        )
         self._model = self._get_model(
-            context, ort_providers=kwargs.get('ort_providers')
+            context,
+            ort_providers=kwargs.get('ort_providers'),
+            ort_session_options=kwargs.get('ort_session_options'),
+        )
+        self._onnx_best_path, self._onnx_cand_mask = self._check_onnx_graph(
+            self._model if self._model_backend == 'onnx' else None
+        )
+        # 图片输入为 uint8 的 ONNX 模型在图内做归一化（`--with-uint8-input`）
+        self._onnx_uint8_input = (
+            self._model_backend == 'onnx'
+            and self._model.get_inputs()[0].type == UINT8_INPUT_TYPE
         )
+        self._batch_buffer = ImageBatchBuffer(
+            'uint8' if self._onnx_uint8_input else 'float32'
+        )
+        self.set_cand_alphabet(cand_alphabet)
 
     def _assert_and_prepare_model_files(self, model_fp, root):
         self._model_file_prefix = '{}-{}'.format(
@@ -167,7 +208,7 @@ class Recognizer(object):
         root = os.path.join(root, MODEL_VERSION)
         self._model_dir = os.path.join(root, self._model_name)
         model_ext = 'ckpt' if self._model_backend == 'pytorch' else 'onnx'
-        fps = glob('%s/%s*.%s' % (self._model_dir, self._model_file_prefix, model_ext))
+        fps = self._glob_model_files(model_ext)
         if len(fps) > 1:
             raise ValueError(
                 'multiple %s files are found in %s, not sure which one should be used'
@@ -184,31 +225,66 @@ class Recognizer(object):
             get_model_file(
                 url, self._model_dir, download_source=DOWNLOAD_SOURCE
             )  # download the .zip file and unzip
-            fps = glob(
-                '%s/%s*.%s' % (self._model_dir, self._model_file_prefix, model_ext)
-            )
+            fps = self._glob_model_files(model_ext)
 
         self._model_fp = fps[0]
+        if self._quantized and model_ext == 'onnx':
+            self._model_fp = prepare_quantized_model(self._model_fp)
 
-    def _get_model(self, context, ort_providers=None):
+    def _glob_model_files(self, model_ext):
+        fps = glob('%s/%s*.%s' % (self._model_dir, self._model_file_prefix, model_ext))
+        # 量化后的模型文件（`*-int8.onnx`）与原模型放在一起，这里只找原模型
+        return [
+            fp
+            for fp in fps
+            if not fp.endswith(QUANTIZED_MODEL_SUFFIX + '.' + model_ext)
+        ]
+
+    def _get_model(self, context, ort_providers=None, ort_session_options=None):
         logger.info('use model: %s' % self._model_fp)
         if self._model_backend == 'pytorch':
             model = gen_model(self._model_name, self._vocab)
             model.eval()
             model.to(self.context)
             model = load_model_params(model, self._model_fp, context)
+            if self._quantized:
+                if self.context != 'cpu':
+                    raise ValueError(
+                        'quantized pytorch models can only run on cpu, but got %s'
+                        % self.context
+                    )
+                model = model.quantize_dynamic()
         elif self._model_backend == 'onnx':
-            import onnxruntime as ort
-
-            if ort_providers is None:
-                ort_providers = get_default_ort_providers()
-            logger.debug(f'ort providers: {ort_providers}')
-            model = ort.InferenceSession(self._model_fp, providers=ort_providers)
+            model = create_ort_session(
+                self._model_fp,
+                ort_providers=ort_providers,
+                ort_session_options=ort_session_options,
+            )
         else:
             raise NotImplementedError(f'{self._model_backend} is not supported yet')
 
         return model
 
+    @staticmethod
+    def _check_onnx_graph(ort_session) -> Tuple[bool, bool]:
+        """
+        Check whether the ONNX model outputs best paths computed inside the graph
+        (exported with `--with-best-path`), and whether it takes the `cand_mask` input.
+
+        Returns:
+            tuple: (outputs best paths or not, takes `cand_mask` or not)
+        """
+        if ort_session is None:
+            return False, False
+        output_names = {node.name for node in ort_session.get_outputs()}
+        input_names = {node.name for node in ort_session.get_inputs()}
+        return BEST_PATH_OUTPUT in output_names, CAND_MASK_INPUT in input_names
+
+    @property
+    def candidates(self) -> Optional[List[str]]:
+        """当前的候选字符，`None` 表示不限定识别字符范围。"""
+        return None if self._candidates is None else self._candidates.candidates
+
     def set_cand_alphabet(self, cand_alphabet: Optional[Union[Collection, str]]):
         """
         设置待识别字符的候选集合。
@@ -220,23 +296,20 @@ class Recognizer(object):
             None
 
         """
-        if cand_alphabet is None:
-            self._candidates = None
-        else:
-            cand_alphabet = [
-                word if word != ' ' else '<space>' for word in cand_alphabet
-            ]
-            excluded = set(
-                [word for word in cand_alphabet if word not in self._letter2id]
+        self._candidates = self._compile_candidates(cand_alphabet)
+
+    def _compile_candidates(
+        self, cand_alphabet: Optional[Union[Collection, str, CandidateMask]]
+    ) -> Optional[CandidateMask]:
+        """把候选字符集合编译为 `CandidateMask`（带 LRU 缓存），候选字符都不在词表中时返回 `None`。"""
+        candidates = self._cand_cache.get(cand_alphabet)
+        if candidates is not None and self._onnx_best_path and not self._onnx_cand_mask:
+            raise ValueError(
+                'the ONNX model %s computes best paths inside the graph without the `%s` input, '
+                'so `cand_alphabet` is not supported; re-export it with `--with-cand-mask`'
+                % (self._model_fp, CAND_MASK_INPUT)
             )
-            if excluded:
-                logger.warning(
-                    'chars in candidates are not in the vocab, ignoring them: %s'
-                    % excluded
-                )
-            candidates = [word for word in cand_alphabet if word in self._letter2id]
-            self._candidates = None if len(candidates) == 0 else candidates
-            logger.debug('candidate chars: %s' % self._candidates)
+        return candidates
 
     # def ocr(
     #     self, img_fp: Union[str, Path, torch.Tensor, np.ndarray]
@@ -326,7 +399,10 @@ class Recognizer(object):
         self,
         img_list: List[Union[str, Path, torch.Tensor, np.ndarray]],
         batch_size: int = 1,
-    ) -> List[Tuple[str, float]]:
+        pixel_budget: Optional[int] = None,
+        cand_alphabet: Optional[Union[Collection, str]] = None,
+        return_stats: bool = False,
+    ) -> Union[List[Tuple[str, float]], Tuple[List[Tuple[str, float]], BatchingStats]]:
         """
         Batch recognize characters from a list of one-line-characters images.
 
@@ -339,43 +415,51 @@ class Recognizer(object):
                 The optional channel should be 1 (gray image) or 3 (RGB-format color image).
                 注：img_list 不宜包含太多图片，否则同时导入这些图片会消耗很多内存。
             batch_size: 待处理图片很多时，需要分批处理，每批图片的数量由此参数指定。默认为 `1`。
+            pixel_budget: 每批图片最多包含的像素数（batch_size * height * padded_width）。
+                取值不为 `None` 时，先把宽度相近的图片分在一起，再按此预算决定每批的大小（不超过 `batch_size`），
+                参考 `cnocr.batching.plan_batches()`。默认为 `None`，表示按固定的 `batch_size` 分批。
+            cand_alphabet: 只对本次调用生效的候选字符集合，不改变 `set_cand_alphabet()` 设置的集合。
+                编译好的集合会被缓存，同一个集合只编译一次。默认为 `None`，表示使用 `set_cand_alphabet()` 设置的集合。
+            return_stats: 是否同时返回本次调用的分批统计信息（`cnocr.batching.BatchingStats`）。默认为 `False`。
 
         Returns:
             list: list of (chars, prob), such as
-            [('第一行', 0.80), ('第二行', 0.75), ('第三行', 0.9)]
+            [('第一行', 0.80), ('第二行', 0.75), ('第三行', 0.9)];
+            `return_stats` 为 `True` 时返回 (list, stats)
         """
         if len(img_list) == 0:
-            return []
+            return ([], BatchingStats()) if return_stats else []
 
-        img_list = [self._prepare_img(img) for img in img_list]
-        img_list = [self._transform_img(img) for img in img_list]
+        candidates = (
+            self._candidates
+            if cand_alphabet is None
+            else self._compile_candidates(cand_alphabet)
+        )
 
-        should_sort = batch_size > 1 and len(img_list) // batch_size > 1
+        img_list = [self._prepare_img(img) for img in img_list]
+        width_list = [get_resized_width(*img.shape[:2]) for img in img_list]
 
-        if should_sort:
+        batches, stats = self._plan_batches(
+            width_list,
+            batch_size,
+            pixel_budget=pixel_budget,
+            height=IMG_STANDARD_HEIGHT,
             # 把图片按宽度从小到大排列，提升效率
-            sorted_idx_list = sorted(
-                range(len(img_list)), key=lambda i: img_list[i].shape[2]
-            )
-            sorted_img_list = [img_list[i] for i in sorted_idx_list]
-        else:
-            sorted_idx_list = range(len(img_list))
-            sorted_img_list = img_list
+            sort=batch_size > 1 and len(img_list) // batch_size > 1,
+        )
 
-        idx = 0
-        sorted_out = []
-        while idx * batch_size < len(sorted_img_list):
-            imgs = sorted_img_list[idx * batch_size : (idx + 1) * batch_size]
+        out = [None] * len(img_list)
+        for batch_ids in batches:
+            imgs, img_lengths = self._transform_batch(
+                [img_list[i] for i in batch_ids], [width_list[i] for i in batch_ids]
+            )
             try:
-                batch_out = self._predict(imgs)
+                batch_out = self._predict(imgs, img_lengths, candidates)
             except Exception as e:
                 # 对于太小的图片，如宽度小于8，会报错
-                batch_out = {'preds': [([''], 0.0)] * len(imgs)}
-            sorted_out.extend(batch_out['preds'])
-            idx += 1
-        out = [None] * len(sorted_out)
-        for idx, pred in zip(sorted_idx_list, sorted_out):
-            out[idx] = pred
+                batch_out = {'preds': [([''], 0.0)] * len(batch_ids)}
+            for idx, pred in zip(batch_ids, batch_out['preds']):
+                out[idx] = pred
 
         res = []
         for line in out:
@@ -383,48 +467,122 @@ class Recognizer(object):
             chars = [c if c != '<space>' else ' ' for c in chars]
             res.append((''.join(chars), prob))
 
-        return res
+        return (res, stats) if return_stats else res
 
-    def _transform_img(self, img: np.ndarray) -> torch.Tensor:
+    @property
+    def min_padded_width(self) -> int:
+        """每批图片补齐（padding）后的最小宽度；此模型只补齐到每批中最宽图片的宽度。"""
+        return 0
+
+    def _plan_batches(
+        self, widths: List[int], batch_size: int, **kwargs
+    ) -> Tuple[List[List[int]], BatchingStats]:
+        """
+        分批，参数和返回值见 `cnocr.batching.plan_batches()`。
+        统计信息同时存入 `self.last_batching_stats`，仅供调试查看；多线程调用时请使用 `recognize()` 的 `return_stats` 参数。
+        """
+        batches, stats = plan_batches(widths, batch_size, **kwargs)
+        self.last_batching_stats = stats
+        return batches, stats
+
+    def _transform_batch(
+        self, img_list: List[np.ndarray], width_list: List[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
+        Resize the images directly into one reusable batch buffer, and normalize them all at once.
+
         Args:
-            img: image array with type torch.Tensor or np.ndarray,
-            with shape [height, width] or [height, width, channel].
-            channel shoule be 1 (gray image) or 3 (color image).
+            img_list: list of image arrays with shape [height, width, 1], dtype uint8
+            width_list: widths of the images after being resized
 
         Returns:
-            torch.Tensor: with shape (1, height, width)
+            tuple: (imgs, img_lengths); imgs with shape (B, 1, height, max_width), dtype float32,
+                or dtype uint8 without normalization if the ONNX model normalizes inside its graph;
+                img_lengths with shape (B,), dtype int64
         """
-        img = resize_img(img.transpose((2, 0, 1)))  # res: [C, H, W]
-        return NormalizeAug()(img).to(device=torch.device(self.context))
+        imgs = self._batch_buffer.take(
+            (len(img_list), 1, IMG_STANDARD_HEIGHT, max(width_list))
+        )
+        resize_img_batch(img_list, width_list, out=imgs)
+        if not self._onnx_uint8_input:
+            normalize_img_batch(imgs)
+        return imgs, np.array(width_list, dtype=np.int64)
 
-    def _predict(self, img_list: List[torch.Tensor]):
-        img_lengths = torch.tensor([img.shape[2] for img in img_list])
-        imgs = pad_img_seq(img_list)
+    def _predict(
+        self,
+        imgs: np.ndarray,
+        img_lengths: np.ndarray,
+        candidates: Optional[CandidateMask] = None,
+    ):
         if self._model_backend == 'pytorch':
+            imgs = torch.from_numpy(imgs).to(device=torch.device(self.context))
+            img_lengths = torch.from_numpy(img_lengths)
             with torch.no_grad():
                 out = self._model(
-                    imgs, img_lengths, candidates=self._candidates, return_preds=True
+                    imgs, img_lengths, candidates=candidates, return_preds=True
                 )
         else:  # onnx
-            out = self._onnx_predict(imgs, img_lengths)
+            out = self._onnx_predict(imgs, img_lengths, candidates)
 
         return out
 
-    def _onnx_predict(self, imgs, img_lengths):
+    def _onnx_inputs(
+        self, imgs, img_lengths, candidates: Optional[CandidateMask] = None
+    ) -> Dict[str, np.ndarray]:
         ort_session = self._model
         ort_inputs = {
-            ort_session.get_inputs()[0].name: to_numpy(imgs),
-            ort_session.get_inputs()[1].name: to_numpy(img_lengths),
+            ort_session.get_inputs()[0].name: imgs,
+            ort_session.get_inputs()[1].name: img_lengths,
+        }
+        if self._onnx_cand_mask:
+            ort_inputs[CAND_MASK_INPUT] = (
+                candidates.mask
+                if candidates is not None
+                else gen_candidates_mask(
+                    None, self._letter2id, len(self._vocab) + 1, ignored_tokens=[]
+                )
+            )
+        return ort_inputs
+
+    def _onnx_predict(
+        self, imgs, img_lengths, candidates: Optional[CandidateMask] = None
+    ):
+        ort_session = self._model
+        ort_outs = ort_session.run(
+            None, self._onnx_inputs(imgs, img_lengths, candidates)
+        )
+        ort_outs = {
+            node.name: value
+            for node, value in zip(ort_session.get_outputs(), ort_outs)
         }
-        ort_outs = ort_session.run(None, ort_inputs)
+        if self._onnx_best_path:
+            # best path 已经在图内算好，只需合并重复字符
+            out = {
+                BEST_PATH_OUTPUT: ort_outs[BEST_PATH_OUTPUT],
+                'output_lengths': ort_outs['output_lengths'],
+            }
+            out["preds"] = self.postprocessor.decode_best_path(
+                ort_outs[BEST_PATH_OUTPUT],
+                ort_outs[BEST_PATH_PROBS_OUTPUT],
+                self._vocab,
+                input_lengths=ort_outs['output_lengths'],
+                blank=len(self._vocab),
+            )
+            return out
+
+        # 全程使用 NumPy，不再经过 torch
         out = {
-            'logits': torch.from_numpy(ort_outs[0]),
-            'output_lengths': torch.from_numpy(ort_outs[1]),
+            'logits': ort_outs['logits'],
+            'output_lengths': ort_outs['output_lengths'],
         }
-        out['logits'] = OcrModel.mask_by_candidates(
-            out['logits'], self._candidates, self._vocab, self._letter2id
+        class_index = None
+        if candidates is not None:
+            # 只取候选字符（及 blank）对应的列，不用屏蔽整个词表
+            class_index = candidates.index
+            out['logits'] = np.take(out['logits'], class_index, axis=-1)
+            out['class_index'] = class_index
+
+        out["preds"] = self.postprocessor(
+            out['logits'], out['output_lengths'], class_index=class_index
         )
-
-        out["preds"] = self.postprocessor(out['logits'], out['output_lengths'])
         return out
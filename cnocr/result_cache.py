@@ -0,0 +1,355 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 按图片内容的哈希值缓存识别结果：整张图片的结果缓存（内存中的 LRU，以及可选的 SQLite 磁盘缓存），
+# 以及文本行级别的识别缓存。
+
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .utils import data_dir, get_resized_width
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_ENTRIES = 100000
+DEFAULT_MAX_LINE_ENTRIES = 4096
+# 计算文本行指纹前，先把图片 resize 到此高度
+FINGERPRINT_HEIGHT = 32
+# 磁盘缓存每写入多少条检查一次是否超出 `max_disk_entries`
+_DISK_EVICT_INTERVAL = 256
+
+# 缓存的值：(texts, scores, boxes)，`boxes` 未使用检测模型时为 `None`
+CachedResult = Tuple[List[str], np.ndarray, Optional[np.ndarray]]
+
+
+def _new_hasher():
+    try:
+        import xxhash
+
+        return 'xxh128', xxhash.xxh3_128()
+    except ImportError:
+        return 'b2b128', hashlib.blake2b(digest_size=16)
+
+
+def image_cache_key(img: np.ndarray, *params: Any) -> str:
+    """
+    计算图片像素内容及相关参数的哈希值，作为缓存的 key。
+    安装了 `xxhash` 时使用 XXH3，否则使用 `hashlib.blake2b`；两者的 key 带有不同的前缀，不会混用。
+
+    Args:
+        img (np.ndarray): 解码后的图片
+        *params: 影响识别结果的其他参数（如模型和检测参数），会被 `repr()` 后一起计算哈希值
+
+    Returns:
+        str: 缓存的 key
+    """
+    name, hasher = _new_hasher()
+    img = np.ascontiguousarray(img)
+    hasher.update(('%s%s' % (img.dtype.str, img.shape)).encode('utf-8'))
+    hasher.update(memoryview(img).cast('B'))
+    hasher.update(repr(params).encode('utf-8'))
+    return '%s:%s' % (name, hasher.hexdigest())
+
+
+def _to_blob(arr: np.ndarray) -> bytes:
+    """用 `.npy` 格式序列化，保留 dtype 和 shape。"""
+    buf = BytesIO()
+    np.save(buf, arr, allow_pickle=False)
+    return buf.getvalue()
+
+
+def _from_blob(blob: bytes) -> np.ndarray:
+    return np.load(BytesIO(blob), allow_pickle=False)
+
+
+def _nbytes(value: CachedResult) -> int:
+    texts, scores, boxes = value
+    size = sum(len(text) * 4 + 64 for text in texts) + scores.nbytes
+    if boxes is not None:
+        size += boxes.nbytes
+    return size
+
+
+class ResultCache(object):
+    """
+    识别结果的缓存，线程安全。
+
+    内存中使用 LRU：条目数超过 `max_entries` 或估算的大小超过 `max_bytes` 时，淘汰最久未使用的条目。
+    `use_disk_cache=True` 时，结果同时写入 SQLite 文件，内存中未命中时再查磁盘，
+    所以重启后或多个进程之间也可以共用缓存；磁盘缓存的条目数超过 `max_disk_entries` 时，淘汰最久未访问的条目。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        use_disk_cache: bool = False,
+        disk_cache_fp: Optional[Union[str, Path]] = None,
+        max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+    ):
+        """
+        Args:
+            max_entries (int): 内存中最多缓存的条目数
+            max_bytes (int): 内存中缓存的结果最多占用的字节数（估算值）
+            use_disk_cache (bool): 是否使用 SQLite 磁盘缓存。默认为 `False`
+            disk_cache_fp (Optional[Union[str, Path]]): SQLite 文件路径；
+                默认为 `None`，表示使用 `data_dir()/result-cache.sqlite`
+            max_disk_entries (int): 磁盘中最多缓存的条目数
+        """
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self._entries = OrderedDict()
+        self._num_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._db = None
+        self.disk_cache_fp = None
+        if use_disk_cache:
+            self.disk_cache_fp = str(
+                disk_cache_fp or os.path.join(data_dir(), 'result-cache.sqlite')
+            )
+            self._open_db()
+
+    def _open_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.disk_cache_fp)), exist_ok=True)
+        self._db = sqlite3.connect(
+            self.disk_cache_fp, timeout=10.0, check_same_thread=False
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, texts TEXT, scores BLOB, boxes BLOB, last_access REAL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)'
+        )
+        self._db.commit()
+        self._db_lock = threading.Lock()
+        self._num_disk_puts = 0
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """查找缓存；未命中时返回 `None`。"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return value
+
+        value = self._disk_get(key) if self._db is not None else None
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            self._put_memory(key, value)
+        return value
+
+    def put(self, key: str, value: CachedResult):
+        """写入缓存。"""
+        with self._lock:
+            self._put_memory(key, value)
+        if self._db is not None:
+            self._disk_put(key, value)
+
+    def _put_memory(self, key: str, value: CachedResult):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._num_bytes -= _nbytes(old)
+        self._entries[key] = value
+        self._num_bytes += _nbytes(value)
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._num_bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._num_bytes -= _nbytes(evicted)
+            self._counters['evictions'] += 1
+
+    def _disk_get(self, key: str) -> Optional[CachedResult]:
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT texts, scores, boxes FROM results WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                'UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key)
+            )
+            self._db.commit()
+        texts, scores, boxes = row
+        scores = _from_blob(scores)
+        if boxes is not None:
+            boxes = _from_blob(boxes)
+        return json.loads(texts), scores, boxes
+
+    def _disk_put(self, key: str, value: CachedResult):
+        texts, scores, boxes = value
+        row = (
+            key,
+            json.dumps(texts, ensure_ascii=False),
+            _to_blob(np.asarray(scores)),
+            None if boxes is None else _to_blob(np.asarray(boxes)),
+            time.time(),
+        )
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', row
+            )
+            self._num_disk_puts += 1
+            if self._num_disk_puts % _DISK_EVICT_INTERVAL == 0:
+                self._db.execute(
+                    'DELETE FROM results WHERE key IN (SELECT key FROM results '
+                    'ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                    (self.max_disk_entries,),
+                )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中、未命中和淘汰的次数，以及内存中的条目数和估算的字节数。"""
+        with self._lock:
+            res = dict(self._counters)
+            res['num_entries'] = len(self._entries)
+            res['num_bytes'] = self._num_bytes
+        num_lookups = res['hits'] + res['disk_hits'] + res['misses']
+        res['hit_rate'] = (res['hits'] + res['disk_hits']) / max(num_lookups, 1)
+        return res
+
+    def clear(self):
+        """清空内存中的缓存（磁盘缓存不受影响）。"""
+        with self._lock:
+            self._entries.clear()
+            self._num_bytes = 0
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+
+def line_fingerprint(img: np.ndarray, perceptual: bool = False, salt: str = '') -> str:
+    """
+    计算文本行图片的指纹：先转为灰度图，再保持高宽比 resize 到高度 `FINGERPRINT_HEIGHT`，然后计算哈希值。
+
+    Args:
+        img (np.ndarray): 文本行图片，shape 为 `(height, width)` 或 `(height, width, channel)`，uint8
+        perceptual (bool): 是否使用感知哈希：resize 后用 Otsu 方法二值化，再缩小一半，
+            所以多数 JPEG 噪声和亮度差异不会改变指纹（但也可能把笔画差异很小的文本行视为相同）。
+            默认为 `False`，表示对 resize 后的像素做精确哈希
+        salt (str): 与图片一起计算哈希值的字符串，如模型的标识
+
+    Returns:
+        str: 指纹
+    """
+    if img.ndim == 3 and img.shape[2] == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    elif img.ndim == 3:
+        img = img[:, :, 0]
+    height, width = img.shape[:2]
+    if min(height, width) < 1:
+        return image_cache_key(img, salt, perceptual)
+    target_w = get_resized_width(height, width, target_height=FINGERPRINT_HEIGHT)
+    img = cv2.resize(img, (target_w, FINGERPRINT_HEIGHT), interpolation=cv2.INTER_AREA)
+    if perceptual:
+        _, img = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        img = cv2.resize(
+            img,
+            (max(1, target_w // 2), FINGERPRINT_HEIGHT // 2),
+            interpolation=cv2.INTER_AREA,
+        )
+        img = np.packbits(img > 127, axis=-1)
+    return image_cache_key(img, salt, perceptual)
+
+
+class RecognitionCache(object):
+    """
+    文本行级别的识别缓存，线程安全。表格、票据等模板化的文档中，同样的表头和标签文字会在多页中重复出现，
+    识别前先按 `line_fingerprint()` 查找缓存，只有未命中的文本行才送入识别模型。
+    同一次调用中指纹相同的文本行也只识别一次。
+    """
+
+    def __init__(
+        self, max_entries: int = DEFAULT_MAX_LINE_ENTRIES, perceptual: bool = False
+    ):
+        """
+        Args:
+            max_entries (int): 最多缓存的文本行数；取值为 `0` 表示只在每次调用内部去重，不跨调用缓存
+            perceptual (bool): 是否使用感知哈希作为指纹，参考 `line_fingerprint()`。默认为 `False`
+        """
+        self.max_entries = max(0, max_entries)
+        self.perceptual = perceptual
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'deduped': 0, 'evictions': 0}
+
+    def fingerprint(self, img: np.ndarray, salt: str = '') -> str:
+        return line_fingerprint(img, perceptual=self.perceptual, salt=salt)
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def put(self, key: str, value: Tuple[str, float]):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def record_deduped(self, num: int):
+        """记录同一次调用中因为指纹重复而跳过识别的文本行数。"""
+        with self._lock:
+            self._counters['deduped'] += num
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            res = dict(self._counters)
+            res['num_entries'] = len(self._entries)
+        num_lines = res['hits'] + res['misses'] + res['deduped']
+        res['skip_rate'] = (res['hits'] + res['deduped']) / max(num_lines, 1)
+        return res
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
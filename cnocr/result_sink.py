@@ -0,0 +1,209 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 批量识别结果的输出格式：JSONL，以及列式存储的 Parquet / Arrow。
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 列式输出中每个 row group 的默认行数（每行对应一个文本框）
+DEFAULT_ROW_GROUP_SIZE = 64 * 1024
+COLUMNAR_SUFFIXES = ('.parquet', '.arrow', '.feather')
+
+
+def to_jsonable(obj: Any) -> Any:
+    """把识别结果中的 `np.ndarray` 和 numpy 标量转换为 JSON 可以序列化的类型。"""
+    if isinstance(obj, dict):
+        return {key: to_jsonable(val) for key, val in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(val) for val in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+class JsonlResultSink(object):
+    """每张图片的结果写为一行 JSON：`{"image": <fp>, "results": [...]}` 或 `{"image": <fp>, "error": <message>}`。"""
+
+    def __init__(self, output_fp: Union[str, Path]):
+        self._fout = open(output_fp, 'w', encoding='utf-8')
+
+    def write(
+        self,
+        image: str,
+        results: Optional[List[Dict[str, Any]]] = None,
+        error: Optional[str] = None,
+    ):
+        record = {'image': image}
+        if error is not None:
+            record['error'] = error
+        else:
+            record['results'] = to_jsonable(results)
+        self._fout.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArrowResultSink(object):
+    """
+    以列式格式写出识别结果，每个文本框一行，包含以下几列：
+
+        - `image` (string): 图片标识（路径）
+        - `box_idx` (int32): 文本框在图片中的序号；识别出错或者没有检测出文本框的图片只有一行，其值为 `-1`
+        - `text` (string): 识别出的文本
+        - `score` (float32): 识别结果的得分
+        - `position` (fixed_size_list<float32, 8>): 文本框 4 个点的坐标 `(x0, y0, ..., x3, y3)`；
+          未使用检测模型时为 null
+        - `error` (string): 识别出错时的错误信息，否则为 null
+
+    没有检测出文本框的图片也会写出一行（`text`、`score`、`position` 和 `error` 都为 null），
+    所以每张输入图片在输出中都至少有一行。
+
+    结果在内存中累积到 `row_group_size` 行后才写出一次，作为一个 row group。
+    文件后缀为 `.parquet` 时写 Parquet 文件；为 `.arrow` 或 `.feather` 时写 Arrow IPC 文件，
+    下游可以用 `pyarrow.memory_map()` 直接读取而无需解析。
+    """
+
+    def __init__(
+        self,
+        output_fp: Union[str, Path],
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        compression: Optional[str] = 'zstd',
+    ):
+        """
+        Args:
+            output_fp (Union[str, Path]): 输出文件路径
+            row_group_size (int): 每个 row group 的行数
+            compression (Optional[str]): Parquet 文件使用的压缩算法。默认为 `'zstd'`
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                'Please install pyarrow first to write Parquet/Arrow results: `pip install pyarrow`'
+            )
+
+        self._pa = pa
+        self.output_fp = str(output_fp)
+        self.row_group_size = max(1, row_group_size)
+        self.schema = pa.schema(
+            [
+                ('image', pa.string()),
+                ('box_idx', pa.int32()),
+                ('text', pa.string()),
+                ('score', pa.float32()),
+                ('position', pa.list_(pa.float32(), 8)),
+                ('error', pa.string()),
+            ]
+        )
+        if self.output_fp.lower().endswith('.parquet'):
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(
+                self.output_fp, self.schema, compression=compression
+            )
+        else:
+            self._writer = pa.ipc.new_file(self.output_fp, self.schema)
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._columns = {name: [] for name in self.schema.names}
+        self._positions = []
+
+    def write(
+        self,
+        image: str,
+        results: Optional[List[Dict[str, Any]]] = None,
+        error: Optional[str] = None,
+    ):
+        cols = self._columns
+        placeholder = error is not None or not results
+        if placeholder:
+            results = [{'text': None, 'score': None, 'error': error}]
+        for box_idx, res in enumerate(results):
+            cols['image'].append(image)
+            cols['box_idx'].append(-1 if placeholder else box_idx)
+            cols['text'].append(res['text'])
+            cols['score'].append(res['score'])
+            cols['error'].append(res.get('error'))
+            position = res.get('position')
+            self._positions.append(
+                None
+                if position is None
+                else np.asarray(position, dtype=np.float32).reshape(8)
+            )
+        if len(cols['image']) >= self.row_group_size:
+            self._write_row_group()
+
+    def _position_array(self):
+        pa = self._pa
+        if all(pos is not None for pos in self._positions):
+            values = np.stack(self._positions).reshape(-1)
+            return pa.FixedSizeListArray.from_arrays(pa.array(values), 8)
+        return pa.array(
+            [None if pos is None else pos.tolist() for pos in self._positions],
+            type=self.schema.field('position').type,
+        )
+
+    def _write_row_group(self):
+        if not self._columns['image']:
+            return
+        pa = self._pa
+        arrays = []
+        for field in self.schema:
+            if field.name == 'position':
+                arrays.append(self._position_array())
+            else:
+                arrays.append(pa.array(self._columns[field.name], type=field.type))
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        self._writer.write_table(table)
+        self._reset_buffer()
+
+    def close(self):
+        self._write_row_group()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_result_sink(
+    output_fp: Union[str, Path], **kwargs
+) -> Union[JsonlResultSink, ArrowResultSink]:
+    """根据文件后缀选择输出格式：`.parquet`、`.arrow`、`.feather` 为列式格式，其他为 JSONL。"""
+    if str(output_fp).lower().endswith(COLUMNAR_SUFFIXES):
+        return ArrowResultSink(output_fp, **kwargs)
+    return JsonlResultSink(output_fp)
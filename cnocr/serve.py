@@ -17,29 +17,253 @@
 # specific language governing permissions and limitations
 # under the License.
 
-from copy import deepcopy
-from typing import List, Dict, Any
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
 from pydantic import BaseModel
-from fastapi import FastAPI, UploadFile
+from fastapi import FastAPI, Form, HTTPException, Request, UploadFile
 from PIL import Image
 
-from cnocr import CnOcr
+from cnocr import CnOcr, RecognitionCache, ResultCache
 from cnocr.utils import set_logger
+from cnocr.micro_batch import MicroBatcher
+from cnocr.lanes import LANE_HEADER, LaneExecutor, parse_lane_weights
+from cnocr.admission import (
+    DEADLINE_HEADER,
+    AdmissionController,
+    DeadlineExceeded,
+    check_deadline,
+    parse_deadline,
+    time_left,
+)
 
 logger = set_logger(log_level='DEBUG')
 
-app = FastAPI()
-OCR_MODEL = CnOcr()
+# 执行推理的线程数。onnxruntime 计算时会释放 GIL，所以多个请求可以同时推理；
+# 每次推理本身也会用多个核，所以线程数不宜超过 CPU 核数
+INFER_WORKERS = int(os.getenv('CNOCR_INFER_WORKERS', max(1, (os.cpu_count() or 1) // 4)))
+# 同时处理的请求数上限（包括正在等待推理线程的请求），超出的请求在事件循环中排队，不占用推理线程
+MAX_CONCURRENCY = int(os.getenv('CNOCR_MAX_CONCURRENCY', INFER_WORKERS * 4))
+# 是否把并发请求中的文本行合在一起识别（micro-batching），以及每批最多的文本行数和最长的等待时间
+REC_MICRO_BATCH = os.getenv('CNOCR_REC_MICRO_BATCH', '1') != '0'
+REC_MAX_BATCH_SIZE = int(os.getenv('CNOCR_REC_MAX_BATCH_SIZE', 64))
+REC_MAX_WAIT_MS = float(os.getenv('CNOCR_REC_MAX_WAIT_MS', 5))
+# 是否把并发请求的图片合在一起检测。检测时图片会被 resize 到相同的大小，默认关闭
+DET_MICRO_BATCH = os.getenv('CNOCR_DET_MICRO_BATCH', '0') != '0'
+DET_MAX_BATCH_SIZE = int(os.getenv('CNOCR_DET_MAX_BATCH_SIZE', 8))
+DET_MAX_WAIT_MS = float(os.getenv('CNOCR_DET_MAX_WAIT_MS', 5))
+# 最多同时被接受的请求数（包括排队中和处理中的），超出时直接返回 429
+MAX_PENDING = int(os.getenv('CNOCR_MAX_PENDING', MAX_CONCURRENCY * 4))
+# 请求没有 `X-Request-Deadline` header 时的默认超时时间（秒）；0 表示不限制。
+# 超时的请求在进入下一个阶段之前就被丢弃，并返回 503
+REQUEST_TIMEOUT = float(os.getenv('CNOCR_REQUEST_TIMEOUT', 0))
+# 请求类别及其权重，排在前面的优先级更高。调用方通过 `X-Request-Class` header 指定类别，
+# 未指定或未知的类别归为第一个类别。每个类别分别排队、分别限制并发数和排队数，
+# 推理线程和 micro-batcher 按权重从各个类别中取任务，所以批量请求不会堵住交互式请求
+LANE_WEIGHTS = parse_lane_weights(os.getenv('CNOCR_LANE_WEIGHTS'))
+# 识别结果缓存：重复提交的同一张图片直接返回缓存的结果。条目数为 0 表示不使用缓存；
+# `CNOCR_RESULT_CACHE_DISK=1` 时同时使用 `data_dir()` 下的 SQLite 磁盘缓存，可以在重启后和多个 worker 进程之间共用
+RESULT_CACHE_ENTRIES = int(os.getenv('CNOCR_RESULT_CACHE_ENTRIES', 1024))
+RESULT_CACHE_MB = float(os.getenv('CNOCR_RESULT_CACHE_MB', 64))
+RESULT_CACHE_DISK = os.getenv('CNOCR_RESULT_CACHE_DISK', '0') != '0'
+# 文本行级别的识别缓存：模板化文档中重复出现的文本行（表头、标签等）不再重复识别。条目数为 0 表示只在每批内部去重
+REC_CACHE_ENTRIES = int(os.getenv('CNOCR_REC_CACHE_ENTRIES', 4096))
+REC_CACHE_PERCEPTUAL = os.getenv('CNOCR_REC_CACHE_PERCEPTUAL', '0') != '0'
+# 备用识别模型（如 `ch_PP-OCRv4_server`）：得分低于阈值的文本行再用它识别；不指定时不使用
+FALLBACK_REC_MODEL_NAME = os.getenv('CNOCR_FALLBACK_REC_MODEL_NAME') or None
+FALLBACK_SCORE_THRESH = float(os.getenv('CNOCR_FALLBACK_SCORE_THRESH', 0.8))
+# 是否根据本机实测的识别速度自动选择 batch size，默认关闭。测量结果会被保存，之后直接读取；
+# 多个 worker 进程时请使用 `cnocr serve --auto-tune-batch-size`，在启动 worker 之前只测量一次
+AUTO_TUNE_BATCH_SIZE = os.getenv('CNOCR_AUTO_TUNE_BATCH_SIZE', '0') != '0'
+
+OCR_MODEL = CnOcr(
+    auto_tune_batch_size=AUTO_TUNE_BATCH_SIZE,
+    result_cache=ResultCache(
+        max_entries=RESULT_CACHE_ENTRIES,
+        max_bytes=int(RESULT_CACHE_MB * 1024 * 1024),
+        use_disk_cache=RESULT_CACHE_DISK,
+    )
+    if RESULT_CACHE_ENTRIES > 0
+    else None,
+    rec_cache=RecognitionCache(
+        max_entries=REC_CACHE_ENTRIES, perceptual=REC_CACHE_PERCEPTUAL
+    ),
+    fallback_rec_model_name=FALLBACK_REC_MODEL_NAME,
+    fallback_score_thresh=FALLBACK_SCORE_THRESH,
+)
+INFER_EXECUTOR = LaneExecutor(
+    INFER_WORKERS, LANE_WEIGHTS, thread_name_prefix='cnocr-infer'
+)
+_CONCURRENCY = {lane: asyncio.Semaphore(MAX_CONCURRENCY) for lane in LANE_WEIGHTS}
+ADMISSION = {lane: AdmissionController(MAX_PENDING) for lane in LANE_WEIGHTS}
+logger.info(
+    'inference workers: %d, max concurrency: %d, max pending: %d, lanes: %s'
+    % (INFER_WORKERS, MAX_CONCURRENCY, MAX_PENDING, dict(LANE_WEIGHTS))
+)
+
+
+def _detect_batch(imgs: List[np.ndarray]) -> List[Tuple[Any, List[np.ndarray]]]:
+    det_outs = OCR_MODEL.det_model.detect(imgs)
+    return [
+        (
+            det_out['detected_texts'],
+            [box_info['cropped_img'] for box_info in det_out['detected_texts']],
+        )
+        for det_out in det_outs
+    ]
+
+
+REC_BATCHER = (
+    MicroBatcher(
+        OCR_MODEL.ocr_for_single_lines,
+        max_batch_size=REC_MAX_BATCH_SIZE,
+        max_wait_ms=REC_MAX_WAIT_MS,
+        name='rec-batcher',
+        lane_weights=LANE_WEIGHTS,
+    )
+    if REC_MICRO_BATCH
+    else None
+)
+DET_BATCHER = (
+    MicroBatcher(
+        _detect_batch,
+        max_batch_size=DET_MAX_BATCH_SIZE,
+        max_wait_ms=DET_MAX_WAIT_MS,
+        name='det-batcher',
+        lane_weights=LANE_WEIGHTS,
+    )
+    if DET_MICRO_BATCH and OCR_MODEL.det_model is not None
+    else None
+)
 
 
 class OcrResponse(BaseModel):
     status_code: int = 200
     results: List[Dict[str, Any]]
 
-    def dict(self, **kwargs):
-        the_dict = deepcopy(super().dict())
-        return the_dict
+
+def _decode(data: bytes) -> np.ndarray:
+    return np.asarray(Image.open(BytesIO(data)).convert('RGB'))
+
+
+def _decode_and_lookup(
+    data: bytes, cand_alphabet: Optional[str] = None
+) -> Tuple[np.ndarray, Optional[str], Any]:
+    """解码图片并查找结果缓存，返回 (img, cache_key, cached_results)。"""
+    img = _decode(data)
+    cache_key, cached = OCR_MODEL.lookup_cache(img, cand_alphabet=cand_alphabet)
+    return img, cache_key, cached
+
+
+def _detect_img(
+    img: np.ndarray, deadline: Optional[float]
+) -> Tuple[Any, List[np.ndarray]]:
+    check_deadline(deadline, 'detection')
+    return OCR_MODEL.detect_lines(img)
+
+
+def _gen_records(ocr_outs, detected_texts, crops, cache_key) -> List[Dict[str, Any]]:
+    results = OCR_MODEL.gen_results(ocr_outs, detected_texts, crops)
+    OCR_MODEL.update_cache(cache_key, results)
+    # 紧凑格式的结果一次性把所有文本框的坐标转为 list，而不是逐个文本框调用 `tolist()`
+    return results.to_records()
+
+
+def _ocr_bytes(
+    data: bytes, deadline: Optional[float], cand_alphabet: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """在推理线程中运行：解码图片并识别；每个阶段开始前检查截止时间。"""
+    img, cache_key, cached = _decode_and_lookup(data, cand_alphabet)
+    if cached is not None:
+        return cached.to_records()
+    detected_texts, crops = _detect_img(img, deadline)
+    check_deadline(deadline, 'recognition')
+    ocr_outs = OCR_MODEL.ocr_for_single_lines(crops, cand_alphabet=cand_alphabet)
+    return _gen_records(ocr_outs, detected_texts, crops, cache_key)
+
+
+async def _wait_until(aw, deadline: Optional[float], stage: str):
+    """等待 `aw` 完成；截止时间先到时取消它（还没开始运行的推理任务会被直接丢弃）。"""
+    try:
+        return await asyncio.wait_for(aw, timeout=time_left(deadline))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded('deadline exceeded during %s' % stage)
+
+
+async def _acquire_until(sem: asyncio.Semaphore, deadline: Optional[float], stage: str):
+    """
+    等待获取 `sem` 的名额。截止时间先到（或请求被取消）时放弃等待；
+    如果此时名额已经（或随后才）被获取，会把它还回去，不会泄漏名额。
+    """
+    acquire = asyncio.ensure_future(sem.acquire())
+    try:
+        await _wait_until(asyncio.shield(acquire), deadline, stage)
+    except BaseException:
+
+        def _release_if_acquired(task):
+            if not task.cancelled() and task.exception() is None:
+                sem.release()
+
+        acquire.add_done_callback(_release_if_acquired)
+        acquire.cancel()
+        raise
+
+
+def _run_in_executor(lane: str, fn, *args):
+    """在推理线程中运行 `fn(*args)`；返回的 asyncio future 被取消时，还没开始运行的任务会被丢弃。"""
+    return asyncio.wrap_future(INFER_EXECUTOR.submit(fn, *args, lane=lane))
+
+
+async def _ocr_micro_batched(
+    data: bytes, lane: str, deadline: Optional[float]
+) -> List[Dict[str, Any]]:
+    """检测（可选）和识别分别交给 micro-batcher，与其他并发请求合在一起运行。"""
+    img, cache_key, cached = await _wait_until(
+        _run_in_executor(lane, _decode_and_lookup, data), deadline, 'decoding'
+    )
+    if cached is not None:
+        return cached.to_records()
+    if DET_BATCHER is not None:
+        check_deadline(deadline, 'detection')
+        (detected_texts, crops), = await _wait_until(
+            asyncio.wrap_future(DET_BATCHER.submit([img], lane, deadline)),
+            deadline,
+            'detection',
+        )
+    else:
+        detected_texts, crops = await _wait_until(
+            _run_in_executor(lane, _detect_img, img, deadline),
+            deadline,
+            'detection',
+        )
+    check_deadline(deadline, 'recognition')
+    ocr_outs = await _wait_until(
+        asyncio.wrap_future(REC_BATCHER.submit(crops, lane, deadline)),
+        deadline,
+        'recognition',
+    )
+    # 生成结果和写入缓存（可能包括 SQLite 的写入和提交）也在推理线程中进行，不阻塞事件循环
+    return await _run_in_executor(
+        lane, _gen_records, ocr_outs, detected_texts, crops, cache_key
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    for batcher in (REC_BATCHER, DET_BATCHER):
+        if batcher is not None:
+            batcher.close()
+    INFER_EXECUTOR.shutdown(wait=False)
+    if OCR_MODEL.result_cache is not None:
+        OCR_MODEL.result_cache.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/")
@@ -47,14 +271,64 @@ async def root():
     return {"message": "Welcome to CnOCR Server!"}
 
 
+@app.get("/stats")
+async def stats():
+    """各个类别的准入情况，以及推理线程和 micro-batcher 中各个类别的排队情况。"""
+    res = {
+        'admission': {lane: admission.stats() for lane, admission in ADMISSION.items()},
+        'executor': INFER_EXECUTOR.stats(),
+    }
+    for name, batcher in (('rec_batcher', REC_BATCHER), ('det_batcher', DET_BATCHER)):
+        if batcher is not None:
+            res[name] = batcher.stats()
+    if OCR_MODEL.result_cache is not None:
+        res['result_cache'] = OCR_MODEL.result_cache.stats()
+    res['rec_cache'] = OCR_MODEL.rec_cache.stats()
+    if OCR_MODEL.rec_cascade is not None:
+        res['rec_cascade'] = OCR_MODEL.rec_cascade.stats()
+    return res
+
+
 @app.post("/ocr")
-async def ocr(image: UploadFile) -> Dict[str, Any]:
-    image = image.file
-    image = Image.open(image).convert('RGB')
-    res = OCR_MODEL.ocr(image)
-    for _one in res:
-        _one['position'] = _one['position'].tolist()
-        if 'cropped_img' in _one:
-            _one.pop('cropped_img')
-
-    return OcrResponse(results=res).dict()
+async def ocr(
+    image: UploadFile, request: Request, cand_alphabet: Optional[str] = Form(None)
+) -> OcrResponse:
+    """
+    识别上传的图片。可选的表单字段 `cand_alphabet` 指定只对本次请求生效的候选字符集合，
+    如 `0123456789`；指定了此字段的请求不与其他请求合批识别。
+    """
+    deadline = parse_deadline(request.headers.get(DEADLINE_HEADER), REQUEST_TIMEOUT)
+    lane = INFER_EXECUTOR.resolve(request.headers.get(LANE_HEADER))
+    admission = ADMISSION[lane]
+    if not admission.try_enter():
+        raise HTTPException(
+            status_code=429,
+            detail='too many pending requests',
+            headers={'Retry-After': '1'},
+        )
+    try:
+        # 异步读取上传的文件，图片解码和推理都在推理线程中进行，不阻塞事件循环
+        data = await image.read()
+        await _acquire_until(_CONCURRENCY[lane], deadline, 'waiting')
+        try:
+            if REC_BATCHER is not None and not cand_alphabet:
+                res = await _ocr_micro_batched(data, lane, deadline)
+            else:
+                res = await _wait_until(
+                    _run_in_executor(
+                        lane, _ocr_bytes, data, deadline, cand_alphabet or None
+                    ),
+                    deadline,
+                    'ocr',
+                )
+        finally:
+            _CONCURRENCY[lane].release()
+    except DeadlineExceeded as e:
+        # 调用方已经不再等待，丢弃剩下的工作
+        admission.record_expired()
+        logger.info('drop %s request: %s' % (lane, e))
+        raise HTTPException(status_code=503, detail=str(e))
+    finally:
+        admission.exit()
+
+    return OcrResponse(results=res)
@@ -23,8 +23,10 @@ import os
 from pathlib import Path
 import logging
 import platform
+import threading
+from collections import OrderedDict
 import requests
-from typing import Union, Any, Tuple, List, Optional, Dict
+from typing import Union, Any, Tuple, List, Optional, Dict, Sequence
 
 from tqdm import tqdm
 from PIL import Image, ImageOps
@@ -41,6 +43,7 @@ from .consts import (
     DECODER_CONFIGS,
     AVAILABLE_MODELS,
     IMG_STANDARD_HEIGHT,
+    split_quantized_model_name,
 )
 
 fmt = '[%(levelname)s %(asctime)s %(funcName)s:%(lineno)d] %(' 'message)s '
@@ -103,6 +106,7 @@ def data_dir():
 
 
 def check_model_name(model_name):
+    model_name, _ = split_quantized_model_name(model_name)
     encoder_type, decoder_type = model_name.split('-')[-2:]
     assert encoder_type in ENCODER_CONFIGS
     assert decoder_type in DECODER_CONFIGS
@@ -126,6 +130,131 @@ def get_default_ort_providers():
     return providers
 
 
+# 创建 `onnxruntime.InferenceSession` 时使用的默认配置，参考 `create_ort_session()`
+DEFAULT_ORT_SESSION_OPTIONS = {
+    'graph_optimization_level': 'all',  # 'disable', 'basic', 'extended', 'all'
+    'intra_op_num_threads': 0,  # 0 表示由 onnxruntime 自己决定
+    'inter_op_num_threads': 0,
+    'execution_mode': 'sequential',  # 'sequential', 'parallel'
+    'cache_optimized_model': True,
+}
+
+
+def _file_hash(fp, chunk_size=1048576) -> str:
+    sha1 = hashlib.sha1()
+    with open(fp, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            sha1.update(data)
+    return sha1.hexdigest()
+
+
+def create_ort_session(
+    model_fp: Union[str, Path],
+    ort_providers: Optional[List[str]] = None,
+    ort_session_options: Optional[Dict[str, Any]] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+):
+    """
+    使用显式的 `SessionOptions` 创建 `onnxruntime.InferenceSession`。
+    第一次加载模型时，把优化后的图存入 `cache_dir`，文件名由模型内容的 hash、onnxruntime 版本、
+    优化级别、providers 和机器架构共同决定；以后再加载同一个模型时直接使用优化后的图，省去大部分图优化的时间。
+
+    :param model_fp: ONNX 模型文件路径
+    :param ort_providers: onnxruntime 使用的 providers；取值为 `None` 时使用 `get_default_ort_providers()`
+    :param ort_session_options: 覆盖 `DEFAULT_ORT_SESSION_OPTIONS` 中的取值
+    :param cache_dir: 优化后模型的存储目录；取值为 `None` 时使用 `data_dir()/ort-cache`
+    :return: `onnxruntime.InferenceSession`
+    """
+    import onnxruntime as ort
+
+    if ort_providers is None:
+        ort_providers = get_default_ort_providers()
+    logger.debug(f'ort providers: {ort_providers}')
+
+    options = DEFAULT_ORT_SESSION_OPTIONS.copy()
+    options.update(ort_session_options or {})
+    opt_levels = {
+        'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    exec_modes = {
+        'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+        'parallel': ort.ExecutionMode.ORT_PARALLEL,
+    }
+
+    def _gen_sess_options(opt_level):
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = opt_levels[opt_level]
+        sess_options.intra_op_num_threads = options['intra_op_num_threads']
+        sess_options.inter_op_num_threads = options['inter_op_num_threads']
+        sess_options.execution_mode = exec_modes[options['execution_mode']]
+        return sess_options
+
+    opt_level = options['graph_optimization_level']
+    if not options['cache_optimized_model'] or opt_level == 'disable':
+        return ort.InferenceSession(
+            str(model_fp),
+            sess_options=_gen_sess_options(opt_level),
+            providers=ort_providers,
+        )
+
+    cache_dir = cache_dir or os.path.join(data_dir(), 'ort-cache')
+    # 'all' 级别中的 layout 优化（如 NCHWc）与 CPU 指令集相关，序列化后不能跨机器使用。
+    # 所以缓存里只存 'extended' 级别的优化结果，'all' 级别剩下的优化在加载时再做（很快）
+    cache_level = 'extended' if opt_level == 'all' else opt_level
+    env_key = hashlib.sha1(
+        '|'.join(
+            [ort.__version__, cache_level, platform.machine()]
+            + [str(provider) for provider in ort_providers]
+        ).encode('utf-8')
+    ).hexdigest()[:8]
+    cached_fp = os.path.join(
+        cache_dir,
+        '%s-%s-ort%s.onnx' % (_file_hash(model_fp)[:16], env_key, ort.__version__),
+    )
+    if not os.path.isfile(cached_fp):
+        tmp_fp = '%s.%d.tmp' % (cached_fp, os.getpid())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            sess_options = _gen_sess_options(cache_level)
+            sess_options.optimized_model_filepath = tmp_fp
+            ort.InferenceSession(
+                str(model_fp), sess_options=sess_options, providers=ort_providers
+            )
+            # 先写入临时文件，避免其他进程读到写了一半的模型
+            os.replace(tmp_fp, cached_fp)
+            logger.info('optimized model is cached to %s' % cached_fp)
+        except Exception as e:
+            logger.warning(
+                'failed to cache the optimized model of %s: %s' % (model_fp, e)
+            )
+            if os.path.isfile(tmp_fp):
+                os.remove(tmp_fp)
+
+    if os.path.isfile(cached_fp):
+        try:
+            sess = ort.InferenceSession(
+                cached_fp,
+                sess_options=_gen_sess_options(opt_level),
+                providers=ort_providers,
+            )
+            logger.info('use cached optimized model: %s' % cached_fp)
+            return sess
+        except Exception as e:
+            logger.warning('failed to load cached model %s: %s' % (cached_fp, e))
+
+    return ort.InferenceSession(
+        str(model_fp),
+        sess_options=_gen_sess_options(opt_level),
+        providers=ort_providers,
+    )
+
+
 def to_numpy(tensor: torch.Tensor) -> np.ndarray:
     return (
         tensor.detach().cpu().numpy() if tensor.requires_grad else tensor.cpu().numpy()
@@ -312,8 +441,7 @@ def resize_img(
     """
     ori_height, ori_width = img.shape[1:]
     if target_h_w is None:
-        ratio = ori_height / IMG_STANDARD_HEIGHT
-        target_w = max(int(ori_width / ratio), min_width)
+        target_w = get_resized_width(ori_height, ori_width, min_width=min_width)
         target_h_w = (IMG_STANDARD_HEIGHT, target_w)
 
     if (ori_height, ori_width) != target_h_w:
@@ -327,6 +455,92 @@ def resize_img(
     return img
 
 
+def get_resized_width(
+    ori_height: int,
+    ori_width: int,
+    target_height: int = IMG_STANDARD_HEIGHT,
+    min_width: int = 8,
+) -> int:
+    """
+    计算图片在保持高宽比的情况下，resize 到高度 `target_height` 后的宽度
+    :param ori_height: 原始高度
+    :param ori_width: 原始宽度
+    :param target_height: resize 后的高度
+    :param min_width: resize 后的最小宽度
+    :return: resize 后的宽度
+    """
+    ratio = ori_height / target_height
+    return max(int(ori_width / ratio), min_width)
+
+
+def resize_img_batch(
+    img_list: List[np.ndarray],
+    widths: Sequence[int],
+    out: np.ndarray,
+    pad_value: float = 0.0,
+) -> np.ndarray:
+    """
+    把一组图片分别 resize 后直接写入同一个 batch 数组中，每张图片右侧用 `pad_value` 补齐
+    :param img_list: 每个元素的 shape 为 [H, W, C]，取值范围 [0, 255]
+    :param widths: 每张图片 resize 后的宽度；高度统一为 `out` 的高度
+    :param out: 写入结果的数组，shape 为 [B, C, height, W_max]
+    :param pad_value: 右侧填充值
+    :return: `out`
+    """
+    height, max_width = out.shape[2:]
+    for idx, (img, width) in enumerate(zip(img_list, widths)):
+        if img.shape[:2] != (height, width):
+            img = cv2.resize(img, (width, height))  # -> (H, W, C) or (H, W)
+        if img.ndim == 2:
+            img = np.expand_dims(img, axis=-1)
+        out[idx, :, :, :width] = img.transpose((2, 0, 1))
+        if width < max_width:
+            out[idx, :, :, width:] = pad_value
+    return out
+
+
+class ImageBatchBuffer(object):
+    """
+    可复用的图片 batch 缓冲区。
+    每个线程持有各自的一块连续内存，只在需要更大的空间时才重新分配，
+    所以返回的数组只在下一次调用 `take()` 之前有效。
+    """
+
+    def __init__(self, dtype='float32'):
+        self.dtype = np.dtype(dtype)
+        self._local = threading.local()
+
+    def take(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        :param shape: 需要的数组形状，如 [B, C, H, W]
+        :return: 指定形状的连续数组（未初始化）
+        """
+        size = int(np.prod(shape))
+        storage = getattr(self._local, 'storage', None)
+        if storage is None or storage.size < size:
+            storage = np.empty((size,), dtype=self.dtype)
+            self._local.storage = storage
+        return storage[:size].reshape(shape)
+
+
+def normalize_img_batch(
+    imgs: np.ndarray, mean: float = 0.0, std: float = 1.0
+) -> np.ndarray:
+    """
+    原地（in-place）归一化一个 batch 的图片：`(imgs / 255 - mean) / std`
+    :param imgs: float 类型的数组，取值范围 [0, 255]
+    :param mean: 均值
+    :param std: 标准差
+    :return: `imgs`
+    """
+    imgs /= 255.0
+    if mean != 0.0:
+        imgs -= mean
+    if std != 1.0:
+        imgs /= std
+    return imgs
+
+
 def normalize_img_array(img: Union[Tensor, np.ndarray]):
     """ rescale """
     if isinstance(img, Tensor):
@@ -383,9 +597,118 @@ def get_model_size(model, only_trainable=False):
     return sum(p.numel() for p in model.parameters())
 
 
+def gen_candidates_mask(
+    candidates: Optional[Union[str, List[str]]],
+    letter2id: Dict[str, int],
+    num_classes: int,
+    ignored_tokens: List[int],
+) -> np.ndarray:
+    """
+    生成候选字符对应的 mask。
+    :param candidates: 候选字符；取值为 `None` 时表示不限定字符范围
+    :param letter2id: 字符到索引的映射
+    :param num_classes: 模型输出的类别数
+    :param ignored_tokens: 必须保留的特殊字符索引，如 CTC 的 blank
+    :return: bool 数组，shape 为 [num_classes]
+    """
+    if candidates is None:
+        return np.ones((num_classes,), dtype=bool)
+
+    mask = np.zeros((num_classes,), dtype=bool)
+    mask[[letter2id[word] for word in candidates]] = True
+    mask[ignored_tokens] = True
+    return mask
+
+
+class CandidateMask(object):
+    """
+    编译好的候选字符集合：`mask` 为 shape [num_classes] 的 bool 数组；
+    `index` 为允许的类别索引（包含 blank 等必须保留的特殊字符），从小到大排列。
+    解码时只需取出 `index` 对应的列，而不用屏蔽整个词表。
+    """
+
+    __slots__ = ('candidates', 'mask', 'index')
+
+    def __init__(self, candidates: List[str], mask: np.ndarray):
+        self.candidates = candidates
+        self.mask = mask
+        self.index = np.flatnonzero(mask)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class CandidateMaskCache(object):
+    """
+    按候选字符集合缓存编译好的 `CandidateMask`（LRU），同一个集合只编译一次。线程安全。
+    """
+
+    def __init__(
+        self,
+        letter2id: Dict[str, int],
+        num_classes: int,
+        ignored_tokens: List[int],
+        max_size: int = 32,
+    ):
+        """
+        :param letter2id: 字符到索引的映射
+        :param num_classes: 模型输出的类别数
+        :param ignored_tokens: 必须保留的特殊字符索引，如 CTC 的 blank
+        :param max_size: 最多缓存多少个候选字符集合
+        """
+        self.letter2id = letter2id
+        self.num_classes = num_classes
+        self.ignored_tokens = ignored_tokens
+        self.max_size = max(1, max_size)
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cand_alphabet) -> Optional[CandidateMask]:
+        """
+        :param cand_alphabet: 候选字符集合（字符串，或字符的集合）；取值为 `None` 时表示不限定字符范围
+        :return: 编译好的 `CandidateMask`；不限定字符范围，或候选字符都不在词表中时返回 `None`
+        """
+        if cand_alphabet is None or isinstance(cand_alphabet, CandidateMask):
+            return cand_alphabet
+        key = (
+            cand_alphabet
+            if isinstance(cand_alphabet, str)
+            else tuple(sorted(cand_alphabet))
+        )
+        with self._lock:
+            if key in self._masks:
+                self._masks.move_to_end(key)
+                return self._masks[key]
+
+        cand_mask = self._compile(cand_alphabet)
+        with self._lock:
+            self._masks[key] = cand_mask
+            while len(self._masks) > self.max_size:
+                self._masks.popitem(last=False)
+        return cand_mask
+
+    def _compile(self, cand_alphabet) -> Optional[CandidateMask]:
+        cand_alphabet = [word if word != ' ' else '<space>' for word in cand_alphabet]
+        excluded = set([word for word in cand_alphabet if word not in self.letter2id])
+        if excluded:
+            logger.warning(
+                'chars in candidates are not in the vocab, ignoring them: %s' % excluded
+            )
+        candidates = sorted(
+            set(word for word in cand_alphabet if word in self.letter2id)
+        )
+        if len(candidates) == 0:
+            return None
+        logger.debug('candidate chars: %s' % candidates)
+        mask = gen_candidates_mask(
+            candidates, self.letter2id, self.num_classes, self.ignored_tokens
+        )
+        return CandidateMask(candidates, mask)
+
+
 def mask_by_candidates(
     logits: np.ndarray,
-    candidates: Optional[Union[str, List[str]]],
+    candidates: Optional[Union[str, List[str], CandidateMask]],
     vocab: List[str],
     letter2id: Dict[str, int],
     ignored_tokens: List[int],
@@ -393,20 +716,17 @@ def mask_by_candidates(
     if candidates is None:
         return logits
 
-    _candidates = [letter2id[word] for word in candidates]
-    _candidates.sort()
-    _candidates = np.array(_candidates, dtype=int)
-
-    candidates = np.zeros((len(vocab),), dtype=bool)
-    candidates[_candidates] = True
-    # candidates[-1] = True  # for cnocr, 间隔符号/填充符号，必须为真
-    candidates[ignored_tokens] = True
-    candidates = np.expand_dims(candidates, axis=(0, 1))  # 1 x 1 x (vocab_size+1)
-    candidates = candidates.repeat(logits.shape[1], axis=1)
-
-    masked = np.ma.masked_array(data=logits, mask=~candidates, fill_value=-100.0)
-    logits = masked.filled()
-    return logits
+    if isinstance(candidates, CandidateMask):
+        candidates = candidates.mask
+    else:
+        candidates = gen_candidates_mask(
+            candidates, letter2id, logits.shape[-1], ignored_tokens
+        )
+    # for cnocr, 间隔符号/填充符号，必须为真；由 `ignored_tokens` 指定
+    # 1 x 1 x (vocab_size+1), broadcast over the batch and time axes
+    candidates = np.expand_dims(candidates, axis=(0, 1))
+
+    return np.where(candidates, logits, logits.dtype.type(-100.0))
 
 
 def draw_ocr_results(image_fp: Union[str, Path, Image.Image], ocr_outs, out_draw_fp, font_path):
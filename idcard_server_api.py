@@ -5,10 +5,22 @@ import os
 import base64
 import io
 import re
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Dict, Any, Tuple
+import numpy as np
 from PIL import Image
 from flask import Flask, request, jsonify
 
+from cnocr.admission import (
+    DEADLINE_HEADER,
+    AdmissionController,
+    DeadlineExceeded,
+    check_deadline,
+    parse_deadline,
+    time_left,
+)
+from cnocr.lanes import LANE_HEADER, LaneExecutor, parse_lane_weights
+
 # 禁用代理，避免网络连接问题
 os.environ['no_proxy'] = '*'
 if 'HTTP_PROXY' in os.environ:
@@ -21,12 +33,30 @@ app = Flask(__name__)
 # 初始化 OCR 模型（仅初始化一次，以提高性能）
 ocr_model = None
 
+# 最多同时被接受的请求数（排队中和处理中），超出时直接返回 429，而不是无限制地排队
+MAX_PENDING = int(os.getenv('IDCARD_MAX_PENDING', 8))
+# 同时做 OCR 的请求数；每次推理本身已经会用到多个 CPU 核
+MAX_RUNNING = int(os.getenv('IDCARD_MAX_RUNNING', 1))
+# 请求没有 `X-Request-Deadline` header 时的默认超时时间（秒）；0 表示不限制
+REQUEST_TIMEOUT = float(os.getenv('IDCARD_REQUEST_TIMEOUT', 0))
+# 请求类别及其权重（通过 `X-Request-Class` header 指定，默认为第一个类别）。
+# 每个类别分别限制排队数；检测和识别作为两个任务按权重调度，交互式请求可以插在批量请求的两个阶段之间
+LANE_WEIGHTS = parse_lane_weights(os.getenv('IDCARD_LANE_WEIGHTS'))
+admission = {lane: AdmissionController(MAX_PENDING) for lane in LANE_WEIGHTS}
+ocr_executor = LaneExecutor(MAX_RUNNING, LANE_WEIGHTS, thread_name_prefix='idcard-ocr')
+# 识别结果缓存，用于重试和重复提交的同一张图片；条目数为 0 表示不使用缓存，
+# `IDCARD_RESULT_CACHE_DISK=1` 时同时使用 SQLite 磁盘缓存
+RESULT_CACHE_ENTRIES = int(os.getenv('IDCARD_RESULT_CACHE_ENTRIES', 256))
+RESULT_CACHE_DISK = os.getenv('IDCARD_RESULT_CACHE_DISK', '0') != '0'
+# 文本行级别的识别缓存（身份证上的“姓名”“性别”等标签每次都相同）；条目数为 0 表示只在每张图片内部去重
+REC_CACHE_ENTRIES = int(os.getenv('IDCARD_REC_CACHE_ENTRIES', 1024))
+
 def get_ocr_model():
     """获取或初始化 OCR 模型"""
     global ocr_model
     if ocr_model is None:
         try:
-            from cnocr import CnOcr
+            from cnocr import CnOcr, RecognitionCache, ResultCache
             # 使用本地 ch_PP-OCRv3 模型，精度最高
             # 指定本地识别模型路径
             rec_model_fp = os.path.join(os.path.dirname(__file__), 'models', 'ch_PP-OCRv3_rec_infer.onnx')
@@ -34,7 +64,11 @@ def get_ocr_model():
                 rec_model_name='ch_PP-OCRv3',
                 rec_model_backend='onnx',
                 rec_model_fp=rec_model_fp,
-                det_model_name='ch_PP-OCRv3_det'
+                det_model_name='ch_PP-OCRv3_det',
+                result_cache=ResultCache(
+                    max_entries=RESULT_CACHE_ENTRIES, use_disk_cache=RESULT_CACHE_DISK
+                ) if RESULT_CACHE_ENTRIES > 0 else None,
+                rec_cache=RecognitionCache(max_entries=REC_CACHE_ENTRIES)
             )
         except ImportError as e:
             raise ImportError(
@@ -49,6 +83,35 @@ def get_ocr_model():
             )
     return ocr_model
 
+def _run_stage(lane, deadline, stage, fn, *args):
+    """在 OCR 线程中运行一个阶段；截止时间先到时取消任务（还没开始运行的任务会被直接丢弃）"""
+    def _run():
+        check_deadline(deadline, stage)
+        return fn(*args)
+
+    future = ocr_executor.submit(_run, lane=lane)
+    left = time_left(deadline)
+    try:
+        return future.result(timeout=None if left is None else max(left, 0))
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceeded('deadline exceeded during %s' % stage)
+
+def run_ocr(ocr, img, lane, deadline) -> list:
+    """
+    依次检测和识别，每个阶段开始前检查截止时间，调用方已经放弃的请求不再继续计算；
+    重复提交的图片直接使用缓存的结果
+    """
+    img = np.asarray(img)
+    cache_key, cached = ocr.lookup_cache(img)
+    if cached is not None:
+        return cached.to_dicts()
+    detected_texts, crops = _run_stage(lane, deadline, 'detection', ocr.detect_lines, img)
+    ocr_outs = _run_stage(lane, deadline, 'recognition', ocr.ocr_for_single_lines, crops)
+    results = ocr.gen_results(ocr_outs, detected_texts, crops)
+    ocr.update_cache(cache_key, results)
+    return results.to_dicts()
+
 def extract_name_and_id(ocr_results: list) -> Dict[str, Any]:
     """
     从 OCR 识别结果中提取姓名、身份证号、住址等信息
@@ -174,7 +237,25 @@ def recognize_id_card() -> Dict[str, Any]:
         },
         "message": "识别成功" / "错误信息"
     }
+
+    请求可以带 `X-Request-Deadline` header（Unix 时间戳，秒）：截止时间已过的请求在 OCR 的各个阶段之前
+    就会被丢弃，并返回 503；排队的请求过多时返回 429。
+    请求可以带 `X-Request-Class` header（如 `interactive` 或 `bulk`）指定类别，不同类别分别排队、按权重调度。
     """
+    deadline = parse_deadline(request.headers.get(DEADLINE_HEADER), REQUEST_TIMEOUT)
+    lane = ocr_executor.resolve(request.headers.get(LANE_HEADER))
+    if not admission[lane].try_enter():
+        return jsonify({
+            'success': False,
+            'data': None,
+            'message': '服务繁忙，请稍后重试'
+        }), 429, {'Retry-After': '1'}
+    try:
+        return _recognize_id_card(lane, deadline)
+    finally:
+        admission[lane].exit()
+
+def _recognize_id_card(lane, deadline) -> Dict[str, Any]:
     try:
         img = None
         
@@ -228,7 +309,15 @@ def recognize_id_card() -> Dict[str, Any]:
                 'message': str(e)
             }), 500
         
-        ocr_results = ocr.ocr(img)
+        try:
+            ocr_results = run_ocr(ocr, img, lane, deadline)
+        except DeadlineExceeded as e:
+            admission[lane].record_expired()
+            return jsonify({
+                'success': False,
+                'data': None,
+                'message': f'请求已超时，已放弃识别: {str(e)}'
+            }), 503
         
         if not ocr_results:
             return jsonify({
@@ -274,7 +363,12 @@ def health_check() -> Dict[str, Any]:
     """健康检查接口"""
     return jsonify({
         'status': 'healthy',
-        'message': '身份证识别 API 服务运行正常'
+        'message': '身份证识别 API 服务运行正常',
+        'admission': {lane: ctrl.stats() for lane, ctrl in admission.items()},
+        'lanes': ocr_executor.stats(),
+        'result_cache': None if ocr_model is None or ocr_model.result_cache is None
+        else ocr_model.result_cache.stats(),
+        'rec_cache': None if ocr_model is None else ocr_model.rec_cache.stats()
     }), 200
 
 if __name__ == '__main__':
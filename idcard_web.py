@@ -4,11 +4,14 @@
 from flask import Flask, request, jsonify
 import requests
 import json
+import time
 
 app = Flask(__name__)
 
 # 后端 API 地址
 BACKEND_API = 'http://localhost:5000/api/id_card/recognize'
+# 等待后端 API 的最长时间（秒）；同时通过 `X-Request-Deadline` header 告诉后端，超时后不必再继续识别
+BACKEND_TIMEOUT = 30
 
 # HTML 页面内容
 HTML_CONTENT = '''<!DOCTYPE html>
@@ -570,7 +573,10 @@ def recognize():
         
         # 将文件转发到后端 API
         files = {'image': file}
-        response = requests.post(BACKEND_API, files=files, timeout=30)
+        headers = {'X-Request-Deadline': '%.3f' % (time.time() + BACKEND_TIMEOUT)}
+        response = requests.post(
+            BACKEND_API, files=files, headers=headers, timeout=BACKEND_TIMEOUT
+        )
         
         return jsonify(response.json()), response.status_code
     
@@ -0,0 +1,75 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 测试中共用的 fixture。
+
+import threading
+
+import pytest
+
+# 等待 future 的最长时间，避免测试失败时一直挂起
+RESULT_TIMEOUT = 5
+
+
+class Gate(object):
+    """`block()` 之后，调用 `wait()` 的线程会一直阻塞到 `release()` 被调用。"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self._open = threading.Event()
+        self._open.set()
+
+    def block(self):
+        self.started.clear()
+        self._open.clear()
+
+    def release(self):
+        self._open.set()
+
+    def wait(self):
+        self.started.set()
+        assert self._open.wait(RESULT_TIMEOUT)
+
+
+@pytest.fixture
+def result_timeout():
+    return RESULT_TIMEOUT
+
+
+@pytest.fixture
+def gate():
+    gate = Gate()
+    yield gate
+    gate.release()  # 测试失败时也不让后台线程一直阻塞
+
+
+@pytest.fixture
+def start_blocked(gate):
+    """
+    返回 `start_blocked(submit, *args, **kwargs)`：调用 `submit` 提交一个会阻塞后台线程的任务，
+    等它开始运行后返回其 future。之后提交的任务都会在队列中等待，直到 `gate.release()` 被调用。
+    被提交的任务需要调用 `gate.wait()`。
+    """
+
+    def _start_blocked(submit, *args, **kwargs):
+        gate.block()
+        future = submit(*args, **kwargs)
+        assert gate.started.wait(RESULT_TIMEOUT)
+        return future
+
+    return _start_blocked
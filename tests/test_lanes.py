@@ -0,0 +1,102 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 测试按类别排队的 LaneQueues 和 LaneExecutor。
+
+from collections import Counter
+
+import pytest
+
+from cnocr.lanes import LaneExecutor, LaneQueues
+
+
+def test_pick_lane_follows_weights():
+    queues = LaneQueues({'interactive': 8, 'bulk': 1})
+    for idx in range(100):
+        queues.put('interactive', idx)
+        queues.put('bulk', idx)
+
+    picks = Counter()
+    for _ in range(90):
+        lane = queues.pick_lane()
+        queues.pop(lane)
+        picks[lane] += 1
+    assert picks == {'interactive': 80, 'bulk': 10}
+
+
+def test_unknown_lane_falls_back_to_first_lane():
+    queues = LaneQueues({'interactive': 8, 'bulk': 1})
+    assert queues.put('unknown', 'x') == 'interactive'
+    assert queues.put(None, 'y') == 'interactive'
+    assert queues.size('interactive') == 2
+
+
+def test_interactive_task_runs_ahead_of_bulk_queue(start_blocked, gate, result_timeout):
+    executor = LaneExecutor(1, {'interactive': 8, 'bulk': 1})
+    order = []
+    try:
+        blocker = start_blocked(executor.submit, gate.wait, lane='bulk')
+        bulk_futures = [
+            executor.submit(order.append, 'bulk-%d' % i, lane='bulk') for i in range(20)
+        ]
+        interactive = executor.submit(order.append, 'interactive', lane='interactive')
+        gate.release()
+
+        interactive.result(timeout=result_timeout)
+        for future in [blocker] + bulk_futures:
+            future.result(timeout=result_timeout)
+    finally:
+        executor.shutdown()
+
+    assert order == ['interactive'] + ['bulk-%d' % i for i in range(20)]
+
+
+def test_cancelled_task_is_dropped(start_blocked, gate, result_timeout):
+    executor = LaneExecutor(1)
+    calls = []
+    try:
+        blocker = start_blocked(executor.submit, gate.wait)
+        cancelled = executor.submit(calls.append, 'cancelled')
+        alive = executor.submit(calls.append, 'alive')
+        assert cancelled.cancel()
+        gate.release()
+
+        alive.result(timeout=result_timeout)
+        blocker.result(timeout=result_timeout)
+    finally:
+        executor.shutdown()
+
+    assert cancelled.cancelled()
+    assert calls == ['alive']
+
+
+def test_task_error_is_set_on_future(result_timeout):
+    executor = LaneExecutor(1)
+    try:
+        future = executor.submit(int, 'not a number')
+        with pytest.raises(ValueError):
+            future.result(timeout=result_timeout)
+    finally:
+        executor.shutdown()
+
+
+def test_submit_after_shutdown_raises():
+    executor = LaneExecutor(1)
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(int, '1')
@@ -0,0 +1,175 @@
+# coding: utf-8
+# Copyright (C) 2025, [Breezedeus](https://github.com/breezedeus).
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# 用假的 `batch_fn` 测试 MicroBatcher 的拆分、类别调度和截止时间处理。
+
+import time
+
+import pytest
+
+from cnocr.admission import DeadlineExceeded
+from cnocr.micro_batch import MicroBatcher
+
+
+class FakeBatchFn(object):
+    """记录每一批的元素；`gate.block()` 之后，下一批会一直阻塞到 `gate.release()` 被调用。"""
+
+    def __init__(self, gate):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.gate.wait()
+        return [('out', item) for item in items]
+
+
+@pytest.fixture
+def batch_fn(gate):
+    return FakeBatchFn(gate)
+
+
+def test_large_request_is_split_and_reassembled(batch_fn, result_timeout):
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=0)
+    items = list(range(10))
+    try:
+        outs = batcher.submit(items).result(timeout=result_timeout)
+    finally:
+        batcher.close()
+
+    assert outs == [('out', item) for item in items]
+    assert all(len(batch) <= 4 for batch in batch_fn.batches)
+    assert [item for batch in batch_fn.batches for item in batch] == items
+    assert batcher.stats()['num_items'] == 10
+
+
+def test_concurrent_requests_get_their_own_results(
+    batch_fn, start_blocked, gate, result_timeout
+):
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=0)
+    try:
+        blocker = start_blocked(batcher.submit, ['blocker'], lane='bulk')
+        futures = [batcher.submit(['%d-%d' % (i, j) for j in range(i + 1)]) for i in range(4)]
+        gate.release()
+        blocker.result(timeout=result_timeout)
+        for i, future in enumerate(futures):
+            expected = [('out', '%d-%d' % (i, j)) for j in range(i + 1)]
+            assert future.result(timeout=result_timeout) == expected
+    finally:
+        batcher.close()
+
+
+def test_interactive_lane_is_scheduled_ahead_of_bulk_queue(
+    batch_fn, start_blocked, gate, result_timeout
+):
+    batcher = MicroBatcher(batch_fn, max_batch_size=1, max_wait_ms=0)
+    try:
+        blocker = start_blocked(batcher.submit, ['blocker'], lane='bulk')
+        bulk_futures = [batcher.submit(['bulk-%d' % i], lane='bulk') for i in range(20)]
+        interactive = batcher.submit(['interactive'], lane='interactive')
+        gate.release()
+
+        assert interactive.result(timeout=result_timeout) == [('out', 'interactive')]
+        for future in [blocker] + bulk_futures:
+            future.result(timeout=result_timeout)
+    finally:
+        batcher.close()
+
+    order = [batch[0] for batch in batch_fn.batches]
+    assert order[0] == 'blocker'
+    assert order[1] == 'interactive'
+    assert order[2:] == ['bulk-%d' % i for i in range(20)]
+
+
+def test_expired_request_fails_with_deadline_exceeded(
+    batch_fn, start_blocked, gate, result_timeout
+):
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=0)
+    try:
+        blocker = start_blocked(batcher.submit, ['blocker'], lane='bulk')
+        expired = batcher.submit(['late'], deadline=time.time() + 0.05)
+        alive = batcher.submit(['alive'])
+        time.sleep(0.1)
+        gate.release()
+
+        with pytest.raises(DeadlineExceeded):
+            expired.result(timeout=result_timeout)
+        assert alive.result(timeout=result_timeout) == [('out', 'alive')]
+        blocker.result(timeout=result_timeout)
+    finally:
+        batcher.close()
+
+    assert 'late' not in [item for batch in batch_fn.batches for item in batch]
+
+
+def test_request_expiring_between_chunks_does_not_hang(batch_fn, gate, result_timeout):
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=0)
+    try:
+        gate.block()
+        future = batcher.submit(list(range(6)), deadline=time.time() + 0.05)
+        assert gate.started.wait(result_timeout)
+        # 第一批还在处理时截止时间已过，剩下的元素不再处理
+        time.sleep(0.1)
+        gate.release()
+
+        with pytest.raises(DeadlineExceeded):
+            future.result(timeout=result_timeout)
+    finally:
+        batcher.close()
+
+    assert batch_fn.batches == [[0, 1]]
+
+
+def test_cancelled_request_is_dropped(batch_fn, start_blocked, gate, result_timeout):
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=0)
+    try:
+        blocker = start_blocked(batcher.submit, ['blocker'], lane='bulk')
+        cancelled = batcher.submit(['cancelled'])
+        alive = batcher.submit(['alive'])
+        assert cancelled.cancel()
+        gate.release()
+
+        assert alive.result(timeout=result_timeout) == [('out', 'alive')]
+        blocker.result(timeout=result_timeout)
+    finally:
+        batcher.close()
+
+    assert cancelled.cancelled()
+    assert 'cancelled' not in [item for batch in batch_fn.batches for item in batch]
+
+
+def test_batch_fn_error_is_propagated(result_timeout):
+    def failing_batch_fn(items):
+        raise ValueError('bad batch')
+
+    batcher = MicroBatcher(failing_batch_fn, max_batch_size=2, max_wait_ms=0)
+    try:
+        future = batcher.submit(list(range(5)))
+        with pytest.raises(ValueError):
+            future.result(timeout=result_timeout)
+    finally:
+        batcher.close()
+
+
+def test_empty_request_resolves_immediately(batch_fn, result_timeout):
+    batcher = MicroBatcher(batch_fn)
+    try:
+        assert batcher.submit([]).result(timeout=result_timeout) == []
+    finally:
+        batcher.close()
+    assert batch_fn.batches == []